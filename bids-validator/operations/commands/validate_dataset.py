@@ -9,22 +9,29 @@ import json
 import os
 import shutil
 import subprocess
+import tempfile
 import time
 import traceback
 from datetime import datetime
+from pathlib import Path
 from typing import Any
 
+import aioboto3
 import click
 import requests
-from common.object_storage_adaptor.boto3_client import get_boto3_client
+from botocore.config import Config
 from operations.config import ConfigClass
+from operations.locks import lock_metrics
 from operations.locks import lock_nodes
-from operations.locks import unlock_resource
+from operations.locks import unlock_nodes
 from operations.logger import logger
+from operations.mirror import DatasetMirror
+from operations.models import DatasetFile
 from operations.models import ItemStatus
 from operations.models import ResourceType
 
-TEMP_FOLDER = './dataset/'
+# sidecars and text files that the validator reads in full
+FULL_DOWNLOAD_EXTENSIONS = ('.json', '.tsv', '.csv', '.bval', '.bvec', '.txt', '.md', '.rst', '.cff')
 
 
 def send_message(dataset_code: str, status: str, bids_output: dict[str, Any]) -> None:
@@ -59,8 +66,10 @@ def send_message(dataset_code: str, status: str, bids_output: dict[str, Any]) ->
         raise
 
 
-def get_files(dataset_code: str, access_token: str) -> list[str]:
-    all_files = []
+def get_files(dataset_code: str, access_token: str) -> dict[str, DatasetFile]:
+    """Return sizes and versions of dataset files keyed by their location."""
+
+    all_files = {}
 
     query = {
         'status': ItemStatus.ACTIVE,
@@ -76,44 +85,167 @@ def get_files(dataset_code: str, access_token: str) -> list[str]:
         resp = requests.get(ConfigClass.METADATA_SERVICE + 'items/search/', params=query, headers=header)
         for node in resp.json()['result']:
             if node['type'] == ResourceType.FILE:
-                all_files.append(node['storage']['location_uri'])
+                all_files[node['storage']['location_uri']] = DatasetFile(
+                    node.get('size', 0), node['storage'].get('version')
+                )
         return all_files
     except Exception as e:
         logger.error(f'Error when get files: {str(e)}')
         raise
 
 
-async def download_from_minio(files_locations: list[str]) -> None:
-    boto3_client = await get_boto3_client(
-        ConfigClass.S3_URL,
-        access_key=ConfigClass.S3_ACCESS_KEY,
-        secret_key=ConfigClass.S3_SECRET_KEY,
-        https=ConfigClass.S3_INTERNAL_HTTPS,
+def check_free_space(directory: str | Path, required_size: int) -> None:
+    free_space = shutil.disk_usage(directory).free
+    if required_size > free_space:
+        raise Exception(
+            f'Not enough free space to download dataset: {required_size} bytes required, {free_space} free.'
+        )
+
+
+def create_job_folder(dataset_code: str, required_size: int) -> str:
+    """Create unique folder for the validation job after checking there is enough free space for the dataset."""
+
+    os.makedirs(ConfigClass.TEMP_DIR, exist_ok=True)
+    check_free_space(ConfigClass.TEMP_DIR, required_size)
+
+    return tempfile.mkdtemp(prefix=f'{dataset_code}-', dir=ConfigClass.TEMP_DIR)
+
+
+def parse_location(file_location: str) -> tuple[str, str]:
+    """Return bucket and object path of the file location."""
+
+    minio_path = file_location.split('//')[-1]
+    _, bucket, obj_path = tuple(minio_path.split('/', 2))
+    return bucket, obj_path
+
+
+def is_header_only(obj_path: str, size: int) -> bool:
+    """Return True when only the header of the file is downloaded in the sparse download mode.
+
+    Sidecars and small files are always downloaded in full, because the validator reads their whole content.
+    """
+
+    return (
+        ConfigClass.SPARSE_DOWNLOAD
+        and size > ConfigClass.SPARSE_DOWNLOAD_MIN_SIZE
+        and not obj_path.lower().endswith(FULL_DOWNLOAD_EXTENSIONS)
     )
-    try:
-        for file_location in files_locations:
-            minio_path = file_location.split('//')[-1]
-            _, bucket, obj_path = tuple(minio_path.split('/', 2))
-            await boto3_client.download_object(bucket, obj_path, TEMP_FOLDER + obj_path)
 
-        logger.info('========Minio_Client download finished========')
+
+def get_disk_size(obj_path: str, size: int) -> int:
+    """Return number of bytes the downloaded file takes on disk."""
+
+    return min(size, ConfigClass.SPARSE_HEADER_SIZE) if is_header_only(obj_path, size) else size
+
+
+def get_download_size(files: dict[str, DatasetFile]) -> int:
+    download_size = 0
+    for file_location, dataset_file in files.items():
+        _, obj_path = parse_location(file_location)
+        download_size += get_disk_size(obj_path, dataset_file.size)
+    return download_size
+
+
+async def download_header(s3: Any, bucket: str, obj_path: str, local_path: str, size: int) -> None:
+    """Download header of the object into sparse file that is truncated to the size of the object."""
+
+    response = await s3.get_object(Bucket=bucket, Key=obj_path, Range=f'bytes=0-{ConfigClass.SPARSE_HEADER_SIZE - 1}')
+    header = await response['Body'].read()
+    with open(local_path, 'wb') as f:
+        f.write(header[: ConfigClass.SPARSE_HEADER_SIZE])
+        f.truncate(size)
+
+
+async def download_file(
+    s3: Any, semaphore: asyncio.Semaphore, bucket: str, obj_path: str, size: int, job_folder: str
+) -> None:
+    local_path = os.path.join(job_folder, obj_path)
+    async with semaphore:
+        for attempt in range(1, ConfigClass.DOWNLOAD_RETRIES + 1):
+            try:
+                if is_header_only(obj_path, size):
+                    await download_header(s3, bucket, obj_path, local_path, size)
+                else:
+                    await s3.download_file(bucket, obj_path, local_path)
+                return
+            except Exception as e:
+                if attempt == ConfigClass.DOWNLOAD_RETRIES:
+                    raise
+                wait_time = ConfigClass.DOWNLOAD_RETRY_BACKOFF * (2 ** (attempt - 1))
+                logger.warning(
+                    f'Download of "{bucket}/{obj_path}" failed (attempt {attempt}/{ConfigClass.DOWNLOAD_RETRIES}): '
+                    f'{str(e)}. Retrying in {wait_time:.1f} seconds.'
+                )
+                await asyncio.sleep(wait_time)
+
+
+def get_s3_client() -> Any:
+    """Return object storage client with connection pool sized for concurrent downloads.
+
+    The common client opens new connection pool for every download, so one client is shared by all downloads instead.
+    """
+
+    session = aioboto3.Session(
+        aws_access_key_id=ConfigClass.S3_ACCESS_KEY, aws_secret_access_key=ConfigClass.S3_SECRET_KEY
+    )
+    endpoint = ('https://' if ConfigClass.S3_INTERNAL_HTTPS else 'http://') + ConfigClass.S3_URL
+    config = Config(signature_version='s3v4', max_pool_connections=ConfigClass.DOWNLOAD_CONCURRENCY)
+    return session.client('s3', endpoint_url=endpoint, config=config)
+
+
+async def download_from_minio(files: dict[str, DatasetFile], job_folder: str) -> None:
+    """Download files keyed by location into the job folder.
+
+    Number of concurrent downloads sharing one client is bounded and folders of all files are created before the
+    downloads start. In the sparse download mode only headers of large binary files are downloaded.
+    """
+
+    try:
+        locations = [
+            (*parse_location(file_location), dataset_file.size) for file_location, dataset_file in files.items()
+        ]
+        for directory in {os.path.dirname(os.path.join(job_folder, obj_path)) for _, obj_path, _ in locations}:
+            os.makedirs(directory, exist_ok=True)
+
+        semaphore = asyncio.Semaphore(ConfigClass.DOWNLOAD_CONCURRENCY)
+        async with get_s3_client() as s3:
+            tasks = [
+                asyncio.create_task(download_file(s3, semaphore, bucket, obj_path, size, job_folder))
+                for bucket, obj_path, size in locations
+            ]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+
+        logger.info(
+            '========Minio_Client download finished========',
+            {
+                'files': len(files),
+                'total_bytes': sum(dataset_file.size for dataset_file in files.values()),
+                'downloaded_bytes': get_download_size(files),
+            },
+        )
 
     except Exception as e:
         logger.error(f'Error when download data from minio: {str(e)}')
         raise
 
 
-def getProcessOutput() -> None:
-    f = open('result.txt', 'w')
+def getProcessOutput(job_folder: str) -> None:
+    f = open(os.path.join(job_folder, 'result.txt'), 'w')
     try:
-        subprocess.run(['bids-validator', TEMP_FOLDER + 'data', '--json'], text=True, stdout=f)
+        subprocess.run(['bids-validator', os.path.join(job_folder, 'data'), '--json'], text=True, stdout=f)
     except Exception as e:
         logger.error(f'BIDS validate fail: {str(e)}')
         raise
 
 
-def read_result_file() -> str:
-    f = open('result.txt')
+def read_result_file(job_folder: str) -> str:
+    f = open(os.path.join(job_folder, 'result.txt'))
     output = f.read()
     return output
 
@@ -131,8 +263,59 @@ def send_result_to_dataset(dataset_code: str, result: dict[str, Any]) -> str:
         raise
 
 
+def validate_in_job_folder(dataset_code: str, files: dict[str, DatasetFile]) -> str:
+    """Download dataset into the new job folder, validate it and remove the folder."""
+
+    job_folder = create_job_folder(dataset_code, get_download_size(files))
+    try:
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(download_from_minio(files, job_folder))
+        logger.info('files are downloaded from minio')
+
+        getProcessOutput(job_folder)
+        return read_result_file(job_folder)
+    finally:
+        # remove bids folder after validate
+        shutil.rmtree(job_folder, ignore_errors=True)
+
+
+def validate_in_mirror(dataset_code: str, files: dict[str, DatasetFile]) -> str:
+    """Update local mirror of the dataset with new and changed files and validate it.
+
+    Files are identified by their location, version and size, which includes download mode of the file, so
+    switching sparse download mode downloads affected files again.
+    """
+
+    mirror = DatasetMirror(ConfigClass.MIRROR_DIR, ConfigClass.MIRROR_SIZE_BUDGET)
+    entries = {}
+    for file_location, dataset_file in files.items():
+        _, obj_path = parse_location(file_location)
+        disk_size = get_disk_size(obj_path, dataset_file.size)
+        entries[file_location] = {
+            'fingerprint': f'{dataset_file.version}:{dataset_file.size}:{disk_size}',
+            'path': obj_path,
+            'size': disk_size,
+        }
+
+    with mirror.open(dataset_code) as dataset_folder:
+        missing_files = {location: files[location] for location in mirror.sync(dataset_folder, entries)}
+
+        required_size = get_download_size(missing_files)
+        mirror.evict(required_size, dataset_folder)
+        check_free_space(dataset_folder, required_size)
+
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(download_from_minio(missing_files, str(dataset_folder)))
+        mirror.commit(dataset_folder, entries)
+        logger.info(f'{len(missing_files)} of {len(files)} files are downloaded from minio into the mirror')
+
+        getProcessOutput(str(dataset_folder))
+        return read_result_file(str(dataset_folder))
+
+
 def main(dataset_code: str, access_token: str):
     logger.info(f'Vault url: {os.getenv("VAULT_URL")}')
+    started_at = time.monotonic()
     try:
         logger.info(f'dataset_code: {dataset_code}')
         logger.info(f'access_token: {access_token}')
@@ -148,22 +331,16 @@ def main(dataset_code: str, access_token: str):
             send_message(dataset_code, 'failed', 'no files in dataset')
             return
 
-        # Download files folders from minio
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(download_from_minio(files_locations))
-        logger.info('files are downloaded from minio')
-
-        # Get bids validate result
-        getProcessOutput()
-        result = read_result_file()
+        # Download files from minio and get bids validate result
+        if ConfigClass.MIRROR_SIZE_BUDGET:
+            result = validate_in_mirror(dataset_code, files_locations)
+        else:
+            result = validate_in_job_folder(dataset_code, files_locations)
 
         logger.info(f'BIDS validation result: {result}')
 
         bids_output = json.loads(result)
 
-        # remove bids folder after validate
-        shutil.rmtree(TEMP_FOLDER)
-
         # Send the bids validation result to dataset service
         send_result_to_dataset(dataset_code, bids_output)
 
@@ -175,8 +352,11 @@ def main(dataset_code: str, access_token: str):
         raise
 
     finally:
-        for resource_key, operation in locked_node:
-            unlock_resource(resource_key, operation)
+        unlock_nodes(locked_node)
+        logger.info(
+            'BIDS validation summary.',
+            {'job_seconds': round(time.monotonic() - started_at, 3), 'lock_metrics': lock_metrics.to_dict()},
+        )
 
 
 @click.command()
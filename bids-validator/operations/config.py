@@ -31,6 +31,20 @@ class Settings(BaseSettings):
     METADATA_SERVICE: str = 'http://127.0.0.1:5066'
     DATASET_SERVICE: str = 'http://127.0.0.1:5081'
 
+    RESOURCE_LOCK_CHUNK_SIZE: int = 1000
+
+    TEMP_DIR: str = './dataset'
+    DOWNLOAD_CONCURRENCY: int = 16
+    DOWNLOAD_RETRIES: int = 3
+    DOWNLOAD_RETRY_BACKOFF: float = 0.5
+    # download only headers of large binary files into sparse files of their real size
+    SPARSE_DOWNLOAD: bool = False
+    SPARSE_DOWNLOAD_MIN_SIZE: int = 1024 * 1024
+    SPARSE_HEADER_SIZE: int = 64 * 1024
+    # bytes of persistent dataset mirrors reused by repeated validations, zero downloads every dataset from scratch
+    MIRROR_SIZE_BUDGET: int = 0
+    MIRROR_DIR: str = './mirror'
+
     def __init__(self, *args: Any, **kwds: Any) -> None:
         super().__init__(*args, **kwds)
 
@@ -4,10 +4,13 @@
 # Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
 # You may not use this file except in compliance with the License.
 
+import time
+from collections import defaultdict
 from typing import Any
 
 import requests
 from operations.config import ConfigClass
+from operations.logger import logger
 from operations.models import ItemStatus
 from operations.models import ResourceType
 
@@ -33,28 +36,131 @@ def get_all_children_nodes(parent_path: str, zone: str, container_code: str, acc
     return ffs
 
 
-def lock_resource(resource_key: str, operation: str) -> dict:
-    # operation can be either read or write
-    url = ConfigClass.DATAOPS_SERVICE + 'resource/lock'
-    post_json = {'resource_key': resource_key, 'operation': operation}
+# status codes of lock responses meaning that resource keys are already locked by another operation
+LOCK_CONFLICT_STATUS_CODES = (409, 423)
+
+
+class LockMetrics:
+    """Collect timings and counts of resource lock requests for the validation summary.
+
+    Conflicts are counted only for keys locked by another operation, other failed lock requests are failures.
+    """
+
+    def __init__(self, sample_size: int = 5) -> None:
+        self.sample_size = sample_size
+
+        self.lock_requests = 0
+        self.locked_keys = 0
+        self.lock_wait_seconds = 0.0
+        self.conflicts = 0
+        self.conflicted_keys = 0
+        self.conflicted_keys_sample = []
+        self.failures = 0
+        self.unlock_requests = 0
+        self.unlocked_keys = 0
+        self.unlock_seconds = 0.0
+        self.hold_seconds = 0.0
+
+        self.locked_at = None
+
+    def add_conflict(self, resource_keys: list[str]) -> None:
+        self.conflicts += 1
+        self.conflicted_keys += len(resource_keys)
+        sample_left = self.sample_size - len(self.conflicted_keys_sample)
+        self.conflicted_keys_sample.extend(resource_keys[:sample_left])
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            'lock_requests': self.lock_requests,
+            'locked_keys': self.locked_keys,
+            'lock_wait_seconds': round(self.lock_wait_seconds, 3),
+            'conflicts': self.conflicts,
+            'conflicted_keys': self.conflicted_keys,
+            'conflicted_keys_sample': self.conflicted_keys_sample,
+            'failures': self.failures,
+            'unlock_requests': self.unlock_requests,
+            'unlocked_keys': self.unlocked_keys,
+            'unlock_seconds': round(self.unlock_seconds, 3),
+            'hold_seconds': round(self.hold_seconds, 3),
+        }
+
+
+lock_metrics = LockMetrics()
+
 
-    response = requests.post(url, json=post_json)
-    if response.status_code != 200:
-        raise Exception(f'resource {resource_key} already in used')
+def _split_into_chunks(resource_keys: list[str]) -> list[list[str]]:
+    chunk_size = ConfigClass.RESOURCE_LOCK_CHUNK_SIZE
+    return [resource_keys[index : index + chunk_size] for index in range(0, len(resource_keys), chunk_size)]
 
-    return response.json()
 
+def _rollback_locks(locked_chunks: list[list[str]], operation: str) -> None:
+    for locked_chunk in locked_chunks:
+        try:
+            unlock_resources(locked_chunk, operation)
+        except Exception as e:
+            logger.error(f'Error when rolling back lock of {len(locked_chunk)} resources: {str(e)}')
+
+
+def lock_resources(resource_keys: list[str], operation: str) -> None:
+    """Lock resource keys in chunks using the bulk endpoint.
+
+    If any chunk can not be locked, the chunks that are already locked get released before raising the error.
+    """
 
-def unlock_resource(resource_key: str, operation: str) -> dict:
     # operation can be either read or write
-    url = ConfigClass.DATAOPS_SERVICE + 'resource/lock'
-    post_json = {'resource_key': resource_key, 'operation': operation}
+    url = ConfigClass.DATAOPS_SERVICE + 'resource/lock/bulk'
+    started_at = time.monotonic()
+    locked_chunks = []
+
+    for chunk in _split_into_chunks(resource_keys):
+        lock_metrics.lock_requests += 1
+        try:
+            response = requests.post(url, json={'resource_keys': chunk, 'operation': operation})
+        except Exception:
+            lock_metrics.lock_wait_seconds += time.monotonic() - started_at
+            lock_metrics.failures += 1
+            _rollback_locks(locked_chunks, operation)
+            raise
+
+        if response.status_code != 200:
+            lock_metrics.lock_wait_seconds += time.monotonic() - started_at
+            logger.error(f'Unable to lock {len(chunk)} resources starting from {chunk[0]}: {response.text}')
+            _rollback_locks(locked_chunks, operation)
+            if response.status_code in LOCK_CONFLICT_STATUS_CODES:
+                lock_metrics.add_conflict(chunk)
+                raise Exception(f'{len(chunk)} resources starting from {chunk[0]} already in used')
+            lock_metrics.failures += 1
+            raise Exception(f'Unable to lock {len(chunk)} resources starting from {chunk[0]}')
+
+        locked_chunks.append(chunk)
+
+    lock_metrics.locked_keys += len(resource_keys)
+    lock_metrics.lock_wait_seconds += time.monotonic() - started_at
+    lock_metrics.locked_at = time.monotonic()
+
+
+def unlock_resources(resource_keys: list[str], operation: str) -> None:
+    """Unlock resource keys in chunks using the bulk endpoint, trying every chunk even if some of them fail."""
+
+    # operation can be either read or write
+    url = ConfigClass.DATAOPS_SERVICE + 'resource/lock/bulk'
+    started_at = time.monotonic()
+    errors = []
+
+    for chunk in _split_into_chunks(resource_keys):
+        lock_metrics.unlock_requests += 1
+        response = requests.delete(url, json={'resource_keys': chunk, 'operation': operation})
+        if response.status_code not in (200, 400):
+            errors.append(f'Error when unlock {len(chunk)} resources starting from {chunk[0]}')
 
-    response = requests.delete(url, json=post_json)
-    if response.status_code != 200:
-        raise Exception(f'Error when unlock resource {resource_key}')
+    lock_metrics.unlocked_keys += len(resource_keys)
+    lock_metrics.unlock_seconds += time.monotonic() - started_at
+    if lock_metrics.locked_at is not None:
+        lock_metrics.hold_seconds += started_at - lock_metrics.locked_at
+        lock_metrics.locked_at = None
 
-    return response.json()
+    if errors:
+        raise Exception(errors)
 
 
 def format_folder_path(node):
@@ -74,6 +180,7 @@ def lock_nodes(dataset_code: str, access_token: str):
     locked_node, err = [], None
 
     try:
+        resource_keys = []
         nodes = get_all_children_nodes(None, 'core', dataset_code, access_token)
         for ff_object in nodes:
             # we will skip the deleted nodes
@@ -90,11 +197,23 @@ def lock_nodes(dataset_code: str, access_token: str):
                 bucket = ff_object.get('container')
                 minio_obj_path = format_folder_path(ff_object)
 
-            source_key = f'{bucket}/{minio_obj_path}'
-            lock_resource(source_key, 'read')
-            locked_node.append((source_key, 'read'))
+            resource_keys.append(f'{bucket}/{minio_obj_path}')
+
+        lock_resources(resource_keys, 'read')
+        locked_node = [(resource_key, 'read') for resource_key in resource_keys]
 
     except Exception as e:
         err = e
 
     return locked_node, err
+
+
+def unlock_nodes(locked_node: list[tuple[str, str]]) -> None:
+    """Release the nodes locked by lock_nodes with one bulk call per operation."""
+
+    resource_keys_by_operation = defaultdict(list)
+    for resource_key, operation in locked_node:
+        resource_keys_by_operation[operation].append(resource_key)
+
+    for operation, resource_keys in resource_keys_by_operation.items():
+        unlock_resources(resource_keys, operation)
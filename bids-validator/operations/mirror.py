@@ -0,0 +1,163 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import fcntl
+import json
+import os
+import shutil
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+from operations.logger import logger
+
+MANIFEST_NAME = 'manifest.json'
+
+
+@contextmanager
+def lock_file(lock_path: Path, blocking: bool = True) -> Iterator[bool]:
+    """Hold exclusive lock on the file, yield False when non-blocking lock is held by another process."""
+
+    with open(lock_path, 'a') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class DatasetMirror:
+    """Persistent local copies of datasets reused by repeated validations.
+
+    Every dataset folder has a manifest of its files keyed by location with fingerprint, local path and size on disk
+    of every file, so the next validation downloads only new or changed files and removes deleted ones. Whole
+    datasets are evicted in least recently used order when the mirror exceeds the size budget.
+    """
+
+    def __init__(self, mirror_dir: str | Path, size_budget: int) -> None:
+        self.mirror_dir = Path(mirror_dir)
+        self.size_budget = size_budget
+
+        self.mirror_dir.mkdir(parents=True, exist_ok=True)
+
+    @contextmanager
+    def open(self, dataset_code: str) -> Iterator[Path]:
+        """Lock the dataset folder for the validation and yield it."""
+
+        dataset_folder = self.mirror_dir / dataset_code
+        with lock_file(self.mirror_dir / f'{dataset_code}.lock'):
+            # created under the lock, so it cannot be evicted by another validation in the meantime
+            dataset_folder.mkdir(exist_ok=True)
+            yield dataset_folder
+            os.utime(dataset_folder)
+
+    def _read_manifest(self, dataset_folder: Path) -> dict[str, dict[str, Any]]:
+        try:
+            return json.loads((dataset_folder / MANIFEST_NAME).read_text())
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            logger.warning(f'Ignoring corrupted manifest of mirrored dataset "{dataset_folder.name}".')
+            return {}
+
+    def _write_manifest(self, dataset_folder: Path, manifest: dict[str, dict[str, Any]]) -> None:
+        partial_path = dataset_folder / f'{MANIFEST_NAME}.part'
+        partial_path.write_text(json.dumps(manifest))
+        os.replace(partial_path, dataset_folder / MANIFEST_NAME)
+
+    def _remove_file(self, dataset_folder: Path, path: str) -> None:
+        """Remove the file and folders that became empty."""
+
+        file_path = dataset_folder / path
+        file_path.unlink(missing_ok=True)
+        for parent in file_path.parents:
+            if parent == dataset_folder:
+                break
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+
+    def sync(self, dataset_folder: Path, entries: dict[str, dict[str, Any]]) -> list[str]:
+        """Remove files that are no longer in the dataset or changed and return locations that must be downloaded.
+
+        Entries are keyed by location and contain fingerprint, local path and size on disk of the file. Manifest is
+        saved without the files that must be downloaded, so interrupted download is repeated by the next validation,
+        and files that are not in the saved manifest are removed from the dataset folder.
+        """
+
+        manifest = self._read_manifest(dataset_folder)
+
+        kept = {
+            location: entry
+            for location, entry in manifest.items()
+            if entries.get(location) == entry and (dataset_folder / entry['path']).exists()
+        }
+        self._write_manifest(dataset_folder, kept)
+
+        # files left by interrupted validations are not in the manifest, so every file that is not kept is removed
+        kept_paths = {entry['path'] for entry in kept.values()} | {MANIFEST_NAME, f'{MANIFEST_NAME}.part'}
+        removed_files = 0
+        for file_path in [path for path in dataset_folder.rglob('*') if not path.is_dir()]:
+            path = file_path.relative_to(dataset_folder).as_posix()
+            if path not in kept_paths:
+                self._remove_file(dataset_folder, path)
+                removed_files += 1
+        # folders created for downloads that never started are removed as well, deepest first
+        for folder in sorted((path for path in dataset_folder.rglob('*') if path.is_dir()), reverse=True):
+            try:
+                folder.rmdir()
+            except OSError:
+                continue
+
+        missing = [location for location in entries if location not in kept]
+        logger.info(
+            f'Mirrored dataset "{dataset_folder.name}" is synchronized.',
+            {'kept_files': len(kept), 'removed_files': removed_files, 'missing_files': len(missing)},
+        )
+        return missing
+
+    def commit(self, dataset_folder: Path, entries: dict[str, dict[str, Any]]) -> None:
+        """Save manifest of the dataset after all its files were downloaded."""
+
+        self._write_manifest(dataset_folder, entries)
+
+    def get_size(self, dataset_folder: Path) -> int:
+        return sum(entry['size'] for entry in self._read_manifest(dataset_folder).values())
+
+    def evict(self, required_size: int, keep: Path) -> None:
+        """Remove least recently used datasets until the required size fits into the size budget.
+
+        The kept dataset and datasets locked by other validations are not removed.
+        """
+
+        with lock_file(self.mirror_dir / 'mirror.lock'):
+            datasets = [path for path in self.mirror_dir.iterdir() if path.is_dir()]
+            total_size = sum(self.get_size(path) for path in datasets)
+
+            for dataset_folder in sorted(datasets, key=lambda path: path.stat().st_mtime):
+                if total_size + required_size <= self.size_budget:
+                    break
+                if dataset_folder == keep:
+                    continue
+
+                with lock_file(self.mirror_dir / f'{dataset_folder.name}.lock', blocking=False) as locked:
+                    if not locked:
+                        continue
+                    size = self.get_size(dataset_folder)
+                    shutil.rmtree(dataset_folder, ignore_errors=True)
+                    total_size -= size
+                    logger.info(f'Evicted mirrored dataset "{dataset_folder.name}" ({size} bytes).')
+
+            if total_size + required_size > self.size_budget:
+                logger.warning(
+                    f'Mirrored datasets exceed size budget by {total_size + required_size - self.size_budget} bytes.'
+                )
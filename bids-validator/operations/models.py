@@ -6,6 +6,7 @@
 
 from enum import Enum
 from enum import unique
+from typing import NamedTuple
 
 
 @unique
@@ -27,3 +28,10 @@ class ResourceType(str, Enum):
 
     FOLDER = 'folder'
     FILE = 'file'
+
+
+class DatasetFile(NamedTuple):
+    """Store size and version of the dataset file."""
+
+    size: int
+    version: str | None = None
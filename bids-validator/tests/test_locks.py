@@ -0,0 +1,101 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import pytest
+from operations.config import ConfigClass
+from operations.locks import LockMetrics
+from operations.locks import lock_nodes
+from operations.locks import lock_resources
+from operations.locks import unlock_nodes
+from operations.models import ResourceType
+
+
+@pytest.fixture
+def dataops_service(mocker, httpserver):
+    mocker.patch.object(ConfigClass, 'DATAOPS_SERVICE', httpserver.url_for('/'))
+    mocker.patch.object(ConfigClass, 'RESOURCE_LOCK_CHUNK_SIZE', 2)
+    yield httpserver
+
+
+@pytest.fixture
+def lock_metrics(mocker):
+    metrics = LockMetrics()
+    mocker.patch('operations.locks.lock_metrics', metrics)
+    yield metrics
+
+
+def test_lock_nodes_locks_all_dataset_nodes_in_bulk(mocker, dataops_service, create_node):
+    nodes = [
+        create_node(type_=ResourceType.FILE, location_uri=f'minio://http://minio/dataset/data/file-{index}.json')
+        for index in range(3)
+    ]
+    mocker.patch.object(ConfigClass, 'METADATA_SERVICE', dataops_service.url_for('/'))
+    dataops_service.expect_ordered_request('/items/search/', method='GET').respond_with_json({'result': nodes})
+    for chunk in (['dataset/data/file-0.json', 'dataset/data/file-1.json'], ['dataset/data/file-2.json']):
+        dataops_service.expect_ordered_request(
+            '/resource/lock/bulk', method='POST', json={'resource_keys': chunk, 'operation': 'read'}
+        ).respond_with_json({})
+
+    locked_node, err = lock_nodes('dataset', 'access_token')
+
+    dataops_service.check_assertions()
+    assert err is None
+    assert locked_node == [(f'dataset/data/file-{index}.json', 'read') for index in range(3)]
+
+
+def test_lock_resources_unlocks_acquired_chunks_when_chunk_fails(dataops_service, lock_metrics):
+    dataops_service.expect_ordered_request(
+        '/resource/lock/bulk', method='POST', json={'resource_keys': ['a', 'b'], 'operation': 'read'}
+    ).respond_with_json({})
+    dataops_service.expect_ordered_request(
+        '/resource/lock/bulk', method='POST', json={'resource_keys': ['c'], 'operation': 'read'}
+    ).respond_with_json({}, status=409)
+    dataops_service.expect_ordered_request(
+        '/resource/lock/bulk', method='DELETE', json={'resource_keys': ['a', 'b'], 'operation': 'read'}
+    ).respond_with_json({})
+
+    with pytest.raises(Exception, match='already in used'):
+        lock_resources(['a', 'b', 'c'], 'read')
+
+    dataops_service.check_assertions()
+    assert lock_metrics.conflicts == 1
+    assert lock_metrics.conflicted_keys_sample == ['c']
+    assert lock_metrics.failures == 0
+
+
+def test_lock_resources_counts_server_errors_as_failures(dataops_service, lock_metrics):
+    dataops_service.expect_request('/resource/lock/bulk', method='POST').respond_with_json({}, status=500)
+
+    with pytest.raises(Exception, match='Unable to lock'):
+        lock_resources(['a'], 'read')
+
+    assert lock_metrics.failures == 1
+    assert lock_metrics.conflicts == 0
+
+
+def test_unlock_nodes_releases_nodes_with_bulk_request(dataops_service):
+    dataops_service.expect_oneshot_request(
+        '/resource/lock/bulk', method='DELETE', json={'resource_keys': ['a', 'b'], 'operation': 'read'}
+    ).respond_with_json({})
+
+    unlock_nodes([('a', 'read'), ('b', 'read')])
+
+    dataops_service.check_assertions()
+
+
+def test_lock_metrics_collect_hold_duration_between_lock_and_unlock(dataops_service, lock_metrics):
+    dataops_service.expect_request('/resource/lock/bulk').respond_with_json({})
+
+    lock_resources(['a', 'b', 'c'], 'read')
+    unlock_nodes([('a', 'read'), ('b', 'read'), ('c', 'read')])
+
+    metrics = lock_metrics.to_dict()
+    assert metrics['lock_requests'] == 2
+    assert metrics['locked_keys'] == 3
+    assert metrics['unlock_requests'] == 2
+    assert metrics['unlocked_keys'] == 3
+    assert metrics['hold_seconds'] >= 0
+    assert lock_metrics.locked_at is None
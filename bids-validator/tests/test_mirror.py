@@ -0,0 +1,92 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import os
+
+import pytest
+from operations.mirror import DatasetMirror
+
+
+@pytest.fixture
+def mirror(tmp_path) -> DatasetMirror:
+    yield DatasetMirror(tmp_path / 'mirror', size_budget=100)
+
+
+def create_entry(path: str, fingerprint: str = 'v1', size: int = 10) -> dict:
+    return {'fingerprint': fingerprint, 'path': path, 'size': size}
+
+
+def download(dataset_folder, entries, locations):
+    for location in locations:
+        file_path = dataset_folder / entries[location]['path']
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_bytes(bytes(entries[location]['size']))
+
+
+class TestDatasetMirror:
+    def test_sync_returns_only_new_and_changed_files_and_removes_deleted_ones(self, mirror):
+        entries = {
+            'kept': create_entry('data/kept.json'),
+            'changed': create_entry('data/changed.nii'),
+            'removed': create_entry('data/sub-01/removed.nii'),
+        }
+        with mirror.open('dataset') as dataset_folder:
+            download(dataset_folder, entries, mirror.sync(dataset_folder, entries))
+            mirror.commit(dataset_folder, entries)
+
+        new_entries = {
+            'kept': create_entry('data/kept.json'),
+            'changed': create_entry('data/changed.nii', fingerprint='v2'),
+            'new': create_entry('data/new.tsv'),
+        }
+        with mirror.open('dataset') as dataset_folder:
+            missing = mirror.sync(dataset_folder, new_entries)
+
+            assert sorted(missing) == ['changed', 'new']
+            assert (dataset_folder / 'data/kept.json').exists()
+            assert not (dataset_folder / 'data/changed.nii').exists()
+            assert not (dataset_folder / 'data/sub-01').exists()
+
+    def test_sync_downloads_files_again_when_previous_download_was_not_committed(self, mirror):
+        entries = {'file': create_entry('data/file.nii')}
+        with mirror.open('dataset') as dataset_folder:
+            download(dataset_folder, entries, mirror.sync(dataset_folder, entries))
+
+        with mirror.open('dataset') as dataset_folder:
+            assert mirror.sync(dataset_folder, entries) == ['file']
+
+    def test_sync_removes_files_that_are_not_in_manifest(self, mirror):
+        entries = {'file': create_entry('data/file.nii')}
+        with mirror.open('dataset') as dataset_folder:
+            download(dataset_folder, entries, mirror.sync(dataset_folder, entries))
+            mirror.commit(dataset_folder, entries)
+            (dataset_folder / 'data/sub-01').mkdir()
+            (dataset_folder / 'data/sub-01/interrupted.nii').write_bytes(bytes(10))
+            (dataset_folder / 'data/sub-02/anat').mkdir(parents=True)
+
+        with mirror.open('dataset') as dataset_folder:
+            missing = mirror.sync(dataset_folder, entries)
+
+            assert missing == []
+            assert (dataset_folder / 'data/file.nii').exists()
+            assert (dataset_folder / 'manifest.json').exists()
+            assert not (dataset_folder / 'data/sub-01').exists()
+            assert not (dataset_folder / 'data/sub-02').exists()
+
+    def test_evict_removes_least_recently_used_datasets_over_budget(self, mirror):
+        for index, dataset_code in enumerate(['oldest', 'recent', 'current']):
+            entries = {dataset_code: create_entry(f'data/{dataset_code}.nii', size=40)}
+            with mirror.open(dataset_code) as dataset_folder:
+                download(dataset_folder, entries, mirror.sync(dataset_folder, entries))
+                mirror.commit(dataset_folder, entries)
+            os.utime(dataset_folder, (index, index))
+
+        with mirror.open('current') as dataset_folder:
+            mirror.evict(20, dataset_folder)
+
+        assert not (mirror.mirror_dir / 'oldest').exists()
+        assert (mirror.mirror_dir / 'recent').exists()
+        assert (mirror.mirror_dir / 'current').exists()
@@ -4,9 +4,16 @@
 # Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
 # You may not use this file except in compliance with the License.
 
+import asyncio
+
+import pytest
+from operations.commands.validate_dataset import create_job_folder
+from operations.commands.validate_dataset import download_from_minio
 from operations.commands.validate_dataset import get_files
+from operations.commands.validate_dataset import get_s3_client
 from operations.commands.validate_dataset import send_message
 from operations.config import ConfigClass
+from operations.models import DatasetFile
 from operations.models import ResourceType
 
 
@@ -20,10 +27,106 @@ def test_send_message_makes_request_to_the_queue_service(mocker, httpserver):
 
 
 def test_get_files_get_correct_result(mocker, httpserver, create_node):
-    expected_body = {'result': [create_node(type_=ResourceType.FILE, location_uri='minio_path')]}
+    expected_body = {'result': [create_node(type_=ResourceType.FILE, location_uri='minio_path', size=10)]}
 
     mocker.patch.object(ConfigClass, 'METADATA_SERVICE', httpserver.url_for('/'))
     httpserver.expect_oneshot_request('/items/search/', method='GET').respond_with_json(expected_body)
 
     received_response = get_files('dataset-code', 'access_token')
-    assert received_response == ['minio_path']
+    assert received_response == {'minio_path': DatasetFile(10, 'fake_version')}
+
+
+def test_create_job_folder_creates_unique_folder_per_job(mocker, tmp_path):
+    mocker.patch.object(ConfigClass, 'TEMP_DIR', str(tmp_path))
+
+    first_folder = create_job_folder('dataset-code', 10)
+    second_folder = create_job_folder('dataset-code', 10)
+
+    assert first_folder != second_folder
+
+
+def test_create_job_folder_raises_exception_when_there_is_not_enough_free_space(mocker, tmp_path):
+    mocker.patch.object(ConfigClass, 'TEMP_DIR', str(tmp_path))
+    mocker.patch('shutil.disk_usage', return_value=mocker.Mock(free=5))
+
+    with pytest.raises(Exception, match='Not enough free space'):
+        create_job_folder('dataset-code', 10)
+
+
+@pytest.fixture
+def s3_client(mocker):
+    s3 = mocker.AsyncMock()
+    session = mocker.patch('aioboto3.Session').return_value
+    session.client.return_value.__aenter__ = mocker.AsyncMock(return_value=s3)
+    session.client.return_value.__aexit__ = mocker.AsyncMock(return_value=False)
+    yield s3
+
+
+def test_download_from_minio_downloads_all_files_into_job_folder(s3_client, tmp_path):
+    locations = {
+        'minio://http://minio:9000/dataset-code/data/sub-01/anat/file.nii': DatasetFile(10),
+        'minio://minio/dataset-code/file': DatasetFile(5),
+    }
+
+    asyncio.run(download_from_minio(locations, str(tmp_path)))
+
+    downloaded = sorted(call.args for call in s3_client.download_file.await_args_list)
+    assert downloaded == [
+        ('dataset-code', 'data/sub-01/anat/file.nii', str(tmp_path / 'data/sub-01/anat/file.nii')),
+        ('dataset-code', 'file', str(tmp_path / 'file')),
+    ]
+    assert (tmp_path / 'data/sub-01/anat').is_dir()
+
+
+def test_get_s3_client_sizes_connection_pool_for_concurrent_downloads(mocker):
+    mocker.patch.multiple(ConfigClass, S3_URL='minio:9000', S3_INTERNAL_HTTPS=True, DOWNLOAD_CONCURRENCY=8)
+    session_class = mocker.patch('aioboto3.Session')
+
+    get_s3_client()
+
+    session_class.assert_called_once_with(
+        aws_access_key_id=ConfigClass.S3_ACCESS_KEY, aws_secret_access_key=ConfigClass.S3_SECRET_KEY
+    )
+    args, kwargs = session_class.return_value.client.call_args
+    assert args == ('s3',)
+    assert kwargs['endpoint_url'] == 'https://minio:9000'
+    assert kwargs['config'].max_pool_connections == 8
+
+
+def test_download_from_minio_retries_failed_downloads(mocker, s3_client, tmp_path):
+    mocker.patch.object(ConfigClass, 'DOWNLOAD_RETRY_BACKOFF', 0)
+    s3_client.download_file.side_effect = [Exception('Connection reset'), None]
+
+    asyncio.run(download_from_minio({'minio://minio/dataset-code/file': DatasetFile(5)}, str(tmp_path)))
+
+    assert s3_client.download_file.await_count == 2
+
+
+def test_download_from_minio_raises_after_exhausting_retries(mocker, s3_client, tmp_path):
+    mocker.patch.object(ConfigClass, 'DOWNLOAD_RETRY_BACKOFF', 0)
+    s3_client.download_file.side_effect = Exception('Not found')
+
+    with pytest.raises(Exception, match='Not found'):
+        asyncio.run(download_from_minio({'minio://minio/dataset-code/file': DatasetFile(5)}, str(tmp_path)))
+
+    assert s3_client.download_file.await_count == ConfigClass.DOWNLOAD_RETRIES
+
+
+def test_download_from_minio_downloads_only_headers_of_large_binary_files_in_sparse_mode(mocker, s3_client, tmp_path):
+    mocker.patch.multiple(ConfigClass, SPARSE_DOWNLOAD=True, SPARSE_DOWNLOAD_MIN_SIZE=100, SPARSE_HEADER_SIZE=4)
+    s3_client.get_object.return_value = {'Body': mocker.Mock(read=mocker.AsyncMock(return_value=b'head'))}
+    locations = {
+        'minio://minio/dataset-code/sub-01/anat/sub-01_T1w.nii': DatasetFile(1000),
+        'minio://minio/dataset-code/sub-01/anat/sub-01_T1w.json': DatasetFile(1000),
+        'minio://minio/dataset-code/small.bin': DatasetFile(50),
+    }
+
+    asyncio.run(download_from_minio(locations, str(tmp_path)))
+
+    header_file = tmp_path / 'sub-01/anat/sub-01_T1w.nii'
+    s3_client.get_object.assert_awaited_once_with(
+        Bucket='dataset-code', Key='sub-01/anat/sub-01_T1w.nii', Range='bytes=0-3'
+    )
+    assert header_file.stat().st_size == 1000
+    assert header_file.read_bytes()[:4] == b'head'
+    assert s3_client.download_file.await_count == 2
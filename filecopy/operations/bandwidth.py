@@ -0,0 +1,59 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import asyncio
+import time
+from typing import Any
+
+
+class BandwidthLimiter:
+    """Token bucket limiting number of bytes per second sent by all uploads sharing the limiter.
+
+    Bytes are taken from the bucket before they are sent and the caller sleeps off the debt when the bucket is empty,
+    so concurrent uploads are limited together without a lock. Zero rate disables the limit and only measures
+    throughput.
+    """
+
+    def __init__(self, rate: int, burst: int | None = None) -> None:
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = float(self.burst)
+        self.updated_at = time.monotonic()
+
+        self.started_at = self.updated_at
+        self.total_bytes = 0
+        self.throttled_seconds = 0.0
+
+    async def consume(self, size: int) -> None:
+        """Wait until size bytes can be sent within the limit."""
+
+        self.total_bytes += size
+        if not self.rate:
+            return
+
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+        self.tokens -= size
+        if self.tokens < 0:
+            delay = -self.tokens / self.rate
+            self.throttled_seconds += delay
+            await asyncio.sleep(delay)
+
+    @property
+    def throughput(self) -> float:
+        """Return average throughput in bytes per second since the limiter was created."""
+
+        return self.total_bytes / max(time.monotonic() - self.started_at, 1e-6)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            'limit_bytes_per_second': self.rate or None,
+            'throughput_bytes_per_second': round(self.throughput),
+            'total_bytes': self.total_bytes,
+            'throttled_seconds': round(self.throttled_seconds, 3),
+        }
@@ -0,0 +1,161 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import mmap
+from collections.abc import AsyncIterator
+from pathlib import Path
+from typing import Any
+
+import httpx
+from operations.bandwidth import BandwidthLimiter
+from operations.logger import logger
+
+BLOCK_SIZE = 64 * 1024
+
+
+async def iter_blocks(
+    data: bytes | memoryview, block_size: int = BLOCK_SIZE, bandwidth: BandwidthLimiter | None = None
+) -> AsyncIterator[memoryview]:
+    """Yield the data in blocks without copying it, waiting for the bandwidth limiter before every block.
+
+    Used as request content together with explicit Content-Length header, so the HTTP layer copies only one block
+    at a time instead of the whole chunk.
+    """
+
+    view = memoryview(data)
+    for start in range(0, len(view), block_size):
+        block = view[start : start + block_size]
+        if bandwidth:
+            await bandwidth.consume(len(block))
+        yield block
+
+
+class ChunkSource:
+    """Base class for sources of data that are uploaded in chunks read by offset."""
+
+    size: int
+
+    async def __aenter__(self) -> 'ChunkSource':
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        return None
+
+    async def read(self, offset: int, length: int) -> bytes | memoryview:
+        """Return up to length bytes starting from offset."""
+
+        raise NotImplementedError
+
+    def release(self, data: bytes | memoryview) -> None:
+        """Return memory of the chunk that is no longer used, so the source can reuse it for the next read."""
+
+        return None
+
+
+class LocalFileSource(ChunkSource):
+    """Read chunks from the local file mapped into memory.
+
+    Chunks are returned as views of the mapping, so no memory is allocated for them and pages are backed by the page
+    cache instead of the process memory.
+    """
+
+    def __init__(self, file_path: Path) -> None:
+        self.file_path = file_path
+        self.size = file_path.stat().st_size
+        self.mapped: mmap.mmap | None = None
+
+    async def __aexit__(self, *args: Any) -> None:
+        if self.mapped is not None:
+            try:
+                self.mapped.close()
+            except BufferError:
+                logger.warning(f'Mapping of "{self.file_path}" is still in use, it is closed when released.')
+            self.mapped = None
+
+    def _map(self) -> mmap.mmap:
+        if self.mapped is None:
+            with self.file_path.open('rb') as f:
+                self.mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.mapped
+
+    async def read(self, offset: int, length: int) -> bytes | memoryview:
+        if offset >= self.size:
+            return b''
+
+        mapped = self._map()
+        length = min(length, self.size - offset)
+        if hasattr(mapped, 'madvise'):
+            # ask the kernel to read the chunk ahead, so the event loop is not blocked by page faults while sending it
+            aligned_offset = offset - offset % mmap.PAGESIZE
+            mapped.madvise(mmap.MADV_WILLNEED, aligned_offset, offset + length - aligned_offset)
+
+        return memoryview(mapped)[offset : offset + length]
+
+
+class PresignedUrlSource(ChunkSource):
+    """Read chunks of the object from the object storage with HTTP range requests to its presigned url.
+
+    Chunks are read independently, so several of them can be downloaded at the same time without using local disk.
+    Response body is streamed into buffers that are reused once released, so memory is allocated only for chunks
+    that are read at the same time.
+    """
+
+    def __init__(self, url: str, size: int, timeout: int = 300) -> None:
+        self.url = url
+        self.size = size
+        self.timeout = timeout
+        self.client: httpx.AsyncClient | None = None
+        self.buffers: list[bytearray] = []
+
+    async def __aenter__(self) -> 'PresignedUrlSource':
+        self.client = httpx.AsyncClient(timeout=self.timeout)
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.client.aclose()
+        self.client = None
+        self.buffers.clear()
+
+    def _take_buffer(self, length: int) -> bytearray:
+        for index, buffer in enumerate(self.buffers):
+            if len(buffer) >= length:
+                return self.buffers.pop(index)
+        return bytearray(length)
+
+    def release(self, data: bytes | memoryview) -> None:
+        if isinstance(data, memoryview) and isinstance(data.obj, bytearray):
+            self.buffers.append(data.obj)
+
+    async def _read_into(self, view: memoryview, offset: int, end: int) -> int:
+        received = 0
+        async with self.client.stream('GET', self.url, headers={'Range': f'bytes={offset}-{end}'}) as response:
+            response.raise_for_status()
+            if response.status_code != 206 and offset:
+                raise Exception(f'Range requests are not supported for "{self.url}".')
+
+            # object returned without range support is cut at the end of the requested chunk
+            async for block in response.aiter_bytes():
+                size = min(len(block), len(view) - received)
+                view[received : received + size] = block[:size]
+                received += size
+                if received == len(view):
+                    break
+
+        return received
+
+    async def read(self, offset: int, length: int) -> bytes | memoryview:
+        end = min(offset + length, self.size) - 1
+        if end < offset:
+            return b''
+
+        buffer = self._take_buffer(length)
+        try:
+            received = await self._read_into(memoryview(buffer)[: end - offset + 1], offset, end)
+        except BaseException:
+            self.buffers.append(buffer)
+            raise
+
+        return memoryview(buffer)[:received]
@@ -7,21 +7,26 @@
 import asyncio
 import atexit
 import json
+import time
 from pathlib import Path
 
 import click
 from common import ProjectClient
+from operations.bandwidth import BandwidthLimiter
 from operations.config import get_settings
 from operations.kafka_producer import KafkaProducer
 from operations.logger import logger
 from operations.managers import CopyManager
 from operations.managers import CopyPreparationManager
 from operations.minio_boto3_client import MinioBoto3Client
+from operations.models import ZoneType
 from operations.models import get_timestamp
+from operations.scratch_space import ScratchSpace
 from operations.services.approval.client import ApprovalServiceClient
 from operations.services.dataops.client import DataopsServiceClient
 from operations.services.dataops.client import JobStatus
 from operations.services.dataops.client import ResourceLockOperation
+from operations.services.dataops.heartbeat import ResourceLockHeartbeat
 from operations.services.metadata.client import MetadataServiceClient
 from operations.services.notification.client import NotificationServiceClient
 from operations.services.notification.models import NotificationType
@@ -56,6 +61,7 @@ def copy(
     """Copy files from source geid into destination geid."""
 
     click.echo(f'Starting copy process from "{source_id}" into "{destination_id}" including only "{set(include_ids)}".')
+    job_started_at = time.monotonic()
 
     settings = get_settings()
 
@@ -68,11 +74,22 @@ def copy(
         settings.TEMP_DIR,
         project_client,
         access_token,
+        ScratchSpace(settings.TEMP_DIR, settings.SCRATCH_SPACE_BUDGET, settings.SCRATCH_SPACE_WAIT_TIMEOUT),
+        settings.SOURCE_URL_EXPIRATION,
+    )
+    dataops_client = DataopsServiceClient(
+        settings.DATAOPS_SERVICE,
+        settings.RESOURCE_LOCK_CHUNK_SIZE,
+        settings.RESOURCE_LOCK_HIERARCHICAL,
+        settings.RESOURCE_LOCK_TTL,
     )
-    dataops_client = DataopsServiceClient(settings.DATAOPS_SERVICE)
 
     minio_client = MinioBoto3Client(
-        settings.S3_ACCESS_KEY, settings.S3_SECRET_KEY, settings.S3_URL, settings.S3_INTERNAL_HTTPS
+        settings.S3_ACCESS_KEY,
+        settings.S3_SECRET_KEY,
+        settings.S3_URL,
+        settings.S3_INTERNAL_HTTPS,
+        BandwidthLimiter(settings.UPLOAD_BANDWIDTH_LIMIT),
     )
 
     loop = asyncio.get_event_loop()
@@ -138,13 +155,21 @@ def copy(
 
         traverser = Traverser(copy_preparation_manager)
         traverser.traverse_tree(source_folder, destination_folder)
+        copy_preparation_manager.register_folders(project_code, ZoneType.CORE, settings.FOLDER_REGISTRATION_WORKERS)
         registered_file_nodes = {}
 
         loop = asyncio.get_event_loop()
         project = loop.run_until_complete(metadata_service_client.get_project_by_code(project_code))
 
+        lock_heartbeat = ResourceLockHeartbeat(
+            dataops_client,
+            copy_preparation_manager.read_lock_paths,
+            ResourceLockOperation.READ,
+            settings.RESOURCE_LOCK_HEARTBEAT_INTERVAL,
+        )
         try:
             dataops_client.lock_resources(copy_preparation_manager.read_lock_paths, ResourceLockOperation.READ)
+            lock_heartbeat.start()
             register_file_nodes = copy_preparation_manager.register_file_nodes
             registered_file_nodes = metadata_service_client.register_nodes(register_file_nodes, project_code, timestamp)
             source_file_node = copy_preparation_manager.source_file_node
@@ -163,10 +188,12 @@ def copy(
                 operator,
                 minio_client,
                 operation_type,
+                lock_heartbeat,
             )
             copy_manager.process_files(registered_file_nodes, source_file_node)
             copy_manager.process_folders(source_folder_nodes)
         finally:
+            lock_heartbeat.stop()
             dataops_client.unlock_resources(copy_preparation_manager.read_lock_paths, ResourceLockOperation.READ)
             metadata_service_client.remove_registrated_nodes(registered_file_nodes)
 
@@ -188,6 +215,8 @@ def copy(
             node_ids=include_node_ids,
             source_id=source_folder.id,
             destination_id=destination_folder.id,
+            job_seconds=round(time.monotonic() - job_started_at, 3),
+            lock_metrics=dataops_client.lock_metrics.to_dict(),
         )
     except Exception as e:
         logger.audit(
@@ -197,6 +226,8 @@ def copy(
             node_ids=include_node_ids,
             source_id=source_folder.id,
             destination_id=destination_folder.id,
+            job_seconds=round(time.monotonic() - job_started_at, 3),
+            lock_metrics=dataops_client.lock_metrics.to_dict(),
         )
         click.echo(f'Exception occurred while performing copy operation: {e}')
         try:
@@ -10,18 +10,30 @@ import datetime as dt
 from functools import wraps
 from pathlib import Path
 from uuid import UUID
-from uuid import uuid4
 
 import click
+import httpx
 from common import ProjectClient
 from common import get_boto3_client
+from common.object_storage_adaptor.boto3_client import Boto3Client
+from operations.bandwidth import BandwidthLimiter
+from operations.chunk_sources import PresignedUrlSource
 from operations.config import get_settings
 from operations.logger import logger
+from operations.managers import CentralNodeCopyManager
+from operations.models import Node
+from operations.models import ResourceType
 from operations.models import get_timestamp
+from operations.services.central_node.adaptive import AdaptiveLimiter
 from operations.services.central_node.client import CentralNodeClient
+from operations.services.central_node.compression import choose_compression
+from operations.services.central_node.compression import get_compressed_name
+from operations.services.central_node.upload_state import FileUploadState
+from operations.services.central_node.upload_state import UploadStateStore
 from operations.services.dataops.client import DataopsServiceClient
 from operations.services.dataops.client import JobStatus
 from operations.services.metadata.client import MetadataServiceClient
+from operations.traverser import Traverser
 
 
 def click_command_async(f):
@@ -34,8 +46,192 @@ def click_command_async(f):
     return wrapper
 
 
+def get_unique_name(node: Node, copy_unique_id: str) -> str:
+    """Return name with unique suffix added before the file extension."""
+
+    if node.is_folder:
+        return f'{node.name}-{copy_unique_id}'
+
+    name, *extensions = node.name.rsplit('.', 1)
+    name = f'{name}-{copy_unique_id}'
+    if extensions:
+        name += f'.{".".join(extensions)}'
+    return name
+
+
+def get_compression(source_file: Node) -> str | None:
+    return choose_compression(source_file.name, get_settings().CENTRAL_NODE_COMPRESSION)
+
+
+def get_upload_key(source_file: Node, destination_folder: str) -> str:
+    return f'{source_file.id}:{destination_folder}/{source_file.name}'
+
+
+def get_top_level_item(destination_folder: str) -> str | None:
+    return destination_folder.split('/', 2)[1] if '/' in destination_folder else None
+
+
+def get_upload_state(job_id: str) -> UploadStateStore:
+    """Return upload state store of the job and remove expired state left by failed jobs that were never retried."""
+
+    settings = get_settings()
+    state_dir = settings.CENTRAL_NODE_UPLOAD_STATE_DIR or Path(settings.TEMP_DIR) / 'upload_state'
+    upload_state = UploadStateStore(state_dir, job_id)
+    upload_state.remove_expired(settings.CENTRAL_NODE_UPLOAD_STATE_MAX_AGE)
+    return upload_state
+
+
+def group_files(
+    files: list[tuple[Node, str]], upload_state: UploadStateStore
+) -> tuple[list[tuple[tuple[Node, str], FileUploadState]], dict[str | None, list[tuple[Node, str]]]]:
+    """Split files into unfinished uploads of the previous attempt and new files grouped by the top level item."""
+
+    resumed_files = []
+    files_by_top_level_item = {}
+    for source_file, destination_folder in files:
+        file_state = upload_state.get_file(get_upload_key(source_file, destination_folder))
+        if file_state:
+            if not file_state.is_uploaded:
+                resumed_files.append(((source_file, destination_folder), file_state))
+            continue
+
+        files_by_top_level_item.setdefault(get_top_level_item(destination_folder), []).append(
+            (source_file, destination_folder)
+        )
+
+    return resumed_files, files_by_top_level_item
+
+
+async def pre_upload_files(
+    central_node_client: CentralNodeClient,
+    project_code: str,
+    name_folder_id: UUID,
+    files: list[tuple[Node, str]],
+    top_level_item: str | None,
+    upload_state: UploadStateStore,
+) -> list[tuple[tuple[Node, str], FileUploadState]]:
+    """Pre-upload files of one top level item in batches and store the upload state of each file."""
+
+    pre_uploaded_files = []
+    batch_size = get_settings().CENTRAL_NODE_PRE_UPLOAD_BATCH_SIZE
+    for start in range(0, len(files), batch_size):
+        batch = files[start : start + batch_size]
+        results = await central_node_client.files_pre_upload(
+            project_code,
+            [
+                (destination_folder, get_compressed_name(source_file.name, get_compression(source_file)))
+                for source_file, destination_folder in batch
+            ],
+            name_folder_id,
+            'AS_FOLDER' if top_level_item else 'AS_FILE',
+            top_level_item or '',
+        )
+        for file, file_pre_upload_data in zip(batch, results):
+            pre_uploaded_files.append((file, upload_state.create_file(get_upload_key(*file), file_pre_upload_data)))
+
+    return pre_uploaded_files
+
+
+async def upload_files(
+    central_node_client: CentralNodeClient,
+    minio_client: Boto3Client,
+    files: list[tuple[Node, str]],
+    project_code: str,
+    upload_state: UploadStateStore,
+) -> None:
+    """Pre-upload files in batches and upload them concurrently sharing one adaptive limit of concurrent chunk uploads.
+
+    Files are grouped by the top level item, so each copied folder is recreated under the name folder. Files that
+    were pre-uploaded by the previous attempt of the job resume their uploads and files that were fully uploaded are
+    skipped. Resumed file that is rejected by the central node is pre-uploaded and uploaded again from scratch. Files
+    are compressed while they are uploaded when the compression is configured.
+    """
+
+    settings = get_settings()
+
+    name_folder_id = await central_node_client.get_name_folder_id(project_code)
+
+    resumed_files, files_by_top_level_item = group_files(files, upload_state)
+
+    if resumed_files:
+        logger.info(f'Resuming uploads of {len(resumed_files)} file(s) from the previous attempt.')
+
+    pre_uploaded_files = []
+    for top_level_item, item_files in files_by_top_level_item.items():
+        pre_uploaded_files.extend(
+            await pre_upload_files(
+                central_node_client, project_code, name_folder_id, item_files, top_level_item, upload_state
+            )
+        )
+
+    chunk_limiter = AdaptiveLimiter(
+        settings.CENTRAL_NODE_MAX_CONCURRENT_CHUNKS, maximum=settings.CENTRAL_NODE_MAX_CONCURRENT_CHUNKS_LIMIT
+    )
+    file_semaphore = asyncio.Semaphore(settings.CENTRAL_NODE_MAX_CONCURRENT_FILES)
+
+    async def upload_file(source_file: Node, destination_folder: str, file_state: FileUploadState) -> None:
+        compression = get_compression(source_file)
+        async with file_semaphore:
+            source_file_location = source_file.file_bucket_location
+            source_url = await minio_client.get_download_presigned_url(
+                source_file_location.bucket_name, source_file_location.object_path, settings.SOURCE_URL_EXPIRATION
+            )
+            async with PresignedUrlSource(source_url, source_file.size) as source:
+                await central_node_client.upload_file(
+                    source,
+                    file_state.file_pre_upload_data,
+                    destination_folder,
+                    get_compressed_name(source_file.name, compression),
+                    project_code,
+                    settings.CENTRAL_NODE_CHUNK_SIZE,
+                    chunk_limiter,
+                    2 * settings.CENTRAL_NODE_MAX_CONCURRENT_CHUNKS,
+                    upload_state=file_state,
+                    compression=compression,
+                )
+
+    async def resume_file(source_file: Node, destination_folder: str, file_state: FileUploadState) -> None:
+        try:
+            await upload_file(source_file, destination_folder, file_state)
+        except httpx.HTTPStatusError as e:
+            if not e.response.is_client_error:
+                raise
+            logger.warning(
+                f'Resumed upload of "{destination_folder}/{source_file.name}" was rejected by the central node, '
+                f'uploading it again: {e}'
+            )
+            ((_, file_state),) = await pre_upload_files(
+                central_node_client,
+                project_code,
+                name_folder_id,
+                [(source_file, destination_folder)],
+                get_top_level_item(destination_folder),
+                upload_state,
+            )
+            await upload_file(source_file, destination_folder, file_state)
+
+    logger.info(f'Uploading {len(resumed_files) + len(pre_uploaded_files)} file(s) to the central node.')
+    results = await asyncio.gather(
+        *[resume_file(*file, file_state) for file, file_state in resumed_files],
+        *[upload_file(*file, file_state) for file, file_state in pre_uploaded_files],
+        return_exceptions=True,
+    )
+    logger.info(
+        'Finished uploading files to the central node.',
+        {
+            'rtt_seconds': central_node_client.rtt,
+            'upload': chunk_limiter.to_dict(),
+            'bandwidth': central_node_client.bandwidth.to_dict(),
+        },
+    )
+
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors:
+        raise Exception(errors)
+
+
 @click_command_async
-@click.option('--file-id', type=UUID, required=True)
+@click.option('--file-id', type=UUID, multiple=True, required=True, help='Id of file or folder, can be repeated.')
 @click.option('--destination-api-url-base64', type=str, required=True)
 @click.option('--destination-project-code', type=str, required=True)
 @click.option('--destination-access-token', type=str, required=True)
@@ -43,8 +239,9 @@ def click_command_async(f):
 @click.option('--session-id', type=str, required=True)
 @click.option('--operator', type=str, required=True)
 @click.option('--access-token', type=str, required=True)
+@click.option('--bandwidth-limit', type=int, help='Bytes per second, overrides CENTRAL_NODE_BANDWIDTH_LIMIT setting.')
 async def copy_to_central_node(
-    file_id: UUID,
+    file_id: tuple[UUID, ...],
     destination_api_url_base64: str,
     destination_project_code: str,
     destination_access_token: str,
@@ -52,11 +249,13 @@ async def copy_to_central_node(
     session_id: str,
     operator: str,
     access_token: str,
+    bandwidth_limit: int | None,
 ):
-    """Copy to the central node."""
+    """Copy files and folders to the central node."""
 
+    file_ids = [str(id_) for id_ in file_id]
     click.echo(
-        f'Starting copy to the central node process for file id "{file_id}" into '
+        f'Starting copy to the central node process for ids "{file_ids}" into '
         f'"{destination_project_code}" destination project.'
     )
 
@@ -82,51 +281,64 @@ async def copy_to_central_node(
         endpoint=base64.urlsafe_b64decode(destination_api_url_base64.encode()).decode(),
         access_token=destination_access_token,
         session_id=session_id,
+        max_connections=settings.CENTRAL_NODE_MAX_CONNECTIONS,
+        http2=settings.CENTRAL_NODE_HTTP2,
+        bandwidth=BandwidthLimiter(
+            settings.CENTRAL_NODE_BANDWIDTH_LIMIT if bandwidth_limit is None else bandwidth_limit
+        ),
     )
 
-    source_file = metadata_service_client.get_item_by_id(str(file_id))
-    source_project_code = source_file.container_code
-    copy_unique_id = dt.datetime.now(tz=dt.timezone.utc).strftime('%Y-%m-%d') + '-' + str(get_timestamp())
-    source_file_name, *extensions = source_file.name.rsplit('.', 1)
-    destination_file_name = f'{source_file_name}-{copy_unique_id}'
-    if extensions:
-        destination_file_name += f'.{".".join(extensions)}'
+    source_nodes = list(metadata_service_client.get_items_by_ids(file_ids).values())
+    if not source_nodes:
+        raise Exception(f'Unable to find any of the items "{file_ids}" to copy to the central node.')
+    source_project_code = source_nodes[0].container_code
+    target_names = [node.name for node in source_nodes]
+    # job keeps the existing node types, copy that includes any folder is reported as folder copy
+    target_type = ResourceType.FOLDER if any(node.is_folder for node in source_nodes) else ResourceType.FILE
+    upload_state = get_upload_state(job_id)
+    copy_unique_id = upload_state.setdefault(
+        'copy_unique_id', dt.datetime.now(tz=dt.timezone.utc).strftime('%Y-%m-%d') + '-' + str(get_timestamp())
+    )
 
     try:
         logger.audit(
             'Attempting to copy to the central node.',
             operator=operator,
-            file_id=source_file.id,
+            node_ids=file_ids,
             project_code=source_project_code,
         )
 
-        temp_file_path = Path(f'{settings.TEMP_DIR}/{uuid4()}')
-        source_file_location = source_file.file_bucket_location
-
         try:
-            await minio_client.download_object(
-                source_file_location.bucket_name, source_file_location.object_path, str(temp_file_path)
-            )
-            logger.info(f'File successfully downloaded into the temporary file "{temp_file_path}".')
-
-            await central_node_client.upload_file_to_project(
-                file_path=temp_file_path,
-                destination_file_name=destination_file_name,
-                project_code=destination_project_code,
-                chunk_size=20 * 1024 * 1024,
-                max_concurrent=4,
-            )
+            central_node_copy_manager = CentralNodeCopyManager(metadata_service_client)
+            traverser = Traverser(central_node_copy_manager)
+            for source_node in source_nodes:
+                destination_node = Node({**source_node, 'name': get_unique_name(source_node, copy_unique_id)})
+                if destination_node.is_folder:
+                    destination_folder = central_node_copy_manager.process_folder(
+                        destination_node, central_node_client.username
+                    )
+                    traverser.traverse_tree(destination_node, destination_folder)
+                else:
+                    central_node_copy_manager.process_file(destination_node, central_node_client.username)
+
+            async with central_node_client:
+                await upload_files(
+                    central_node_client,
+                    minio_client,
+                    central_node_copy_manager.files,
+                    destination_project_code,
+                    upload_state,
+                )
+            upload_state.remove()
         except Exception as e:
             logger.exception('Error occurred while copying to the central node.')
             raise e
-        finally:
-            temp_file_path.unlink(missing_ok=True)
 
         dataops_client.update_job(
             session_id=session_id,
             job_id=job_id,
-            target_names=[source_file.name],
-            target_type='file',
+            target_names=target_names,
+            target_type=target_type,
             container_code=source_project_code,
             action_type='data_import',
             status=JobStatus.SUCCEED,
@@ -135,14 +347,14 @@ async def copy_to_central_node(
         logger.audit(
             'Successfully managed to copy to the central node.',
             operator=operator,
-            file_id=source_file.id,
+            node_ids=file_ids,
             project_code=source_project_code,
         )
     except Exception as e:
         logger.audit(
             'Received an unexpected error while attempting to copy to the central node.',
             operator=operator,
-            file_id=source_file.id,
+            node_ids=file_ids,
             project_code=source_project_code,
         )
         click.echo(f'Exception occurred while performing copy to the central node operation: {e}')
@@ -150,8 +362,8 @@ async def copy_to_central_node(
             dataops_client.update_job(
                 session_id=session_id,
                 job_id=job_id,
-                target_names=[source_file.name],
-                target_type='file',
+                target_names=target_names,
+                target_type=target_type,
                 container_code=source_project_code,
                 action_type='data_import',
                 status=JobStatus.FAILED,
@@ -62,7 +62,12 @@ def delete(
         project_client,
         access_token,
     )
-    dataops_client = DataopsServiceClient(settings.DATAOPS_SERVICE)
+    dataops_client = DataopsServiceClient(
+        settings.DATAOPS_SERVICE,
+        settings.RESOURCE_LOCK_CHUNK_SIZE,
+        settings.RESOURCE_LOCK_HIERARCHICAL,
+        settings.RESOURCE_LOCK_TTL,
+    )
 
     minio_client = MinioBoto3Client(
         settings.S3_ACCESS_KEY, settings.S3_SECRET_KEY, settings.S3_URL, settings.S3_INTERNAL_HTTPS
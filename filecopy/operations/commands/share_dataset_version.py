@@ -6,13 +6,17 @@
 
 import asyncio
 import datetime as dt
-import shutil
+import io
 import zipfile
-from pathlib import Path
+from collections.abc import Coroutine
+from typing import Any
+from typing import BinaryIO
+from typing import TypeVar
 from uuid import UUID
 
 import click
 from common import ProjectClient
+from operations.bandwidth import BandwidthLimiter
 from operations.config import get_settings
 from operations.logger import logger
 from operations.managers import ShareDatasetManager
@@ -21,11 +25,63 @@ from operations.models import FileBucketLocation
 from operations.models import Node
 from operations.models import ZoneType
 from operations.models import get_timestamp
+from operations.models import parse_datetime
+from operations.ranged_reader import RangedHttpReader
 from operations.services.dataops.client import DataopsServiceClient
 from operations.services.dataops.client import JobStatus
 from operations.services.dataset.client import DatasetServiceClient
 from operations.services.metadata.client import MetadataServiceClient
 from operations.traverser import Traverser
+from operations.version_cache import DatasetVersionCache
+
+VERSION_ARCHIVE_BUFFER_SIZE = 1024 * 1024
+
+T = TypeVar('T')
+
+
+def run_coroutine(loop: asyncio.AbstractEventLoop, coroutine: Coroutine[Any, Any, T]) -> T:
+    """Run coroutine on the loop, waiting for it from executor threads while the loop is sharing files."""
+
+    if loop.is_running():
+        return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+    return loop.run_until_complete(coroutine)
+
+
+def open_version_file(
+    minio_client: MinioBoto3Client,
+    version_id: str,
+    version_file: FileBucketLocation,
+    loop: asyncio.AbstractEventLoop | None = None,
+) -> BinaryIO:
+    """Open dataset version archive from the local cache if enabled or stream it from the object storage.
+
+    Loop must be given when the archive is opened from executor threads.
+    """
+
+    settings = get_settings()
+    loop = loop or asyncio.get_event_loop()
+
+    if settings.VERSION_CACHE_SIZE:
+        version_cache = DatasetVersionCache(settings.VERSION_CACHE_DIR, settings.VERSION_CACHE_SIZE)
+        return version_cache.open_or_fill(
+            version_id,
+            version_file.location,
+            lambda path: run_coroutine(
+                loop, minio_client.download_object(version_file.bucket_name, version_file.object_path, str(path))
+            ),
+        )
+
+    def get_version_file_url() -> str:
+        return run_coroutine(
+            loop,
+            minio_client.client.get_download_presigned_url(
+                version_file.bucket_name, version_file.object_path, settings.SOURCE_URL_EXPIRATION
+            ),
+        )
+
+    reader = RangedHttpReader(get_version_file_url(), url_factory=get_version_file_url)
+    return io.BufferedReader(reader, VERSION_ARCHIVE_BUFFER_SIZE)
 
 
 @click.command()
@@ -35,6 +91,7 @@ from operations.traverser import Traverser
 @click.option('--session-id', type=str, required=True)
 @click.option('--operator', type=str, required=True)
 @click.option('--access-token', type=str, required=True)
+@click.option('--bandwidth-limit', type=int, help='Bytes per second, overrides UPLOAD_BANDWIDTH_LIMIT setting.')
 def share_dataset_version(
     version_id: UUID,
     destination_project_code: str,
@@ -42,13 +99,13 @@ def share_dataset_version(
     session_id: str,
     operator: str,
     access_token: str,
+    bandwidth_limit: int | None,
 ):
     """Copy dataset version into project."""
 
     click.echo(f'Starting copy process for dataset version "{version_id}" into "{destination_project_code}" project.')
 
     settings = get_settings()
-    loop = asyncio.get_event_loop()
 
     dataset_service_client = DatasetServiceClient(settings.DATASET_SERVICE)
     project_service_client = ProjectClient(settings.PROJECT_SERVICE, settings.REDIS_URL)
@@ -62,7 +119,11 @@ def share_dataset_version(
     )
     dataops_client = DataopsServiceClient(settings.DATAOPS_SERVICE)
     minio_client = MinioBoto3Client(
-        settings.S3_ACCESS_KEY, settings.S3_SECRET_KEY, settings.S3_URL, settings.S3_INTERNAL_HTTPS
+        settings.S3_ACCESS_KEY,
+        settings.S3_SECRET_KEY,
+        settings.S3_URL,
+        settings.S3_INTERNAL_HTTPS,
+        BandwidthLimiter(settings.UPLOAD_BANDWIDTH_LIMIT if bandwidth_limit is None else bandwidth_limit),
     )
 
     dataset_version_obj = dataset_service_client.get_dataset_version(version_id)
@@ -100,41 +161,40 @@ def share_dataset_version(
             ZoneType.GREENROOM,
         )
 
-        temp_extract_to_path = Path(f'{settings.TEMP_DIR}/{destination_folder_name}')
-        temp_file_path = Path(f'{temp_extract_to_path}.zip')
-
         try:
             version_file = FileBucketLocation(dataset_version_location)
-            loop.run_until_complete(
-                minio_client.client.download_object(
-                    version_file.bucket_name, version_file.object_path, str(temp_file_path)
-                )
-            )
-            logger.info(f'Dataset version successfully downloaded into the temporary file "{temp_file_path}".')
+            version_file_obj = open_version_file(minio_client, str(version_id), version_file)
+            loop = asyncio.get_event_loop()
 
-            temp_extract_to_path.mkdir()
-            with zipfile.ZipFile(temp_file_path, 'r') as zip_ref:
-                zip_ref.extractall(temp_extract_to_path)
-            logger.info(f'Dataset version successfully extracted into the temporary folder "{temp_extract_to_path}".')
-
-            share_dataset_manager = ShareDatasetManager(
-                metadata_service_client, minio_client, destination_project_code, ZoneType.GREENROOM, operator
-            )
+            with version_file_obj, zipfile.ZipFile(version_file_obj) as version_archive:
+                logger.info(
+                    f'Dataset version archive "{version_file.file_full_path}" opened '
+                    f'with {len(version_archive.infolist())} members.'
+                )
 
-            temp_extract_to_path_as_node = Node(
-                {
-                    'name': temp_extract_to_path.name,
-                    'parent_path': temp_extract_to_path.parent,
-                }
-            )
-            traverser = Traverser(share_dataset_manager)
-            traverser.traverse_tree(temp_extract_to_path_as_node, destination_folder_node)
+                share_dataset_manager = ShareDatasetManager(
+                    metadata_service_client,
+                    minio_client,
+                    destination_project_code,
+                    ZoneType.GREENROOM,
+                    operator,
+                    version_archive,
+                    settings.SHARE_MAX_CONCURRENT_FILES,
+                    metadata_service_client.get_dataset_files(dataset_code),
+                    parse_datetime(dataset_version_obj.get('created_at')),
+                    settings.SHARE_DECOMPRESSION_WORKERS,
+                    lambda: open_version_file(minio_client, str(version_id), version_file, loop),
+                )
+                traverser = Traverser(share_dataset_manager)
+                traverser.traverse_tree(share_dataset_manager.root_folder, destination_folder_node)
+                share_dataset_manager.register_folders(
+                    destination_project_code, ZoneType.GREENROOM, settings.FOLDER_REGISTRATION_WORKERS
+                )
+                share_dataset_manager.share_files()
+                logger.info('Dataset version files shared.', {'bandwidth': minio_client.bandwidth.to_dict()})
         except Exception as e:
             logger.exception('Error occurred while traversing dataset version tree.')
             raise e
-        finally:
-            temp_file_path.unlink(missing_ok=True)
-            shutil.rmtree(temp_extract_to_path, ignore_errors=True)
 
         dataops_client.update_job(
             session_id=session_id,
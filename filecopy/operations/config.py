@@ -5,11 +5,13 @@
 # You may not use this file except in compliance with the License.
 
 import logging
+import os
 from functools import lru_cache
 from typing import Any
 
 from pydantic import BaseSettings
 from pydantic import Extra
+from pydantic import validator
 
 
 class Settings(BaseSettings):
@@ -38,6 +40,34 @@ class Settings(BaseSettings):
     CORE_ZONE_LABEL: str = 'Core'
 
     TEMP_DIR: str = './filecopy'
+    # bytes of scratch space in temp dir that jobs may reserve, zero means limited only by free disk space
+    SCRATCH_SPACE_BUDGET: int = 0
+    SCRATCH_SPACE_WAIT_TIMEOUT: int = 300
+    # seconds for which presigned urls of objects that are streamed in ranges stay valid
+    SOURCE_URL_EXPIRATION: int = 6 * 60 * 60
+    # bytes per second shared by all uploads of the job into the object storage, zero means unlimited
+    UPLOAD_BANDWIDTH_LIMIT: int = 0
+
+    CENTRAL_NODE_MAX_CONNECTIONS: int = 20
+    # zero chooses chunk size from the file size and measured round trip time to the central node
+    CENTRAL_NODE_CHUNK_SIZE: int = 0
+    # initial and maximum number of concurrent chunk uploads shared by all files uploaded at the same time
+    CENTRAL_NODE_MAX_CONCURRENT_CHUNKS: int = 4
+    CENTRAL_NODE_MAX_CONCURRENT_CHUNKS_LIMIT: int = 16
+    CENTRAL_NODE_MAX_CONCURRENT_FILES: int = 4
+    CENTRAL_NODE_PRE_UPLOAD_BATCH_SIZE: int = 500
+    # requires optional "h2" package, otherwise HTTP/1.1 is used
+    CENTRAL_NODE_HTTP2: bool = False
+    # bytes per second shared by all chunk uploads of the job to the central node, zero means unlimited
+    CENTRAL_NODE_BANDWIDTH_LIMIT: int = 0
+    # "gzip" or "zstd" compresses files while uploading them, receiving upload service must accept compressed files
+    CENTRAL_NODE_COMPRESSION: str = ''
+    # absolute path to persistent directory with upload state of central node copy jobs, which lets retried jobs
+    # resume failed uploads, empty keeps the state in temp dir, which may not outlive the job process
+    CENTRAL_NODE_UPLOAD_STATE_DIR: str = ''
+    # seconds after which upload state left by failed jobs that were never retried is removed
+    CENTRAL_NODE_UPLOAD_STATE_MAX_AGE: int = 7 * 24 * 60 * 60
+
     COPIED_WITH_APPROVAL_TAG: str = 'copied-to-core'
     REDIS_USER: str = 'default'
     REDIS_PASSWORD: str = ''
@@ -46,6 +76,27 @@ class Settings(BaseSettings):
     REDIS_URL: str = ''
     KAFKA_URL: str = ''
 
+    RESOURCE_LOCK_CHUNK_SIZE: int = 1000
+    # enable only if dataops lock on the folder key also covers all keys below it
+    RESOURCE_LOCK_HIERARCHICAL: bool = False
+    # locks expire after ttl seconds unless they are renewed, zero means locks never expire
+    RESOURCE_LOCK_TTL: int = 0
+    RESOURCE_LOCK_HEARTBEAT_INTERVAL: int = 60
+
+    SHARE_MAX_CONCURRENT_FILES: int = 8
+    # number of threads decompressing version archive members, zero means number of cpu cores
+    SHARE_DECOMPRESSION_WORKERS: int = 0
+    FOLDER_REGISTRATION_WORKERS: int = 8
+    # size budget in bytes for locally cached dataset version archives, zero disables the cache
+    VERSION_CACHE_SIZE: int = 0
+    VERSION_CACHE_DIR: str = './version_cache'
+
+    @validator('CENTRAL_NODE_UPLOAD_STATE_DIR')
+    def validate_upload_state_dir(cls, value: str) -> str:
+        if value and not os.path.isabs(value):
+            raise ValueError('must be an absolute path to the persistent directory')
+        return value
+
     def __init__(self, *args: Any, **kwds: Any) -> None:
         super().__init__(*args, **kwds)
 
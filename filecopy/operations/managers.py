@@ -5,12 +5,25 @@
 # You may not use this file except in compliance with the License.
 
 import asyncio
+import os
+import threading
+import zipfile
+from collections.abc import Callable
+from concurrent.futures import Executor
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import cached_property
 from pathlib import Path
+from typing import IO
+from typing import BinaryIO
 
 from operations.duplicated_file_names import DuplicatedFileNames
 from operations.kafka_producer import KafkaProducer
 from operations.logger import logger
+from operations.minio_boto3_client import COPY_OBJECT_MAX_SIZE
 from operations.minio_boto3_client import MinioBoto3Client
+from operations.models import FileBucketLocation
+from operations.models import FolderToRegister
 from operations.models import ItemStatus
 from operations.models import Node
 from operations.models import NodeList
@@ -18,8 +31,10 @@ from operations.models import NodeToRegister
 from operations.models import ResourceType
 from operations.models import ZoneType
 from operations.models import get_timestamp
+from operations.models import parse_datetime
 from operations.services.approval.client import ApprovalServiceClient
 from operations.services.dataops.client import DataopsServiceClient
+from operations.services.dataops.heartbeat import ResourceLockHeartbeat
 from operations.services.metadata.client import MetadataServiceClient
 from operations.services.redis.client import RedisClient
 
@@ -29,6 +44,7 @@ class NodeManager:
 
     def __init__(self, metadata_service_client: MetadataServiceClient) -> None:
         self.metadata_service_client = metadata_service_client
+        self.pending_folders: list[FolderToRegister] = []
 
     def get_tree(self, source_folder: Node) -> NodeList:
         """Return child nodes from current source folder."""
@@ -50,6 +66,27 @@ class NodeManager:
 
         raise NotImplementedError
 
+    def queue_folder(self, source_folder: Node, destination_parent_folder: Node) -> Node:
+        """Queue destination folder for bulk creation and return placeholder node that is filled once registered."""
+
+        folder_node = Node(
+            {
+                'id': None,
+                'name': source_folder.name,
+                'parent_path': self.metadata_service_client.format_folder_path(destination_parent_folder, '/'),
+                'type': ResourceType.FOLDER,
+            }
+        )
+        self.pending_folders.append(FolderToRegister(source_folder, destination_parent_folder, folder_node))
+
+        return folder_node
+
+    def register_folders(self, project_code: str, zone: ZoneType, max_workers: int) -> None:
+        """Create all folders queued during traversing in bulk."""
+
+        folders, self.pending_folders = self.pending_folders, []
+        self.metadata_service_client.register_folders(project_code, folders, zone, max_workers)
+
 
 class BaseCopyManager(NodeManager):
     """Base manager for copying process with approved entities."""
@@ -118,6 +155,7 @@ class CopyManager:
         operator: str,
         minio_client: MinioBoto3Client,
         operation_type: str,
+        lock_heartbeat: ResourceLockHeartbeat | None = None,
     ) -> None:
 
         self.metadata_service_client = metadata_service_client
@@ -125,6 +163,7 @@ class CopyManager:
         self.approved_entities = approved_entities
 
         self.dataops_client = dataops_client
+        self.lock_heartbeat = lock_heartbeat
         self.system_tags = system_tags
         self.project_code = project['code']
         self.operator = operator
@@ -185,6 +224,8 @@ class CopyManager:
 
     def process_files(self, registered_file_nodes: dict[str, Node], source_file_node: dict[str, Node]) -> None:
         for item in registered_file_nodes:
+            if self.lock_heartbeat:
+                self.lock_heartbeat.check()
             updated_node = self._process_file(source_file_node[item], registered_file_nodes[item])
             registered_file_nodes[item] = updated_node
 
@@ -238,9 +279,7 @@ class CopyPreparationManager(BaseCopyManager):
             f'Processing source folder "{source_folder}" ' f'against destination parent path "{destination_parent}".'
         )
         source_path = self.source_bucket / source_folder.display_path
-        node = self.metadata_service_client.register_node(
-            self.project_code, source_folder, destination_parent, ResourceType.FOLDER, ItemStatus.ACTIVE, None
-        )
+        node = self.queue_folder(source_folder, destination_parent)
         self.source_folder_nodes[source_folder.id] = source_folder
         self.read_lock_paths.append(source_path)
         return node
@@ -300,20 +339,36 @@ class DeleteManager(NodeManager):
             f'against destination parent folder "{destination_parent_folder}".'
         )
 
+    def _get_upload_cache_key(self, node: Node) -> str:
+        """Return upload cache key for the node.
+
+        The key is <zone>/<project_code>/<object_path>, please make sure it is the same as in upload service.
+        """
+
+        bucket_prefix = {1: 'core'}.get(node.zone, 'greenroom')
+        parent_path = node.restore_path or node.parent_path or ''
+
+        return os.path.join(bucket_prefix, node.container_code, parent_path, node.name)
+
     def archive_nodes(self) -> None:
+        upload_cache_keys = []
         for node_id in self.include_geids:
             logger.info(f'Move the node "{node_id}" into trashbin recursively')
             node = self.metadata_service_client.get_item_by_id(node_id)
-            self.metadata_service_client.archived_node(node, self.minio_client, self.operation_type, self.operator)
+            trash_nodes = self.metadata_service_client.archived_node(
+                node, self.minio_client, self.operation_type, self.operator
+            )
+            upload_cache_keys.extend(self._get_upload_cache_key(Node(item)) for item in trash_nodes)
 
-            # also remove the it from upload cache if it exists
-            # so the key will be <zone>/<bucket>/<object_path>
-            # please make sure it is same in upload service
-            # bucket_prefix = {1: 'core'}.get(node.zone, 'greenroom')
-            # obj_path = os.path.join(bucket_prefix, node.container_code, node.parent_path, node.name)
-            #
-            # if self.redis_client.check_by_key(obj_path):
-            #     self.redis_client.delete_by_key(obj_path)
+        # also remove the trashed subtrees from upload cache if they exist, nodes are already trashed at this point
+        # and stale cache keys only block uploads of the same names until they expire, so errors are not fatal
+        loop = asyncio.get_event_loop()
+        try:
+            removed = loop.run_until_complete(self.redis_client.unlink_by_keys(upload_cache_keys))
+        except Exception as e:
+            logger.warning(f'Failed to remove {len(upload_cache_keys)} keys from upload cache: {e}')
+            return
+        logger.info(f'Removed {removed} out of {len(upload_cache_keys)} keys from upload cache.')
 
 
 class DeletePreparationManager(NodeManager):
@@ -369,6 +424,7 @@ class DeletePreparationManager(NodeManager):
 
 
 class ShareDatasetManager(NodeManager):
+    """Manager to share dataset version by uploading members of the version zip archive."""
 
     def __init__(
         self,
@@ -377,6 +433,12 @@ class ShareDatasetManager(NodeManager):
         destination_project_code: str,
         destination_zone: ZoneType,
         operator: str,
+        version_archive: zipfile.ZipFile,
+        max_concurrent_files: int = 8,
+        dataset_files: dict[str, Node] | None = None,
+        version_created_at: datetime | None = None,
+        decompression_workers: int | None = None,
+        open_version_file: Callable[[], BinaryIO] | None = None,
     ) -> None:
         super().__init__(metadata_service_client)
 
@@ -384,34 +446,156 @@ class ShareDatasetManager(NodeManager):
         self.destination_project_code = destination_project_code
         self.destination_zone = destination_zone
         self.operator = operator
+        self.version_archive = version_archive
+        self.open_version_file = open_version_file
+        self.worker_archives = threading.local()
+        self.opened_archives: list[tuple[zipfile.ZipFile, BinaryIO]] = []
+        self.max_concurrent_files = max_concurrent_files
+        self.dataset_files = dataset_files or {}
+        self.version_created_at = version_created_at
+        self.decompression_workers = decompression_workers or os.cpu_count()
+
+        self.pending_files: list[NodeToRegister] = []
+        self.copied_files = 0
+        self.extracted_files = 0
+
+    @property
+    def root_folder(self) -> Node:
+        """Return node for the root of the version archive to start the traversing from."""
+
+        return Node({'id': '', 'name': '', 'parent_path': None, 'type': ResourceType.FOLDER})
+
+    def _get_member_parts(self, member: zipfile.ZipInfo) -> tuple[str, ...]:
+        """Return path parts of the archive member the same way as they would be extracted."""
+
+        return tuple(part for part in member.filename.split('/') if part not in ('', '.', '..'))
+
+    def _create_archive_node(self, parts: tuple[str, ...], member: zipfile.ZipInfo, type_: ResourceType) -> dict:
+        return {
+            'id': '/'.join(parts),
+            'name': parts[-1],
+            'parent_path': '/'.join(parts[:-1]),
+            'type': type_,
+            'size': member.file_size if type_ == ResourceType.FILE else 0,
+            'owner': self.operator,
+            'archive_member': member.filename,
+            'extended': {'extra': {'tags': []}},
+        }
+
+    def _build_archive_tree(self, members: list[zipfile.ZipInfo]) -> dict[str, dict[str, dict]]:
+        """Build folder id to children mapping in a single pass over the archive index."""
+
+        tree = {'': {}}
+        for member in members:
+            parts = self._get_member_parts(member)
+            if not parts:
+                continue
+
+            for depth in range(1, len(parts) + 1):
+                node_parts = parts[:depth]
+                children = tree['/'.join(node_parts[:-1])]
+                name = node_parts[-1]
+                if depth < len(parts) or member.is_dir():
+                    if children.get(name, {}).get('type') != ResourceType.FOLDER:
+                        children[name] = self._create_archive_node(node_parts, member, ResourceType.FOLDER)
+                    tree.setdefault('/'.join(node_parts), {})
+                elif name not in children:
+                    children[name] = self._create_archive_node(node_parts, member, ResourceType.FILE)
+
+        return tree
+
+    @cached_property
+    def archive_tree(self) -> dict[str, dict[str, dict]]:
+        """Return in-memory hierarchy of the version archive built once from the archive index."""
+
+        members = self.version_archive.infolist()
+        tree = self._build_archive_tree(members)
+        logger.info(f'Indexed {len(members)} archive member(s) into {len(tree)} folder(s).')
+        return tree
 
     def get_tree(self, source_folder: Node) -> NodeList:
-        nodes = []
-
-        source_folder_path = source_folder.parent_path / source_folder.name
-        for path in source_folder_path.iterdir():
-            obj_stat = path.stat()
-            type_ = ResourceType.FILE
-            size = obj_stat.st_size
-            if path.is_dir():
-                type_ = ResourceType.FOLDER
-                size = 0
-            nodes.append(
-                {
-                    'id': obj_stat.st_ino,
-                    'name': path.name,
-                    'parent_path': path.parent,
-                    'type': type_,
-                    'size': size,
-                    'owner': self.operator,
-                    'extended': {'extra': {'tags': []}},
-                }
+        folder_id = '/'.join(part for part in source_folder.id.split('/') if part)
+        children = self.archive_tree.get(folder_id, {})
+
+        return NodeList(list(children.values()))
+
+    def _get_source_object(self, source_file: Node) -> FileBucketLocation | None:
+        """Return location of the dataset object with the same content as the archive member if there is one.
+
+        Object is considered the same when path and size match and the file was not updated after the version was
+        created.
+        """
+
+        dataset_file = self.dataset_files.get(source_file.id)
+        if dataset_file is None or dataset_file.size != source_file.size:
+            return None
+
+        if source_file.size >= COPY_OBJECT_MAX_SIZE or self.version_created_at is None:
+            return None
+
+        last_updated_time = parse_datetime(dataset_file.get('last_updated_time'))
+        if last_updated_time is None or last_updated_time > self.version_created_at:
+            return None
+
+        return dataset_file.file_bucket_location
+
+    async def _copy_source_object(
+        self, source_object: FileBucketLocation, destination_bucket: str, destination_file_path: str
+    ) -> bool:
+        try:
+            await self.minio_client.copy_object(
+                destination_bucket, destination_file_path, source_object.bucket_name, source_object.object_path
             )
+        except Exception:
+            logger.exception(f'Unable to copy "{source_object.file_full_path}", extracting it from archive instead.')
+            return False
 
-        return NodeList(nodes)
+        return True
 
-    def process_file(self, source_file: Node, destination_folder: Node) -> None:
-        target_file_node = self.metadata_service_client.register_file(
+    def _open_archive_member(self, name: str) -> IO[bytes]:
+        """Open archive member through the version archive of the current worker thread.
+
+        Members of one zip file are read through its single file object, so every worker opens its own version file
+        when the opener is given to read members in parallel.
+        """
+
+        if self.open_version_file is None:
+            return self.version_archive.open(name)
+
+        archive = getattr(self.worker_archives, 'archive', None)
+        if archive is None:
+            version_file = self.open_version_file()
+            archive = self.worker_archives.archive = zipfile.ZipFile(version_file)
+            self.opened_archives.append((archive, version_file))
+
+        return archive.open(name)
+
+    def _close_worker_archives(self) -> None:
+        archives, self.opened_archives = self.opened_archives, []
+        for archive, version_file in archives:
+            archive.close()
+            version_file.close()
+        self.worker_archives = threading.local()
+
+    async def _extract_archive_member(
+        self, source_file: Node, destination_bucket: str, destination_file_path: str, executor: Executor
+    ) -> None:
+        """Upload archive member decompressing it in the executor, so members are decompressed in parallel."""
+
+        loop = asyncio.get_running_loop()
+        member = await loop.run_in_executor(executor, self._open_archive_member, source_file['archive_member'])
+        try:
+            await self.minio_client.upload_fileobj(
+                destination_bucket, destination_file_path, member, source_file.size, executor
+            )
+        finally:
+            member.close()
+
+    async def _share_file(self, source_file: Node, destination_folder: Node, executor: Executor) -> None:
+        """Register, upload and activate one file."""
+
+        target_file_node = await asyncio.to_thread(
+            self.metadata_service_client.register_file,
             self.destination_project_code,
             source_file,
             destination_folder,
@@ -421,31 +605,76 @@ class ShareDatasetManager(NodeManager):
         destination_bucket = f'gr-{self.destination_project_code}'
         destination_file_path = f'{destination_folder.parent_path}/{destination_folder.name}/{source_file.name}'
 
-        upload_coroutine = self.minio_client.client.upload_file(
-            destination_bucket,
-            str(source_file.parent_path / source_file.name),
-            destination_file_path,
+        source_object = self._get_source_object(source_file)
+        if source_object and await self._copy_source_object(source_object, destination_bucket, destination_file_path):
+            self.copied_files += 1
+        else:
+            await self._extract_archive_member(source_file, destination_bucket, destination_file_path, executor)
+            self.extracted_files += 1
+
+        new_location = f'minio://{self.minio_client.minio_endpoint}/{destination_bucket}/{destination_file_path}'
+        await asyncio.to_thread(
+            self.metadata_service_client.update_node,
+            target_file_node,
+            {'status': ItemStatus.ACTIVE, 'location_uri': new_location},
         )
-        if source_file.size > 5e9:
-            upload_coroutine = self.minio_client.upload_object(
-                destination_bucket,
-                destination_file_path,
-                str(source_file.parent_path / source_file.name),
-            )
+
+    async def _share_files(self, files: list[NodeToRegister]) -> list[BaseException | None]:
+        semaphore = asyncio.Semaphore(self.max_concurrent_files)
+
+        try:
+            with ThreadPoolExecutor(self.decompression_workers, thread_name_prefix='decompression') as executor:
+
+                async def share_file(file: NodeToRegister) -> None:
+                    async with semaphore:
+                        await self._share_file(file.source_node, file.destination_node, executor)
+
+                return await asyncio.gather(*[share_file(file) for file in files], return_exceptions=True)
+        finally:
+            self._close_worker_archives()
+
+    def share_files(self) -> None:
+        """Share files collected during traversing concurrently and raise all errors that occurred."""
+
+        files, self.pending_files = self.pending_files, []
+        logger.info(
+            f'Sharing {len(files)} file(s) with up to {self.max_concurrent_files} concurrent uploads '
+            f'and {self.decompression_workers} decompression workers.'
+        )
+
         loop = asyncio.get_event_loop()
-        loop.run_until_complete(upload_coroutine)
+        results = loop.run_until_complete(self._share_files(files))
 
-        new_location = f'minio://{self.minio_client.minio_endpoint}/{destination_bucket}/{destination_file_path}'
-        self.metadata_service_client.update_node(
-            target_file_node, {'status': ItemStatus.ACTIVE, 'location_uri': new_location}
+        logger.info(
+            f'Shared {self.copied_files} file(s) with server-side copy '
+            f'and {self.extracted_files} file(s) extracted from archive.'
         )
 
+        errors = [result for result in results if isinstance(result, BaseException)]
+        for error in errors:
+            # cancellation and interrupts are not file errors and must stop the job as they are
+            if not isinstance(error, Exception):
+                raise error
+        if errors:
+            raise Exception(errors)
+
+    def process_file(self, source_file: Node, destination_folder: Node) -> None:
+        self.pending_files.append(NodeToRegister(source_file, destination_folder))
+
     def process_folder(self, source_folder: Node, destination_parent_folder: Node) -> Node:
-        target_folder_node = self.metadata_service_client.register_folder(
-            self.destination_project_code,
-            source_folder,
-            destination_parent_folder,
-            self.destination_zone,
-        )
+        return self.queue_folder(source_folder, destination_parent_folder)
+
+
+class CentralNodeCopyManager(NodeManager):
+    """Manager to collect files that are copied to the central node with their destination folder paths."""
+
+    def __init__(self, metadata_service_client: MetadataServiceClient) -> None:
+        super().__init__(metadata_service_client)
+
+        self.files: list[tuple[Node, str]] = []
+
+    def process_file(self, source_file: Node, destination_folder: str) -> None:
+        self.files.append((source_file, destination_folder))
 
-        return target_folder_node
+    def process_folder(self, source_folder: Node, destination_parent_folder: str) -> str:
+        return f'{destination_parent_folder}/{source_folder.name}'
@@ -8,14 +8,44 @@ import asyncio
 import math
 import os
 import shutil
+from concurrent.futures import Executor
+from typing import Any
+from typing import BinaryIO
 
+import httpx
 from common.object_storage_adaptor.boto3_client import Boto3Client
 from common.object_storage_adaptor.boto3_client import get_boto3_client
+from operations.bandwidth import BandwidthLimiter
+from operations.chunk_sources import iter_blocks
 from operations.logger import logger
 
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+COPY_OBJECT_MAX_SIZE = 5 * 1024 * 1024 * 1024
+
+
+def read_into(fileobj: BinaryIO, buffer: memoryview) -> memoryview:
+    """Fill the buffer from the file-like object and return view of the filled part, which is shorter only at EOF."""
+
+    filled = 0
+    while filled < len(buffer):
+        received = fileobj.readinto(buffer[filled:])
+        if not received:
+            break
+        filled += received
+    return buffer[:filled]
+
 
 class MinioBoto3Client:
-    def __init__(self, access_key: str, secret_key: str, minio_endpoint: str, minio_https: bool) -> None:
+    def __init__(
+        self,
+        access_key: str,
+        secret_key: str,
+        minio_endpoint: str,
+        minio_https: bool,
+        bandwidth: BandwidthLimiter | None = None,
+    ) -> None:
+        self.bandwidth = bandwidth or BandwidthLimiter(0)
         self.minio_access_key = access_key
         self.minio_secret_key = secret_key
         self.minio_endpoint = minio_endpoint
@@ -41,10 +71,32 @@ class MinioBoto3Client:
         result = await self.client.copy_object(source_bucket, source_path, dest_bucket, dest_path)
         return result
 
+    async def upload_part(
+        self,
+        client: httpx.AsyncClient,
+        bucket: str,
+        object_name: str,
+        upload_id: str,
+        part_number: int,
+        data: memoryview,
+    ) -> dict[str, Any]:
+        """Upload part from the buffer without copying it to the presigned url of the part."""
+
+        presigned_url = await self.client.generate_presigned_url(bucket, object_name, upload_id, part_number)
+        response = await client.put(
+            presigned_url,
+            content=iter_blocks(data, bandwidth=self.bandwidth),
+            headers={'Content-Length': str(len(data))},
+        )
+        if response.status_code != 200:
+            raise Exception(f'Fail to upload the chunk {part_number}: {response.text}')
+
+        return {'ETag': response.headers['ETag'].replace('"', ''), 'PartNumber': part_number}
+
     async def upload_object(self, bucket, object_name, file_path, temp_path=None):
         # Here get the total size of the size and set up the max size of each chunk
         try:
-            max_size = 5 * 1024 * 1024
+            max_size = MIN_PART_SIZE
             size = os.path.getsize(file_path)
             logger.info(f'File total size is {size}')
             total_parts = math.ceil(size / max_size)
@@ -54,15 +106,18 @@ class MinioBoto3Client:
             upload_id = upload_id_list[0]
             logger.info(f'The upload id is {upload_id}')
             parts = []
-            with open(file_path, 'rb') as f:
-                for part_number in range(total_parts):
-                    # Cut file into chunks and upload the chunk
-                    file_data = f.read(max_size)
-                    chunk_result = await self.client.part_upload(
-                        bucket, object_name, upload_id, part_number + 1, file_data
-                    )
-                    parts.append(chunk_result)
-                    logger.info(f'Chunk upload result {chunk_result}')
+            # parts are uploaded one by one, so the same buffer is reused for all of them
+            buffer = memoryview(bytearray(max_size))
+            async with httpx.AsyncClient(timeout=60) as client:
+                with open(file_path, 'rb') as f:
+                    for part_number in range(total_parts):
+                        # Cut file into chunks and upload the chunk
+                        file_data = read_into(f, buffer)
+                        chunk_result = await self.upload_part(
+                            client, bucket, object_name, upload_id, part_number + 1, file_data
+                        )
+                        parts.append(chunk_result)
+                        logger.info(f'Chunk upload result {chunk_result}')
             res = await self.client.combine_chunks(bucket, object_name, upload_id, parts)
             logger.info(f'Finalize the large file upload with version is {res}')
         except Exception:
@@ -72,6 +127,44 @@ class MinioBoto3Client:
                 shutil.rmtree(temp_path)
         return res
 
+    async def upload_fileobj(
+        self, bucket: str, object_name: str, fileobj: BinaryIO, size: int, executor: Executor | None = None
+    ) -> dict[str, Any]:
+        """Upload object from file-like source that is read sequentially.
+
+        Reads are performed in the executor, so the source can be a blocking stream like a member of a remote zip
+        archive. The next part is read into the second of two preallocated buffers while the current one is being
+        uploaded.
+        """
+
+        loop = asyncio.get_running_loop()
+
+        part_size = max(MIN_PART_SIZE, math.ceil(size / MAX_PARTS))
+        if size <= part_size:
+            data = await loop.run_in_executor(executor, fileobj.read)
+            await self.bandwidth.consume(len(data))
+            await self.client.upload_object(bucket, object_name, data)
+            return {}
+
+        upload_id_list = await self.client.prepare_multipart_upload(bucket, [object_name])
+        upload_id = upload_id_list[0]
+        logger.info(f'Uploading stream of {size} bytes into "{bucket}/{object_name}" with upload id {upload_id}')
+
+        buffers = [memoryview(bytearray(part_size)), memoryview(bytearray(part_size))]
+        parts = []
+        next_read = loop.run_in_executor(executor, read_into, fileobj, buffers[0])
+        try:
+            async with httpx.AsyncClient(timeout=60) as client:
+                while data := await next_read:
+                    next_read = loop.run_in_executor(executor, read_into, fileobj, buffers[(len(parts) + 1) % 2])
+                    chunk_result = await self.upload_part(client, bucket, object_name, upload_id, len(parts) + 1, data)
+                    parts.append(chunk_result)
+        except BaseException:
+            await asyncio.gather(next_read, return_exceptions=True)
+            raise
+
+        return await self.client.combine_chunks(bucket, object_name, upload_id, parts)
+
     async def remove_object(self, src_bucket, src_obj_path):
         result = await self.client.delete_object(src_bucket, src_obj_path)
         return result
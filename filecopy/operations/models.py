@@ -5,6 +5,8 @@
 # You may not use this file except in compliance with the License.
 
 import time
+from datetime import datetime
+from datetime import timezone
 from enum import Enum
 from enum import unique
 from pathlib import Path
@@ -17,6 +19,23 @@ def get_timestamp() -> int:
     return round(time.time())
 
 
+def parse_datetime(value: str | None) -> datetime | None:
+    """Parse ISO formatted date and time into naive datetime in UTC."""
+
+    if not value:
+        return None
+
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+
+    return parsed
+
+
 def append_suffix_to_filepath(filename: str, suffix: str | int, separator: str = '_') -> str:
     """Append suffix to filepath before extension."""
 
@@ -189,3 +208,22 @@ class NodeToRegister:
     def __init__(self, source_node: Node, destination_node: Node) -> None:
         self.source_node = source_node
         self.destination_node = destination_node
+
+
+class FolderToRegister(NodeToRegister):
+    """Object to store the destination folder that is created in bulk.
+
+    Folder node is a placeholder that is updated in place once the folder is registered.
+    """
+
+    def __init__(self, source_node: Node, destination_node: Node, folder_node: Node) -> None:
+        super().__init__(source_node, destination_node)
+        self.folder_node = folder_node
+
+    @property
+    def path(self) -> str:
+        return f'{self.folder_node.parent_path}/{self.folder_node.name}'
+
+    @property
+    def depth(self) -> int:
+        return self.path.count('/')
@@ -0,0 +1,99 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import io
+from collections.abc import Callable
+
+import httpx
+from operations.logger import logger
+
+
+class RangedHttpReader(io.RawIOBase):
+    """Read-only seekable file that fetches requested bytes with HTTP range requests.
+
+    It allows to open remote zip archives without downloading them, zipfile reads the central directory from the end of
+    the archive and then only the ranges of members that are being read. When url factory is given, presigned url
+    that expired during a long read is replaced with a new one from the factory.
+    """
+
+    def __init__(self, url: str, timeout: int = 300, url_factory: Callable[[], str] | None = None) -> None:
+        super().__init__()
+
+        self.url = url
+        self.url_factory = url_factory
+        self.client = httpx.Client(timeout=timeout)
+        self.position = 0
+        self.size = self._get_size()
+
+    def _get_range(self, start: int, end: int) -> httpx.Response:
+        headers = {'Range': f'bytes={start}-{end}'}
+        response = self.client.get(self.url, headers=headers)
+        if response.status_code == 403 and self.url_factory is not None:
+            logger.info('Access to the object is denied, requesting new presigned url.')
+            self.url = self.url_factory()
+            response = self.client.get(self.url, headers=headers)
+
+        return response
+
+    def _get_size(self) -> int:
+        response = self._get_range(0, 0)
+        if response.status_code == 416:
+            return 0
+        response.raise_for_status()
+
+        content_range = response.headers.get('Content-Range')
+        if content_range:
+            return int(content_range.rsplit('/', 1)[-1])
+
+        return int(response.headers['Content-Length'])
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f'Invalid whence value "{whence}".')
+
+        if position < 0:
+            raise ValueError(f'Negative seek position {position}.')
+
+        self.position = position
+        return self.position
+
+    def readinto(self, buffer: bytearray | memoryview) -> int:
+        if self.position >= self.size or not len(buffer):
+            return 0
+
+        end = min(self.position + len(buffer), self.size) - 1
+        response = self._get_range(self.position, end)
+        response.raise_for_status()
+
+        data = response.content
+        if response.status_code != 206:
+            data = data[self.position : end + 1]
+
+        received = len(data)
+        buffer[:received] = data
+        self.position += received
+
+        return received
+
+    def close(self) -> None:
+        if not self.closed:
+            self.client.close()
+        super().close()
@@ -0,0 +1,145 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import fcntl
+import json
+import os
+import shutil
+import socket
+import tempfile
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+from operations.logger import logger
+
+
+class ScratchSpace:
+    """Allocate unique temporary directories with disk space reserved against a budget.
+
+    Reservations are stored in a ledger file inside the root directory, so jobs running side by side on the same node
+    see each other's reservations. Every reservation records its owner process, so reservations of killed jobs are
+    dropped and their directories removed. Owners on other hosts can't be checked, their reservations are dropped
+    once they are older than the reservation ttl.
+    """
+
+    def __init__(
+        self,
+        root_dir: str | Path,
+        budget: int = 0,
+        wait_timeout: int = 0,
+        poll_interval: int = 5,
+        reservation_ttl: int = 24 * 60 * 60,
+    ) -> None:
+        self.root_dir = Path(root_dir)
+        self.budget = budget
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.reservation_ttl = reservation_ttl
+
+        self.ledger_path = self.root_dir / 'reservations.json'
+
+    def _is_active(self, name: str, reservation: dict[str, Any]) -> bool:
+        """Return False for reservations of removed directories and of jobs that are no longer running."""
+
+        directory = self.root_dir / name
+        if not directory.exists():
+            return False
+
+        if reservation['host'] != socket.gethostname():
+            return time.time() - reservation['reserved_at'] < self.reservation_ttl
+
+        try:
+            os.kill(reservation['pid'], 0)
+        except ProcessLookupError:
+            logger.warning(f'Removing scratch space "{directory}" left by terminated process {reservation["pid"]}.')
+            shutil.rmtree(directory, ignore_errors=True)
+            return False
+        except PermissionError:
+            pass
+
+        return True
+
+    @contextmanager
+    def _ledger(self) -> Iterator[dict[str, dict[str, Any]]]:
+        """Yield reservations ledger holding exclusive lock on it and store changes made to it."""
+
+        with open(self.ledger_path, 'a+') as ledger_file:
+            fcntl.flock(ledger_file, fcntl.LOCK_EX)
+            try:
+                ledger_file.seek(0)
+                content = ledger_file.read()
+                reservations = json.loads(content) if content else {}
+                reservations = {
+                    name: reservation
+                    for name, reservation in reservations.items()
+                    if self._is_active(name, reservation)
+                }
+
+                yield reservations
+
+                ledger_file.seek(0)
+                ledger_file.truncate()
+                json.dump(reservations, ledger_file)
+            finally:
+                fcntl.flock(ledger_file, fcntl.LOCK_UN)
+
+    def _get_written_size(self, directory: Path) -> int:
+        return sum(path.stat().st_size for path in directory.rglob('*') if path.is_file())
+
+    def _reserve(self, directory: Path, size: int) -> bool:
+        with self._ledger() as reservations:
+            if self.budget and sum(reservation['size'] for reservation in reservations.values()) + size > self.budget:
+                return False
+
+            # bytes already written by other jobs are not in the free space anymore, only the rest is still pending
+            pending = sum(
+                max(reservation['size'] - self._get_written_size(self.root_dir / name), 0)
+                for name, reservation in reservations.items()
+            )
+            if pending + size > shutil.disk_usage(self.root_dir).free:
+                return False
+
+            reservations[directory.name] = {
+                'size': size,
+                'pid': os.getpid(),
+                'host': socket.gethostname(),
+                'reserved_at': time.time(),
+            }
+
+        return True
+
+    def _release(self, directory: Path) -> None:
+        shutil.rmtree(directory, ignore_errors=True)
+        with self._ledger() as reservations:
+            reservations.pop(directory.name, None)
+
+    @contextmanager
+    def allocate(self, size: int) -> Iterator[Path | None]:
+        """Yield unique directory with size bytes reserved for it.
+
+        Waits for other jobs to release space up to the wait timeout and yields None when space can't be reserved,
+        so caller can switch to streaming. Directory is always removed on exit.
+        """
+
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+        directory = Path(tempfile.mkdtemp(prefix='job-', dir=self.root_dir))
+        deadline = time.monotonic() + self.wait_timeout
+        while not self._reserve(directory, size):
+            if time.monotonic() >= deadline:
+                logger.warning(f'Unable to reserve {size} bytes of scratch space in "{self.root_dir}".')
+                shutil.rmtree(directory, ignore_errors=True)
+                yield None
+                return
+            time.sleep(self.poll_interval)
+
+        logger.info(f'Reserved {size} bytes of scratch space in "{directory}".')
+        try:
+            yield directory
+        finally:
+            self._release(directory)
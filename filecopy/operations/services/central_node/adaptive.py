@@ -0,0 +1,124 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import asyncio
+import math
+import time
+from typing import Any
+
+MIN_CHUNK_SIZE = 5 * 1024 * 1024
+MAX_CHUNK_SIZE = 256 * 1024 * 1024
+MAX_CHUNKS = 10000
+# chunk should take at least this many round trips to transfer, so request overhead stays small
+CHUNK_TRANSFER_RTTS = 20
+# conservative per-connection bandwidth used to turn rtt into bytes
+ASSUMED_STREAM_BANDWIDTH = 8 * 1024 * 1024
+
+
+def choose_chunk_size(file_size: int, rtt: float | None) -> int:
+    """Return chunk size for the file based on its size and round trip time to the central node.
+
+    Files that fit into one chunk are uploaded with a single request, higher latency links get larger chunks.
+    """
+
+    chunk_size = MIN_CHUNK_SIZE
+    if rtt:
+        chunk_size = max(chunk_size, int(rtt * CHUNK_TRANSFER_RTTS * ASSUMED_STREAM_BANDWIDTH))
+    chunk_size = max(chunk_size, math.ceil(file_size / MAX_CHUNKS))
+    chunk_size = min(chunk_size, MAX_CHUNK_SIZE)
+
+    if file_size <= chunk_size:
+        return max(file_size, 1)
+
+    mebibyte = 1024 * 1024
+    return math.ceil(chunk_size / mebibyte) * mebibyte
+
+
+class AdaptiveLimiter:
+    """Limit number of concurrent chunk uploads adjusting the limit with additive increase/multiplicative decrease.
+
+    Limit grows by one after every window of successful chunks while throughput keeps up with the previous window and
+    it is halved when an attempt fails. Attempts that started before the last decrease were sent under the previous
+    limit, so their failures are counted but they do not decrease the limit again.
+    """
+
+    def __init__(
+        self, initial: int, minimum: int = 1, maximum: int = 16, decrease_factor: float = 0.5, tolerance: float = 0.1
+    ) -> None:
+        self.minimum = minimum
+        self.maximum = max(maximum, minimum)
+        self.limit = float(min(max(initial, minimum), self.maximum))
+        self.decrease_factor = decrease_factor
+        self.tolerance = tolerance
+
+        self.in_flight = 0
+        self.condition = asyncio.Condition()
+
+        self.started_at = time.monotonic()
+        self.total_bytes = 0
+        self.failures = 0
+        self.decreased_at = float('-inf')
+
+        self.window_started_at = self.started_at
+        self.window_bytes = 0
+        self.window_chunks = 0
+        self.previous_window_throughput = 0.0
+
+    async def __aenter__(self) -> 'AdaptiveLimiter':
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def record_success(self, size: int) -> None:
+        self.total_bytes += size
+        self.window_bytes += size
+        self.window_chunks += 1
+        if self.window_chunks < int(self.limit):
+            return
+
+        now = time.monotonic()
+        throughput = self.window_bytes / max(now - self.window_started_at, 1e-6)
+        if throughput >= self.previous_window_throughput * (1 - self.tolerance):
+            self.limit = min(self.limit + 1, self.maximum)
+        self.previous_window_throughput = throughput
+
+        self.window_started_at = now
+        self.window_bytes = 0
+        self.window_chunks = 0
+
+    def record_failure(self, started_at: float) -> None:
+        """Record failed attempt that started at the given monotonic time."""
+
+        self.failures += 1
+        if started_at < self.decreased_at:
+            return
+
+        self.limit = max(self.limit * self.decrease_factor, self.minimum)
+        self.decreased_at = time.monotonic()
+
+        self.window_started_at = self.decreased_at
+        self.window_bytes = 0
+        self.window_chunks = 0
+
+    @property
+    def throughput(self) -> float:
+        """Return average throughput in bytes per second since the limiter was created."""
+
+        return self.total_bytes / max(time.monotonic() - self.started_at, 1e-6)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            'concurrency': int(self.limit),
+            'failures': self.failures,
+            'total_bytes': self.total_bytes,
+            'throughput_bytes_per_second': round(self.throughput),
+        }
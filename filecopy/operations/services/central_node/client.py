@@ -5,20 +5,48 @@
 # You may not use this file except in compliance with the License.
 
 import asyncio
+import importlib.util
 import math
-from pathlib import Path
+import time
+from collections.abc import Callable
 from typing import Any
 from uuid import UUID
 
 import httpx
 import jwt as pyjwt
+from operations.bandwidth import BandwidthLimiter
+from operations.chunk_sources import ChunkSource
+from operations.chunk_sources import iter_blocks
 from operations.logger import logger
+from operations.services.central_node.adaptive import AdaptiveLimiter
+from operations.services.central_node.adaptive import choose_chunk_size
+from operations.services.central_node.compression import choose_compression
+from operations.services.central_node.compression import get_compressed_name
+from operations.services.central_node.compression import get_compressor
+from operations.services.central_node.prefetcher import ChunkUploadUrlPrefetcher
+from operations.services.central_node.upload_state import FileUploadState
+
+
+def is_congestion_response(response: httpx.Response) -> bool:
+    """Return True when the response asks to slow down or the server failed, so the request may be retried."""
+
+    return response.status_code == 429 or response.is_server_error
 
 
 class CentralNodeClient:
 
     def __init__(
-        self, *, endpoint: str, access_token: str, session_id: str, timeout: int = 30, upload_timeout: int = 300
+        self,
+        *,
+        endpoint: str,
+        access_token: str,
+        session_id: str,
+        timeout: int = 30,
+        upload_timeout: int = 300,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        http2: bool = False,
+        bandwidth: BandwidthLimiter | None = None,
     ) -> None:
         self.endpoint = endpoint
         self.access_token = access_token
@@ -30,12 +58,59 @@ class CentralNodeClient:
         self.greenroom_name_full = 'greenroom'
         self.greenroom_name_short = 'gr'
 
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections)
+        self.http2 = http2
+        if http2 and importlib.util.find_spec('h2') is None:
+            logger.warning('HTTP/2 is requested but "h2" package is not installed, falling back to HTTP/1.1.')
+            self.http2 = False
+
+        self._client: httpx.AsyncClient | None = None
+        self._upload_client: httpx.AsyncClient | None = None
+        self.rtt: float | None = None
+        self.bandwidth = bandwidth or BandwidthLimiter(0)
+
+    async def __aenter__(self) -> 'CentralNodeClient':
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.aclose()
+
     @property
     def client(self) -> httpx.AsyncClient:
-        return httpx.AsyncClient(
-            timeout=self.timeout,
-            headers={'Authorization': f'Bearer {self.access_token}', 'Session-ID': self.session_id},
-        )
+        """Return long-lived pooled client for the central node api."""
+
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                headers={'Authorization': f'Bearer {self.access_token}', 'Session-ID': self.session_id},
+                limits=self.limits,
+                http2=self.http2,
+            )
+        return self._client
+
+    @property
+    def upload_client(self) -> httpx.AsyncClient:
+        """Return long-lived pooled client for uploads to presigned urls that must not receive api credentials."""
+
+        if self._upload_client is None or self._upload_client.is_closed:
+            self._upload_client = httpx.AsyncClient(timeout=self.upload_timeout, limits=self.limits, http2=self.http2)
+        return self._upload_client
+
+    def _track_rtt(self, response: httpx.Response) -> None:
+        """Keep the lowest observed api response time as the estimate of round trip time to the central node."""
+
+        elapsed = response.elapsed.total_seconds()
+        if self.rtt is None or elapsed < self.rtt:
+            self.rtt = elapsed
+
+    async def aclose(self) -> None:
+        """Close connection pools of the clients."""
+
+        for client in (self._client, self._upload_client):
+            if client is not None:
+                await client.aclose()
+        self._client = None
+        self._upload_client = None
 
     async def get_name_folder_id(self, project_code: str) -> UUID:
         url = f'{self.endpoint}/pilot/portal/v1/files/meta'
@@ -48,9 +123,9 @@ class CentralNodeClient:
             'archived': 'false',
             'name': self.username,
         }
-        async with self.client as client:
-            response = await client.get(url, params=params)
-            response.raise_for_status()
+        response = await self.client.get(url, params=params)
+        self._track_rtt(response)
+        response.raise_for_status()
 
         folders = response.json()['result']
         for folder in folders:
@@ -59,22 +134,38 @@ class CentralNodeClient:
 
         raise ValueError(f'Name folder for user "{self.username}" not found')
 
-    async def file_pre_upload(self, project_code: str, filename: str, parent_folder_id: UUID) -> dict[str, Any]:
+    async def files_pre_upload(
+        self,
+        project_code: str,
+        files: list[tuple[str, str]],
+        parent_folder_id: UUID,
+        job_type: str = 'AS_FOLDER',
+        current_folder_node: str = '',
+    ) -> list[dict[str, Any]]:
+        """Pre-upload several files given as relative path and filename pairs with one request."""
+
         url = f'{self.endpoint}/pilot/portal/v1/project/{project_code}/files'
         data = {
             'project_code': project_code,
             'operator': self.username,
-            'job_type': 'AS_FILE',
-            'data': [{'resumable_filename': filename, 'resumable_relative_path': self.username}],
+            'job_type': job_type,
+            'data': [
+                {'resumable_filename': filename, 'resumable_relative_path': relative_path}
+                for relative_path, filename in files
+            ],
             'upload_message': '',
-            'current_folder_node': '',
+            'current_folder_node': current_folder_node,
             'parent_folder_id': str(parent_folder_id),
         }
-        async with self.client as client:
-            response = await client.post(url, json=data)
-            response.raise_for_status()
+        response = await self.client.post(url, json=data)
+        self._track_rtt(response)
+        response.raise_for_status()
 
-        return response.json()['result'][0]
+        return response.json()['result']
+
+    async def file_pre_upload(self, project_code: str, filename: str, parent_folder_id: UUID) -> dict[str, Any]:
+        result = await self.files_pre_upload(project_code, [(self.username, filename)], parent_folder_id, 'AS_FILE')
+        return result[0]
 
     async def file_post_upload(
         self,
@@ -99,9 +190,9 @@ class CentralNodeClient:
             'resumable_total_chunks': total_chunks,
             'resumable_total_size': total_bytes,
         }
-        async with self.client as client:
-            response = await client.post(url, json=data)
-            response.raise_for_status()
+        response = await self.client.post(url, json=data)
+        self._track_rtt(response)
+        response.raise_for_status()
 
         return response.json()['result']
 
@@ -115,9 +206,9 @@ class CentralNodeClient:
             'chunk_number': chunk_number,
             'bucket': f'{self.greenroom_name_short}-{project_code}',
         }
-        async with self.client as client:
-            response = await client.get(url, params=params)
-            response.raise_for_status()
+        response = await self.client.get(url, params=params)
+        self._track_rtt(response)
+        response.raise_for_status()
 
         return response.json()['result']
 
@@ -125,24 +216,38 @@ class CentralNodeClient:
         self,
         client: httpx.AsyncClient,
         chunk_number: int,
-        data: bytes,
+        data: bytes | memoryview,
         upload_url: str,
         retries: int,
         backoff_factor: float = 0.5,
+        on_failure: Callable[[float], None] | None = None,
     ) -> httpx.Response:
+        """Upload chunk retrying transport errors and responses of the congested central node with backoff.
+
+        On failure of every attempt, on failure callback is called with the monotonic time the attempt started at.
+        """
+
         for attempt in range(1, retries + 1):
+            started_at = time.monotonic()
             try:
                 response = await client.put(
-                    upload_url, content=data, headers={'Content-Type': 'application/octet-stream'}
+                    upload_url,
+                    content=iter_blocks(data, bandwidth=self.bandwidth),
+                    headers={'Content-Type': 'application/octet-stream', 'Content-Length': str(len(data))},
                 )
                 response.raise_for_status()
                 logger.info(f'Chunk {chunk_number} uploaded successfully.')
                 return response
-            except httpx.TransportError:
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                if isinstance(e, httpx.HTTPStatusError) and not is_congestion_response(e.response):
+                    logger.exception(f'Failed to upload chunk {chunk_number}.')
+                    raise
+                if on_failure:
+                    on_failure(started_at)
                 if attempt < retries:
                     wait_time = backoff_factor * (2 ** (attempt - 1))
                     logger.warning(
-                        f'Chunk {chunk_number} upload failed (attempt {attempt}/{retries}). '
+                        f'Chunk {chunk_number} upload failed (attempt {attempt}/{retries}): {e}. '
                         f'Retrying in {wait_time:.1f} seconds.'
                     )
                     await asyncio.sleep(wait_time)
@@ -153,63 +258,176 @@ class CentralNodeClient:
         logger.error(f'Chunk {chunk_number} failed after {retries} attempts.')
         raise Exception(f'Failed to upload chunk {chunk_number} after {retries} attempts.')
 
-    async def upload_file_to_project(
+    async def send_chunk(
         self,
-        file_path: Path,
+        chunk_number: int,
+        data: bytes | memoryview,
+        url_prefetcher: ChunkUploadUrlPrefetcher,
+        limiter: AdaptiveLimiter,
+    ) -> httpx.Response:
+        try:
+            upload_url = await url_prefetcher.get(chunk_number)
+        except Exception:
+            logger.exception(f'Failed to get upload url for chunk {chunk_number}.')
+            raise
+
+        response = await self.upload_chunk_with_retries(
+            self.upload_client, chunk_number, data, upload_url, retries=3, on_failure=limiter.record_failure
+        )
+        limiter.record_success(len(data))
+        return response
+
+    async def upload_compressed_chunks(
+        self,
+        source: ChunkSource,
+        chunk_size: int,
+        compression: str,
+        limiter: AdaptiveLimiter,
+        url_prefetcher: ChunkUploadUrlPrefetcher,
+    ) -> tuple[int, int]:
+        """Compress the source read in order and upload the compressed stream in chunks of chunk size.
+
+        Compressed size is not known in advance, so chunks are cut from the stream as it grows and the number of
+        uploaded chunks and bytes is returned once the whole source is compressed.
+        """
+
+        async def upload_chunk(chunk_number: int, data: bytes) -> None:
+            async with limiter:
+                await self.send_chunk(chunk_number, data, url_prefetcher, limiter)
+
+        compressor = get_compressor(compression)
+        pending = set()
+        buffer = bytearray()
+        total_chunks = 0
+        total_bytes = 0
+
+        async def emit(data: bytes) -> None:
+            nonlocal total_chunks, total_bytes, pending
+            total_chunks += 1
+            total_bytes += len(data)
+            pending.add(asyncio.create_task(upload_chunk(total_chunks, data)))
+            # next chunk is cut only when it can be uploaded, so buffered chunks stay within the current limit
+            while len(pending) >= int(limiter.limit):
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                await asyncio.gather(*done)
+
+        try:
+            for offset in range(0, source.size, chunk_size):
+                data = await source.read(offset, chunk_size)
+                try:
+                    buffer += await asyncio.to_thread(compressor.compress, data)
+                finally:
+                    source.release(data)
+                while len(buffer) >= chunk_size:
+                    await emit(bytes(buffer[:chunk_size]))
+                    del buffer[:chunk_size]
+            # flush always returns at least the end of the stream, so the last chunk is never empty
+            await emit(bytes(buffer + compressor.flush()))
+            await asyncio.gather(*pending)
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            raise
+
+        return total_chunks, total_bytes
+
+    async def upload_file(
+        self,
+        source: ChunkSource,
+        file_pre_upload_data: dict[str, Any],
+        destination_folder_name: str,
         destination_file_name: str,
         project_code: str,
-        chunk_size: int,
-        max_concurrent: int,
+        chunk_size: int | None,
+        limiter: AdaptiveLimiter,
+        url_prefetch_window: int,
+        upload_url_ttl: float = 600,
+        upload_state: FileUploadState | None = None,
+        compression: str | None = None,
     ) -> dict[str, Any]:
-        destination_folder_name = self.username
-        destination_name_folder_id = await self.get_name_folder_id(project_code)
-        file_pre_upload_data = await self.file_pre_upload(
-            project_code, destination_file_name, destination_name_folder_id
-        )
+        """Upload pre-uploaded file in chunks, the limiter adapts number of chunks uploaded at the same time.
+
+        When chunk size is not set it is chosen from the file size and measured round trip time. Presigned upload
+        urls are fetched a window of chunks ahead of the uploads. When upload state is given, chunks completed by
+        the previous attempt are not uploaded again and every newly completed chunk is recorded in it. When
+        compression is given, the source is compressed while it is streamed and destination file name is expected to
+        carry the compression suffix, upload state then records only the completed file.
+        """
+
         job_id = file_pre_upload_data['job_id']
         upload_id = file_pre_upload_data['payload']['resumable_identifier']
         file_id = UUID(file_pre_upload_data['payload']['item_id'])
 
-        semaphore = asyncio.Semaphore(max_concurrent)
-
-        def read_chunk_data(chunk_number: int) -> bytes:
-            offset = (chunk_number - 1) * chunk_size
-            with file_path.open('rb') as f:
-                f.seek(offset)
-                return f.read(chunk_size)
-
-        async def upload_chunk(
-            client: httpx.AsyncClient,
-            chunk_number: int,
-        ) -> httpx.Response:
-            async with semaphore:
+        async def upload_chunk(chunk_number: int, url_prefetcher: ChunkUploadUrlPrefetcher) -> httpx.Response:
+            async with limiter:
+                data = await source.read((chunk_number - 1) * chunk_size, chunk_size)
                 try:
-                    upload_url = await self.get_chunk_upload_url(
-                        project_code, destination_folder_name, destination_file_name, upload_id, chunk_number
-                    )
-                except Exception:
-                    logger.exception(f'Failed to get upload url for chunk {chunk_number}.')
-                    raise
-
-                data = await asyncio.to_thread(read_chunk_data, chunk_number)
-
-                return await self.upload_chunk_with_retries(client, chunk_number, data, upload_url, retries=3)
+                    response = await self.send_chunk(chunk_number, data, url_prefetcher, limiter)
+                finally:
+                    source.release(data)
+                if upload_state:
+                    upload_state.mark_chunk_completed(chunk_number)
+                return response
 
-        total_bytes = file_path.stat().st_size
+        total_bytes = source.size
+        # chunks of the compressed stream do not match chunks of the source, so only whole compressed file is resumed
+        resumed_state = None if compression else upload_state
+        if resumed_state and resumed_state.chunk_size:
+            chunk_size = resumed_state.chunk_size
+        elif not chunk_size:
+            chunk_size = choose_chunk_size(total_bytes, self.rtt)
         total_chunks = max(1, math.ceil(total_bytes / chunk_size))
 
+        completed_chunks = resumed_state.start(chunk_size, total_chunks) if resumed_state else set()
+
         logger.info(
             f'Starting "{destination_file_name}" ({total_bytes} bytes) file upload '
-            f'in {total_chunks} chunk(s) of {chunk_size} bytes '
-            f'(max {max_concurrent} concurrent) to folder "{destination_folder_name}" '
+            f'in {total_chunks} chunk(s) of {chunk_size} bytes to folder "{destination_folder_name}" '
             f'in the project "{project_code}" on the central node.'
         )
 
-        async with httpx.AsyncClient(timeout=self.upload_timeout) as upload_client:
-            tasks = [upload_chunk(upload_client, index + 1) for index in range(total_chunks)]
-            await asyncio.gather(*tasks)
+        started_at = time.monotonic()
+        async with ChunkUploadUrlPrefetcher(
+            lambda chunk_number: self.get_chunk_upload_url(
+                project_code, destination_folder_name, destination_file_name, upload_id, chunk_number
+            ),
+            # compressed stream of incompressible content is slightly larger than the source
+            total_chunks + 1 if compression else total_chunks,
+            url_prefetch_window,
+            upload_url_ttl,
+            skip=completed_chunks,
+        ) as url_prefetcher:
+            if compression:
+                total_chunks, total_bytes = await self.upload_compressed_chunks(
+                    source, chunk_size, compression, limiter, url_prefetcher
+                )
+            else:
+                tasks = [
+                    upload_chunk(chunk_number, url_prefetcher)
+                    for chunk_number in range(1, total_chunks + 1)
+                    if chunk_number not in completed_chunks
+                ]
+                await asyncio.gather(*tasks)
+
+        if compression:
+            elapsed = time.monotonic() - started_at
+            logger.info(
+                f'Compressed "{destination_file_name}" with {compression} from {source.size} to {total_bytes} bytes.',
+                {
+                    'ratio': round(source.size / max(total_bytes, 1), 2),
+                    'upload_seconds': round(elapsed, 3),
+                    # time the compressed bytes took, scaled to the bytes that were not sent
+                    'saved_seconds_estimate': round(elapsed * (source.size - total_bytes) / max(total_bytes, 1), 3),
+                },
+            )
+
+        logger.info(
+            f'Uploaded "{destination_file_name}" in chunks of {chunk_size} bytes.',
+            {'rtt_seconds': self.rtt, 'upload': limiter.to_dict(), 'bandwidth': self.bandwidth.to_dict()},
+        )
 
-        return await self.file_post_upload(
+        result = await self.file_post_upload(
             project_code,
             file_id,
             destination_folder_name,
@@ -219,3 +437,50 @@ class CentralNodeClient:
             upload_id,
             job_id,
         )
+        if upload_state:
+            upload_state.mark_uploaded()
+
+        return result
+
+    async def upload_file_to_project(
+        self,
+        source: ChunkSource,
+        destination_file_name: str,
+        project_code: str,
+        chunk_size: int | None,
+        max_concurrent: int,
+        url_prefetch_window: int | None = None,
+        upload_url_ttl: float = 600,
+        max_concurrent_limit: int = 16,
+        compression: str | None = None,
+    ) -> dict[str, Any]:
+        """Upload the source into the name folder starting with max concurrent chunks uploaded at the same time.
+
+        Concurrency is adjusted up to the max concurrent limit depending on the throughput and failures. Optional
+        gzip or zstd compression, which the receiving upload service must accept, is skipped for files that are
+        already compressed and otherwise adds the compression suffix to the destination file name.
+        """
+
+        compression = choose_compression(destination_file_name, compression)
+        destination_file_name = get_compressed_name(destination_file_name, compression)
+
+        destination_name_folder_id = await self.get_name_folder_id(project_code)
+        file_pre_upload_data = await self.file_pre_upload(
+            project_code, destination_file_name, destination_name_folder_id
+        )
+
+        if url_prefetch_window is None:
+            url_prefetch_window = 2 * max_concurrent
+
+        return await self.upload_file(
+            source,
+            file_pre_upload_data,
+            self.username,
+            destination_file_name,
+            project_code,
+            chunk_size,
+            AdaptiveLimiter(max_concurrent, maximum=max_concurrent_limit),
+            url_prefetch_window,
+            upload_url_ttl,
+            compression=compression,
+        )
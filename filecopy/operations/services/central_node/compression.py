@@ -0,0 +1,78 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import importlib.util
+import zlib
+from typing import Any
+
+from operations.logger import logger
+
+GZIP = 'gzip'
+ZSTD = 'zstd'
+
+COMPRESSION_SUFFIXES = {GZIP: '.gz', ZSTD: '.zst'}
+
+# content in these formats is already compressed and does not get smaller
+COMPRESSED_EXTENSIONS = (
+    '.gz',
+    '.tgz',
+    '.zst',
+    '.bz2',
+    '.xz',
+    '.zip',
+    '.7z',
+    '.rar',
+    '.jpg',
+    '.jpeg',
+    '.png',
+    '.gif',
+    '.webp',
+    '.mp3',
+    '.mp4',
+    '.mkv',
+    '.avi',
+    '.mov',
+    '.pdf',
+    '.parquet',
+    '.h5',
+    '.mgz',
+)
+
+
+def choose_compression(filename: str, compression: str | None) -> str | None:
+    """Return compression that is used for the file or None when the file is uploaded as it is.
+
+    Zstd falls back to gzip when optional "zstandard" package is not installed.
+    """
+
+    if not compression or filename.lower().endswith(COMPRESSED_EXTENSIONS):
+        return None
+
+    if compression == ZSTD and importlib.util.find_spec('zstandard') is None:
+        logger.warning('Zstd compression is requested but "zstandard" package is not installed, using gzip.')
+        return GZIP
+
+    if compression not in COMPRESSION_SUFFIXES:
+        raise ValueError(f'Unsupported compression "{compression}".')
+
+    return compression
+
+
+def get_compressed_name(filename: str, compression: str | None) -> str:
+    if not compression:
+        return filename
+    return f'{filename}{COMPRESSION_SUFFIXES[compression]}'
+
+
+def get_compressor(compression: str, level: int = 3) -> Any:
+    """Return streaming compressor that produces a single gzip member or zstd frame from all chunks."""
+
+    if compression == ZSTD:
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=level).compressobj()
+
+    return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
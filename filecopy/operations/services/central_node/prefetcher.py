@@ -0,0 +1,79 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import asyncio
+import time
+from collections.abc import Awaitable
+from collections.abc import Callable
+from collections.abc import Collection
+from typing import Any
+
+from operations.logger import logger
+
+
+class ChunkUploadUrlPrefetcher:
+    """Fetch presigned chunk upload urls a window of chunks ahead of the uploader.
+
+    Urls that were fetched longer than url ttl seconds ago are considered expired and fetched again. Urls for the
+    skipped chunks, which are already uploaded, are not prefetched.
+    """
+
+    def __init__(
+        self,
+        fetch_url: Callable[[int], Awaitable[str]],
+        total_chunks: int,
+        window: int,
+        url_ttl: float,
+        skip: Collection[int] = (),
+    ) -> None:
+        self.fetch_url = fetch_url
+        self.total_chunks = total_chunks
+        self.window = window
+        self.url_ttl = url_ttl
+        self.skip = set(skip)
+
+        self.tasks: dict[int, asyncio.Task] = {}
+        self.next_chunk_number = 1
+
+    async def __aenter__(self) -> 'ChunkUploadUrlPrefetcher':
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.close()
+
+    async def _fetch(self, chunk_number: int) -> tuple[str, float]:
+        url = await self.fetch_url(chunk_number)
+        return url, time.monotonic()
+
+    def _schedule(self, last_chunk_number: int) -> None:
+        while self.next_chunk_number <= min(last_chunk_number, self.total_chunks):
+            if self.next_chunk_number not in self.skip:
+                self.tasks[self.next_chunk_number] = asyncio.create_task(self._fetch(self.next_chunk_number))
+            self.next_chunk_number += 1
+
+    async def get(self, chunk_number: int) -> str:
+        """Return upload url for the chunk and schedule fetching of urls for the following chunks."""
+
+        self._schedule(chunk_number + self.window)
+
+        task = self.tasks.pop(chunk_number, None)
+        if task is None:
+            task = asyncio.create_task(self._fetch(chunk_number))
+
+        url, fetched_at = await task
+        if time.monotonic() - fetched_at > self.url_ttl:
+            logger.info(f'Upload url for chunk {chunk_number} expired, fetching new one.')
+            url, _ = await self._fetch(chunk_number)
+
+        return url
+
+    async def close(self) -> None:
+        """Cancel fetching of urls that were not requested."""
+
+        tasks, self.tasks = list(self.tasks.values()), {}
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
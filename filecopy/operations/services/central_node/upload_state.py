@@ -0,0 +1,138 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any
+
+from operations.logger import logger
+
+
+def write_json(file_path: Path, data: dict[str, Any]) -> None:
+    """Write data into the temporary file and replace the target with it, so readers never see partial state."""
+
+    partial_path = file_path.with_suffix('.part')
+    partial_path.write_text(json.dumps(data))
+    os.replace(partial_path, file_path)
+
+
+def read_json(file_path: Path) -> dict[str, Any] | None:
+    try:
+        return json.loads(file_path.read_text())
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        logger.warning(f'Ignoring corrupted upload state "{file_path}".')
+        return None
+
+
+class FileUploadState:
+    """Completion state of the resumable upload of one file to the central node."""
+
+    def __init__(self, file_path: Path, data: dict[str, Any]) -> None:
+        self.file_path = file_path
+        self.data = data
+        self.completed_chunks = set(data.get('completed_chunks', []))
+
+    @property
+    def file_pre_upload_data(self) -> dict[str, Any]:
+        return self.data['file_pre_upload_data']
+
+    @property
+    def chunk_size(self) -> int | None:
+        return self.data.get('chunk_size')
+
+    @property
+    def is_uploaded(self) -> bool:
+        return self.data.get('uploaded', False)
+
+    def save(self) -> None:
+        self.data['completed_chunks'] = sorted(self.completed_chunks)
+        write_json(self.file_path, self.data)
+
+    def start(self, chunk_size: int, total_chunks: int) -> set[int]:
+        """Remember chunk layout of the upload and return chunks completed by the previous attempt.
+
+        Completed chunks are kept only if the layout has not changed.
+        """
+
+        if self.chunk_size != chunk_size or self.data.get('total_chunks') != total_chunks:
+            self.completed_chunks = set()
+        self.data['chunk_size'] = chunk_size
+        self.data['total_chunks'] = total_chunks
+        self.save()
+
+        if self.completed_chunks:
+            logger.info(
+                f'Resuming upload with {len(self.completed_chunks)} of {total_chunks} chunk(s) already uploaded.',
+                {'item_id': self.file_pre_upload_data.get('payload', {}).get('item_id')},
+            )
+        return self.completed_chunks.copy()
+
+    def mark_chunk_completed(self, chunk_number: int) -> None:
+        self.completed_chunks.add(chunk_number)
+        self.save()
+
+    def mark_uploaded(self) -> None:
+        self.data['uploaded'] = True
+        self.save()
+
+
+class UploadStateStore:
+    """Persist state of the central node uploads of the job, so the retried job resumes uploads of the same files.
+
+    Every file has its own state file in the job directory, which is replaced atomically on every change.
+    """
+
+    def __init__(self, state_dir: str | Path, job_id: str) -> None:
+        self.job_dir = Path(state_dir) / job_id
+        self.job_dir.mkdir(parents=True, exist_ok=True)
+
+    def setdefault(self, key: str, default: Any) -> Any:
+        """Return job level value stored under the key, storing the default when it is not set yet."""
+
+        job_file_path = self.job_dir / 'job.json'
+        data = read_json(job_file_path) or {}
+        if key not in data:
+            data[key] = default
+            write_json(job_file_path, data)
+        return data[key]
+
+    def _get_file_path(self, key: str) -> Path:
+        return self.job_dir / f'{hashlib.sha256(key.encode()).hexdigest()}.json'
+
+    def get_file(self, key: str) -> FileUploadState | None:
+        file_path = self._get_file_path(key)
+        data = read_json(file_path)
+        if data is None:
+            return None
+        return FileUploadState(file_path, data)
+
+    def create_file(self, key: str, file_pre_upload_data: dict[str, Any]) -> FileUploadState:
+        file_state = FileUploadState(self._get_file_path(key), {'file_pre_upload_data': file_pre_upload_data})
+        file_state.save()
+        return file_state
+
+    def remove_expired(self, max_age: int) -> None:
+        """Remove state of other jobs that was not updated for more than max age seconds."""
+
+        for job_dir in self.job_dir.parent.iterdir():
+            if job_dir == self.job_dir or not job_dir.is_dir():
+                continue
+            try:
+                expired = time.time() - max(path.stat().st_mtime for path in [job_dir, *job_dir.iterdir()]) > max_age
+            except FileNotFoundError:
+                continue
+            if expired:
+                logger.info(f'Removing expired upload state "{job_dir}".')
+                shutil.rmtree(job_dir, ignore_errors=True)
+
+    def remove(self) -> None:
+        shutil.rmtree(self.job_dir, ignore_errors=True)
@@ -4,6 +4,8 @@
 # Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
 # You may not use this file except in compliance with the License.
 
+import time
+from collections.abc import Iterable
 from enum import Enum
 from enum import unique
 from pathlib import Path
@@ -31,36 +33,145 @@ class JobStatus(str, Enum):
         use_enum_values = True
 
 
+def compress_resource_keys(resource_keys: Iterable[Path]) -> list[Path]:
+    """Return unique resource keys without the keys that are already covered by their ancestor keys.
+
+    Sorting keys by their parts places every descendant right after its ancestor, so one pass over the sorted keys is
+    enough to collapse the prefix tree.
+    """
+
+    compressed = []
+    for parts in sorted({Path(key).parts for key in resource_keys}):
+        if not parts:
+            continue
+        if compressed and parts[: len(compressed[-1])] == compressed[-1]:
+            continue
+        compressed.append(parts)
+
+    return [Path(*parts) for parts in compressed]
+
+
+# status codes of lock responses meaning that resource keys are already locked by another operation
+LOCK_CONFLICT_STATUS_CODES = (409, 423)
+
+
+class ResourceLockMetrics:
+    """Collect timings and counts of resource lock requests for the job summary.
+
+    Lock wait is the time spent in lock requests, hold is the time between acquiring and releasing the same keys.
+    Conflicts are counted only for keys locked by another operation, other failed lock requests are failures.
+    """
+
+    def __init__(self, sample_size: int = 5) -> None:
+        self.sample_size = sample_size
+
+        self.lock_requests = 0
+        self.locked_keys = 0
+        self.lock_wait_seconds = 0.0
+        self.conflicts = 0
+        self.conflicted_keys = 0
+        self.conflicted_keys_sample = []
+        self.failures = 0
+        self.unlock_requests = 0
+        self.unlocked_keys = 0
+        self.unlock_seconds = 0.0
+        self.hold_seconds = 0.0
+
+        self._acquired_at = {}
+
+    def add_lock(self, resource_keys: list[str], operation: ResourceLockOperation, seconds: float) -> None:
+        self.locked_keys += len(resource_keys)
+        self.lock_wait_seconds += seconds
+        self._acquired_at[(operation, hash(tuple(resource_keys)))] = time.monotonic()
+
+    def add_conflict(self, resource_keys: list[str]) -> None:
+        self.conflicts += 1
+        self.conflicted_keys += len(resource_keys)
+        sample_left = self.sample_size - len(self.conflicted_keys_sample)
+        self.conflicted_keys_sample.extend(resource_keys[:sample_left])
+
+    def add_failure(self) -> None:
+        self.failures += 1
+
+    def add_unlock(self, resource_keys: list[str], operation: ResourceLockOperation, seconds: float) -> None:
+        self.unlocked_keys += len(resource_keys)
+        self.unlock_seconds += seconds
+        acquired_at = self._acquired_at.pop((operation, hash(tuple(resource_keys))), None)
+        if acquired_at is not None:
+            self.hold_seconds += time.monotonic() - acquired_at - seconds
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            'lock_requests': self.lock_requests,
+            'locked_keys': self.locked_keys,
+            'lock_wait_seconds': round(self.lock_wait_seconds, 3),
+            'conflicts': self.conflicts,
+            'conflicted_keys': self.conflicted_keys,
+            'conflicted_keys_sample': self.conflicted_keys_sample,
+            'failures': self.failures,
+            'unlock_requests': self.unlock_requests,
+            'unlocked_keys': self.unlocked_keys,
+            'unlock_seconds': round(self.unlock_seconds, 3),
+            'hold_seconds': round(self.hold_seconds, 3),
+        }
+
+
 class DataopsServiceClient:
-    def __init__(self, endpoint: str) -> None:
+    def __init__(
+        self, endpoint: str, lock_chunk_size: int = 1000, hierarchical_locks: bool = False, lock_ttl: int = 0
+    ) -> None:
         self.endpoint_v1 = f'{endpoint}/v1'
         self.endpoint_v2 = f'{endpoint}/v2'
         self.client = Session()
+        self.lock_chunk_size = lock_chunk_size
+        self.hierarchical_locks = hierarchical_locks
+        self.lock_ttl = lock_ttl
+        self.lock_metrics = ResourceLockMetrics()
 
-    def lock_resources(self, resource_keys: list[Path], operation: ResourceLockOperation) -> dict[str, Any]:
-        resource_keys = list(map(str, resource_keys))
+    def _get_lock_payload(self, resource_keys: list[str], operation: ResourceLockOperation) -> dict[str, Any]:
+        payload = {
+            'resource_keys': resource_keys,
+            'operation': operation,
+        }
+        if self.lock_ttl:
+            payload['ttl'] = self.lock_ttl
 
-        logger.info(f'Performing "{operation}" lock for resource keys: {resource_keys}.')
-        response = self.client.post(
-            f'{self.endpoint_v2}/resource/lock/bulk',
-            json={
-                'resource_keys': resource_keys,
-                'operation': operation,
-            },
-        )
+        return payload
 
-        if response.status_code != 200:
-            message = f'Unable to lock resource keys: {resource_keys}.'
-            logger.info(message)
-            raise Exception(message)
+    def _prepare_resource_keys(self, resource_keys: Iterable[Path]) -> list[str]:
+        """Return unique resource keys, compressed into top level keys if lock covers its descendants."""
 
-        logger.info(f'Successfully "{operation}" locked resource keys: {resource_keys}.')
-        return response.json()
+        if self.hierarchical_locks:
+            resource_keys = compress_resource_keys(resource_keys)
+
+        return list(dict.fromkeys(map(str, resource_keys)))
+
+    def _split_into_chunks(self, resource_keys: list[str]) -> list[list[str]]:
+        return [
+            resource_keys[index : index + self.lock_chunk_size]
+            for index in range(0, len(resource_keys), self.lock_chunk_size)
+        ]
+
+    def _describe_resource_keys(self, resource_keys: list[str], sample_size: int = 5) -> str:
+        """Return number of resource keys with a short sample of them for logging."""
+
+        sample = ', '.join(resource_keys[:sample_size])
+        if len(resource_keys) > sample_size:
+            sample += ', ...'
+
+        return f'{len(resource_keys)} resource key(s) [{sample}]'
 
-    def unlock_resources(self, resource_keys: list[Path], operation: ResourceLockOperation) -> dict[str, Any]:
-        resource_keys = list(map(str, resource_keys))
+    def _rollback_locks(self, locked_chunks: list[list[str]], operation: ResourceLockOperation) -> None:
+        """Release already acquired chunks after failure to lock the rest of resource keys."""
 
-        logger.info(f'Performing "{operation}" unlock for resource keys: {resource_keys}.')
+        for chunk in locked_chunks:
+            try:
+                self._unlock_chunk(chunk, operation)
+            except Exception:
+                logger.exception(f'Unable to roll back "{operation}" lock for {self._describe_resource_keys(chunk)}.')
+
+    def _unlock_chunk(self, resource_keys: list[str], operation: ResourceLockOperation) -> dict[str, Any]:
+        self.lock_metrics.unlock_requests += 1
         response = self.client.delete(
             f'{self.endpoint_v2}/resource/lock/bulk',
             json={
@@ -70,13 +181,103 @@ class DataopsServiceClient:
         )
 
         if response.status_code not in (200, 400):
-            message = f'Unable to unlock resource keys: {resource_keys}.'
+            message = f'Unable to unlock {self._describe_resource_keys(resource_keys)}.'
             logger.info(message)
             raise Exception(message)
 
-        logger.info(f'Successfully "{operation}" unlocked resource keys: {resource_keys}.')
         return response.json()
 
+    def lock_resources(self, resource_keys: list[Path], operation: ResourceLockOperation) -> list[dict[str, Any]]:
+        """Lock resource keys in chunks and release already locked chunks if any of them fails."""
+
+        resource_keys = self._prepare_resource_keys(resource_keys)
+
+        logger.info(f'Performing "{operation}" lock for {self._describe_resource_keys(resource_keys)}.')
+        started_at = time.monotonic()
+        locked_chunks = []
+        results = []
+        for chunk in self._split_into_chunks(resource_keys):
+            self.lock_metrics.lock_requests += 1
+            try:
+                response = self.client.post(
+                    f'{self.endpoint_v2}/resource/lock/bulk', json=self._get_lock_payload(chunk, operation)
+                )
+            except Exception:
+                self.lock_metrics.lock_wait_seconds += time.monotonic() - started_at
+                self.lock_metrics.add_failure()
+                self._rollback_locks(locked_chunks, operation)
+                raise
+
+            if response.status_code != 200:
+                waited = time.monotonic() - started_at
+                self.lock_metrics.lock_wait_seconds += waited
+                if response.status_code in LOCK_CONFLICT_STATUS_CODES:
+                    self.lock_metrics.add_conflict(chunk)
+                else:
+                    self.lock_metrics.add_failure()
+                message = f'Unable to lock {self._describe_resource_keys(chunk)} after {waited:.3f} seconds.'
+                logger.info(f'{message} Received response: "{response.text}".')
+                self._rollback_locks(locked_chunks, operation)
+                raise Exception(message)
+
+            locked_chunks.append(chunk)
+            results.append(response.json())
+
+        waited = time.monotonic() - started_at
+        self.lock_metrics.add_lock(resource_keys, operation, waited)
+        logger.info(
+            f'Successfully "{operation}" locked {self._describe_resource_keys(resource_keys)} '
+            f'in {len(locked_chunks)} request(s) after {waited:.3f} seconds.'
+        )
+        return results
+
+    def unlock_resources(self, resource_keys: list[Path], operation: ResourceLockOperation) -> list[dict[str, Any]]:
+        """Unlock resource keys in chunks, trying every chunk even if some of them fail."""
+
+        resource_keys = self._prepare_resource_keys(resource_keys)
+
+        logger.info(f'Performing "{operation}" unlock for {self._describe_resource_keys(resource_keys)}.')
+        started_at = time.monotonic()
+        errors = []
+        results = []
+        for chunk in self._split_into_chunks(resource_keys):
+            try:
+                results.append(self._unlock_chunk(chunk, operation))
+            except Exception as e:
+                errors.append(e)
+        self.lock_metrics.add_unlock(resource_keys, operation, time.monotonic() - started_at)
+        if errors:
+            raise Exception(
+                f'Unable to unlock {len(errors)} chunk(s) of {self._describe_resource_keys(resource_keys)}: '
+                + '; '.join(str(error) for error in errors)
+            )
+
+        logger.info(f'Successfully "{operation}" unlocked {self._describe_resource_keys(resource_keys)}.')
+        return results
+
+    def renew_resource_locks(
+        self, resource_keys: list[Path], operation: ResourceLockOperation, session: Session | None = None
+    ) -> None:
+        """Extend expiration time of already acquired locks by lock ttl.
+
+        Session can be passed when locks are renewed from another thread.
+        """
+
+        resource_keys = self._prepare_resource_keys(resource_keys)
+        client = session or self.client
+
+        for chunk in self._split_into_chunks(resource_keys):
+            response = client.put(
+                f'{self.endpoint_v2}/resource/lock/bulk', json=self._get_lock_payload(chunk, operation)
+            )
+
+            if response.status_code != 200:
+                message = f'Unable to renew "{operation}" lock for {self._describe_resource_keys(chunk)}.'
+                logger.error(f'{message} Received response: "{response.text}".')
+                raise Exception(message)
+
+        logger.info(f'Successfully renewed "{operation}" lock for {self._describe_resource_keys(resource_keys)}.')
+
     def update_job(
         self,
         session_id: str,
@@ -0,0 +1,114 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import threading
+import time
+from pathlib import Path
+
+from operations.logger import logger
+from operations.services.dataops.client import DataopsServiceClient
+from operations.services.dataops.client import ResourceLockOperation
+from requests import Session
+
+
+class ResourceLockHeartbeat:
+    """Renew acquired resource locks in a background thread until stopped.
+
+    Renewal is only needed when locks are acquired with ttl. If the job crashes, the renewal stops together with the
+    process and the locks expire on their own once ttl passes. Renewals use their own session, because requests
+    session is not safe to share with the job thread. The job must call check() between files, so it stops once
+    ttl passes without a successful renewal and the locks may already be held by someone else.
+    """
+
+    def __init__(
+        self,
+        dataops_client: DataopsServiceClient,
+        resource_keys: list[Path],
+        operation: ResourceLockOperation,
+        interval: float,
+    ) -> None:
+        self.dataops_client = dataops_client
+        self.resource_keys = resource_keys
+        self.operation = operation
+        self.interval = interval
+
+        self.session = Session()
+        self.consecutive_failures = 0
+        self.renewed_at = time.monotonic()
+
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def __enter__(self) -> 'ResourceLockHeartbeat':
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def is_expired(self) -> bool:
+        """Return True when ttl passed since the last successful renewal."""
+
+        if not self.is_running:
+            return False
+
+        return time.monotonic() - self.renewed_at >= self.dataops_client.lock_ttl
+
+    def check(self) -> None:
+        """Raise exception when locks may have expired because renewals kept failing."""
+
+        if self.is_expired:
+            raise Exception(
+                f'Unable to renew "{self.operation}" lock for {time.monotonic() - self.renewed_at:.3f} seconds '
+                f'after {self.consecutive_failures} consecutive failure(s), lock ttl has passed.'
+            )
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.dataops_client.renew_resource_locks(self.resource_keys, self.operation, session=self.session)
+            except Exception:
+                self.consecutive_failures += 1
+                logger.exception(
+                    f'Unable to renew "{self.operation}" lock ({self.consecutive_failures} consecutive failure(s)), '
+                    f'retrying in {self.interval} seconds.'
+                )
+            else:
+                self.consecutive_failures = 0
+                self.renewed_at = time.monotonic()
+
+    def start(self) -> None:
+        """Start renewing locks if they are acquired with ttl."""
+
+        if not self.dataops_client.lock_ttl or self.is_running:
+            return
+
+        if self.interval >= self.dataops_client.lock_ttl:
+            logger.warning(
+                f'Lock heartbeat interval {self.interval}s is not shorter than lock ttl '
+                f'{self.dataops_client.lock_ttl}s, locks may expire between renewals.'
+            )
+
+        self.consecutive_failures = 0
+        self.renewed_at = time.monotonic()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='resource-lock-heartbeat', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop renewing locks and wait for the ongoing renewal to finish."""
+
+        if self._thread is None:
+            return
+
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
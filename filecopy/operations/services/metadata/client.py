@@ -5,7 +5,10 @@
 # You may not use this file except in compliance with the License.
 
 import asyncio
-import time
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
 from typing import Any
 
 from common import ProjectClient
@@ -13,6 +16,7 @@ from common import ProjectException
 from operations.kafka_producer import KafkaProducer
 from operations.logger import logger
 from operations.minio_boto3_client import MinioBoto3Client
+from operations.models import FolderToRegister
 from operations.models import ItemStatus
 from operations.models import Node
 from operations.models import NodeList
@@ -20,8 +24,12 @@ from operations.models import NodeToRegister
 from operations.models import ResourceType
 from operations.models import ZoneType
 from operations.models import append_suffix_to_filepath
+from operations.ranged_reader import RangedHttpReader
+from operations.scratch_space import ScratchSpace
 from requests import Session
 
+STREAM_BUFFER_SIZE = 1024 * 1024
+
 
 class MetadataServiceClient:
     def __init__(
@@ -32,15 +40,31 @@ class MetadataServiceClient:
         temp_dir: str,
         project_client: ProjectClient,
         access_token: str,
+        scratch_space: ScratchSpace | None = None,
+        source_url_expiration: int = 3600,
     ) -> None:
         self.endpoint_v1 = f'{endpoint}/v1/'
-        self.client = Session()
+        self.sessions = threading.local()
 
         self.minio_endpoint = minio_endpoint
         self.core_zone_label = core_zone_label
         self.temp_dir = temp_dir
         self.project_client = project_client
         self.access_token = access_token
+        self.scratch_space = scratch_space or ScratchSpace(temp_dir)
+        self.source_url_expiration = source_url_expiration
+
+    @property
+    def client(self) -> Session:
+        """Return requests session of the current thread, because sessions are not safe to share between threads.
+
+        Nodes are registered and updated from worker threads, each of them keeps its own connection pool.
+        """
+
+        session = getattr(self.sessions, 'session', None)
+        if session is None:
+            session = self.sessions.session = Session()
+        return session
 
     def get_item_by_id(self, node_id: str) -> Node:
         nodes = self.get_items_by_ids([node_id])
@@ -70,7 +94,7 @@ class MetadataServiceClient:
 
         return Node(result)
 
-    def get_nodes_tree(self, start_folder_id: str, traverse_subtrees: bool = False) -> NodeList:
+    def get_nodes_tree(self, start_folder_id: str, traverse_subtrees: bool = False, page_size: int = 1000) -> NodeList:
         parent_folder_response = self.client.get(f'{self.endpoint_v1}item/{start_folder_id}/')
         if parent_folder_response.status_code != 200:
             raise Exception(
@@ -78,24 +102,14 @@ class MetadataServiceClient:
             )
         parent_folder = parent_folder_response.json()['result']
 
-        header = {'Authorization': f'Bearer {self.access_token}'}
-
         parameters = {
             'status': ItemStatus.ACTIVE,
             'zone': parent_folder['zone'],
             'container_code': parent_folder['container_code'],
             'parent_path': self.format_folder_path(parent_folder, '/'),
             'recursive': traverse_subtrees,
-            'page_size': 1000,
         }
-        node_query_url = self.endpoint_v1 + 'items/search/'
-        response = self.client.get(node_query_url, params=parameters, headers=header)
-
-        if response.status_code != 200:
-            raise Exception(f'Unable to get nodes tree starting from "{start_folder_id}".')
-
-        nodes = NodeList(response.json()['result'])
-        return nodes
+        return self._search_items(parameters, page_size)
 
     def update_node(self, node: Node, update_json: dict[str, Any]) -> dict[str, Any]:
         response = self.client.put(url=f'{self.endpoint_v1}item/', params={'id': node.get('id')}, json=update_json)
@@ -161,18 +175,44 @@ class MetadataServiceClient:
             version_id = result.get('VersionId', '')  # empty in case versioning is unsupported
         else:
             logger.info('File size greater than 5GiB')
-            temp_path = self.temp_dir + str(time.time())[0:10]
-            temp_file_path = f'{temp_path}/{node.name}'
-            loop.run_until_complete(minio_client.download_object(src_bucket, src_obj_path, temp_file_path))
-            logger.info(f'File fetched to local disk: {temp_path}')
-            result = loop.run_until_complete(
-                minio_client.upload_object(target_bucket, target_obj_path, temp_file_path, temp_path)
-            )
+            with self.scratch_space.allocate(node.size) as temp_path:
+                if temp_path is None:
+                    logger.info('Not enough scratch space, streaming object instead.')
+                    result = loop.run_until_complete(
+                        self._stream_object(
+                            src_bucket, src_obj_path, target_bucket, target_obj_path, node.size, minio_client
+                        )
+                    )
+                else:
+                    temp_file_path = temp_path / node.name
+                    loop.run_until_complete(minio_client.download_object(src_bucket, src_obj_path, str(temp_file_path)))
+                    logger.info(f'File fetched to local disk: {temp_path}')
+                    result = loop.run_until_complete(
+                        minio_client.upload_object(target_bucket, target_obj_path, str(temp_file_path))
+                    )
             version_id = result.get('VersionId', '')  # empty in case versioning is unsupported
 
         logger.info(f'Minio Copy {src_bucket}/{src_obj_path} Success')
         return version_id
 
+    async def _stream_object(
+        self,
+        src_bucket: str,
+        src_obj_path: str,
+        target_bucket: str,
+        target_obj_path: str,
+        size: int,
+        minio_client: MinioBoto3Client,
+    ) -> dict[str, Any]:
+        """Copy object through the pipeline without touching local disk.
+
+        Source url must stay valid for the whole upload, so it is presigned for the configured expiration.
+        """
+
+        url = await minio_client.client.get_download_presigned_url(src_bucket, src_obj_path, self.source_url_expiration)
+        with io.BufferedReader(RangedHttpReader(url), STREAM_BUFFER_SIZE) as source:
+            return await minio_client.upload_fileobj(target_bucket, target_obj_path, source, size)
+
     def register_node(
         self,
         project: str,
@@ -237,6 +277,106 @@ class MetadataServiceClient:
     ) -> Node:
         return self.register_node(project, source_node, parent_node, ResourceType.FOLDER, ItemStatus.ACTIVE, None, zone)
 
+    def _search_items(self, parameters: dict[str, Any], page_size: int = 1000) -> NodeList:
+        """Return all items matching search parameters going through every page of results."""
+
+        header = {'Authorization': f'Bearer {self.access_token}'}
+        parameters = {**parameters, 'page_size': page_size, 'page': 0}
+
+        items = NodeList([])
+        while True:
+            response = self.client.get(f'{self.endpoint_v1}items/search/', params=parameters, headers=header)
+            if response.status_code != 200:
+                raise Exception(f'Unable to search items with parameters "{parameters}".')
+
+            nodes = NodeList(response.json()['result'])
+            items.extend(nodes)
+
+            if len(nodes) < page_size:
+                return items
+            parameters['page'] += 1
+
+    def get_folders_by_path(self, root_folder: Node, project: str, zone: ZoneType = ZoneType.CORE) -> dict[str, Node]:
+        """Return all active folders below the root folder keyed by their full path using one recursive listing."""
+
+        parameters = {
+            'status': ItemStatus.ACTIVE,
+            'zone': zone,
+            'container_code': project,
+            'parent_path': self.format_folder_path(root_folder, '/'),
+            'type': ResourceType.FOLDER,
+            'recursive': True,
+        }
+        nodes = self._search_items(parameters)
+
+        return {self.format_folder_path(node, '/'): node for node in nodes if node.is_folder}
+
+    def get_dataset_files(self, dataset_code: str) -> dict[str, Node]:
+        """Return all active files of the dataset keyed by their path within the dataset."""
+
+        parameters = {
+            'status': ItemStatus.ACTIVE,
+            'zone': ZoneType.CORE,
+            'container_code': dataset_code,
+            'container_type': 'dataset',
+            'type': ResourceType.FILE,
+            'recursive': True,
+        }
+        nodes = self._search_items(parameters)
+
+        return {str(node.display_path): node for node in nodes if node.is_file}
+
+    def register_folders(
+        self,
+        project: str,
+        folders: list[FolderToRegister],
+        zone: ZoneType = ZoneType.CORE,
+        max_workers: int = 8,
+    ) -> None:
+        """Create the whole destination folder hierarchy like "mkdir -p".
+
+        Existing folders are resolved from one listing per root folder, missing ones are registered level by level
+        with the folders of each level registered in parallel. Placeholder folder nodes are updated in place.
+        """
+
+        if not folders:
+            return
+
+        folder_paths = {folder.path for folder in folders}
+        root_folders = {}
+        for folder in folders:
+            parent_path = folder.folder_node.parent_path
+            if parent_path not in folder_paths:
+                root_folders[parent_path] = folder.destination_node
+
+        existing_folders = {}
+        for root_folder in root_folders.values():
+            existing_folders.update(self.get_folders_by_path(root_folder, project, zone))
+
+        created = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for _, level_folders in groupby(sorted(folders, key=lambda f: f.depth), key=lambda f: f.depth):
+                missing_folders = {}
+                for folder in level_folders:
+                    existing_folder = existing_folders.get(folder.path)
+                    if existing_folder is None:
+                        missing_folders.setdefault(folder.path, []).append(folder)
+                    else:
+                        folder.folder_node.update(existing_folder)
+
+                registered_folders = executor.map(
+                    lambda same_folders: self.register_folder(
+                        project, same_folders[0].source_node, same_folders[0].destination_node, zone
+                    ),
+                    missing_folders.values(),
+                )
+                for same_folders, registered_folder in zip(missing_folders.values(), registered_folders):
+                    for folder in same_folders:
+                        folder.folder_node.update(registered_folder)
+                created += len(missing_folders)
+
+        logger.info(f'Resolved {len(folders)} destination folder(s), {created} of them created.')
+
     def get_name_folder(self, username: str, project_code: str, zone: ZoneType = ZoneType.GREENROOM) -> Node:
         params = {
             'name': username,
@@ -4,43 +4,63 @@
 # Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
 # You may not use this file except in compliance with the License.
 
-import asyncio
+from collections.abc import Iterable
+from itertools import islice
 
-from aioredis import StrictRedis
+from aioredis import ConnectionPool
+from aioredis import Redis
 from operations.config import get_settings
 
-REDIS_INSTANCE = {}
+REDIS_CONNECTION_POOL: ConnectionPool | None = None
 
 
-class RedisClient:
-    """we should replace StrictRedis with aioredis https://aioredis.readthedocs.io/en/latest/getting-started/"""
+def get_connection_pool() -> ConnectionPool:
+    """Return connection pool that is shared by all Redis clients in the process."""
 
-    def __init__(self):
+    global REDIS_CONNECTION_POOL
+    if REDIS_CONNECTION_POOL is None:
         settings = get_settings()
-        self.loop = asyncio.new_event_loop()
+        REDIS_CONNECTION_POOL = ConnectionPool.from_url(settings.REDIS_URL)
+
+    return REDIS_CONNECTION_POOL
+
+
+class RedisClient:
+    """Async Redis client on top of the shared connection pool."""
+
+    def __init__(self, connection_pool: ConnectionPool | None = None) -> None:
+        if connection_pool is None:
+            connection_pool = get_connection_pool()
+
+        self.client = Redis(connection_pool=connection_pool)
+
+    async def set_by_key(self, key: str, content: str, expire_time: int = 86400) -> bool:
+        return await self.client.set(key, content, ex=expire_time)
+
+    async def check_by_key(self, key: str) -> int:
+        return await self.client.exists(key)
+
+    async def delete_by_key(self, key: str) -> int:
+        return await self.client.delete(key)
 
-        self.host = settings.REDIS_HOST
-        self.port = settings.REDIS_PORT
-        self.pwd = settings.REDIS_PASSWORD
-        self.connect()
+    async def unlink_by_keys(self, keys: Iterable[str], batch_size: int = 1000, pipeline_size: int = 10) -> int:
+        """Remove keys with pipelined UNLINK commands and return the number of removed keys.
 
-    def __del__(self):
-        self.loop.close()
+        Each UNLINK command carries up to batch_size keys and up to pipeline_size commands are sent per round trip.
+        Missing keys are skipped by Redis itself, so no EXISTS check is needed beforehand.
+        """
 
-    def connect(self):
-        global REDIS_INSTANCE
-        if REDIS_INSTANCE:
-            self.__instance = REDIS_INSTANCE
-            pass
-        else:
-            REDIS_INSTANCE = StrictRedis(host=self.host, port=self.port, password=self.pwd)
-            self.__instance = REDIS_INSTANCE
+        keys = iter(keys)
+        batches = iter(lambda: list(islice(keys, batch_size)), [])
+        removed = 0
 
-    def set_by_key(self, key: str, content: str, expire_time: int = 86400):
-        return self.loop.run_until_complete(self.__instance.set(key, content, ex=expire_time))
+        async with self.client.pipeline(transaction=False) as pipeline:
+            for batch in batches:
+                pipeline.unlink(*batch)
+                if len(pipeline) >= pipeline_size:
+                    removed += sum(await pipeline.execute())
 
-    def check_by_key(self, key: str):
-        return self.loop.run_until_complete(self.__instance.exists(key))
+            if len(pipeline):
+                removed += sum(await pipeline.execute())
 
-    def delete_by_key(self, key: str):
-        return self.loop.run_until_complete(self.__instance.delete(key))
+        return removed
@@ -0,0 +1,96 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import fcntl
+import hashlib
+import os
+from collections.abc import Callable
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO
+
+from operations.logger import logger
+
+
+class DatasetVersionCache:
+    """Local cache of dataset version archives.
+
+    Dataset versions are immutable, so archives are stored under a key derived from version id and location. The
+    least recently used archives are evicted when the total size of the cache exceeds the size budget. Archives are
+    opened while the entry is locked, so an archive evicted by another job stays readable until it is closed.
+    """
+
+    def __init__(self, cache_dir: str | Path, size_budget: int) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.size_budget = size_budget
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def get_entry_path(self, version_id: str, location: str) -> Path:
+        key = hashlib.sha256(f'{version_id}:{location}'.encode()).hexdigest()
+        return self.cache_dir / f'{key}.zip'
+
+    @contextmanager
+    def _lock(self, lock_path: Path) -> Iterator[None]:
+        """Hold exclusive lock on the file so concurrent jobs do not work with the same entry at the same time."""
+
+        with open(lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _evict(self, required_size: int) -> None:
+        """Remove least recently used entries until the required size fits into the size budget."""
+
+        entries = []
+        for entry_path in self.cache_dir.glob('*.zip'):
+            try:
+                entries.append((entry_path.stat(), entry_path))
+            except FileNotFoundError:
+                continue
+
+        total_size = sum(stat.st_size for stat, _ in entries)
+        for stat, entry_path in sorted(entries, key=lambda entry: entry[0].st_mtime):
+            if total_size + required_size <= self.size_budget:
+                break
+            entry_path.unlink(missing_ok=True)
+            total_size -= stat.st_size
+            logger.info(f'Evicted dataset version archive "{entry_path.name}" ({stat.st_size} bytes) from cache.')
+
+        if required_size > self.size_budget:
+            logger.warning(f'Dataset version archive of {required_size} bytes exceeds cache size budget.')
+
+    def open_or_fill(self, version_id: str, location: str, download: Callable[[Path], None]) -> BinaryIO:
+        """Open the cached archive, downloading it with the download callback on cache miss."""
+
+        entry_path = self.get_entry_path(version_id, location)
+
+        with self._lock(entry_path.with_suffix('.lock')):
+            try:
+                entry_file = open(entry_path, 'rb')
+            except FileNotFoundError:
+                pass
+            else:
+                os.utime(entry_file.fileno())
+                logger.info(f'Dataset version archive "{location}" found in cache.')
+                return entry_file
+
+            partial_path = entry_path.with_suffix('.part')
+            try:
+                download(partial_path)
+                size = partial_path.stat().st_size
+                with self._lock(self.cache_dir / 'cache.lock'):
+                    self._evict(size)
+                    os.replace(partial_path, entry_path)
+                    entry_file = open(entry_path, 'rb')
+            finally:
+                partial_path.unlink(missing_ok=True)
+
+        logger.info(f'Dataset version archive "{location}" of {size} bytes stored in cache.')
+        return entry_file
@@ -6,6 +6,7 @@
 
 pytest_plugins = [
     'tests.fixtures.fake',
+    'tests.fixtures.http',
     'tests.fixtures.node',
     'tests.fixtures.services',
 ]
@@ -0,0 +1,34 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import re
+
+import pytest
+from werkzeug import Request
+from werkzeug import Response
+
+
+@pytest.fixture
+def serve_bytes(httpserver):
+    def _serve_bytes(content: bytes) -> str:
+        def handler(request: Request) -> Response:
+            match = re.fullmatch(r'bytes=(\d+)-(\d+)', request.headers.get('Range', ''))
+            if not match:
+                return Response(content)
+
+            start, end = int(match.group(1)), int(match.group(2))
+            if start >= len(content):
+                return Response(status=416, headers={'Content-Range': f'bytes */{len(content)}'})
+
+            end = min(end, len(content) - 1)
+            return Response(
+                content[start : end + 1], status=206, headers={'Content-Range': f'bytes {start}-{end}/{len(content)}'}
+            )
+
+        httpserver.expect_request('/object').respond_with_handler(handler)
+        return httpserver.url_for('/object')
+
+    yield _serve_bytes
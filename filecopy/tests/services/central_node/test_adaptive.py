@@ -0,0 +1,81 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import asyncio
+import time
+
+import pytest
+from operations.services.central_node.adaptive import MAX_CHUNKS
+from operations.services.central_node.adaptive import MIN_CHUNK_SIZE
+from operations.services.central_node.adaptive import AdaptiveLimiter
+from operations.services.central_node.adaptive import choose_chunk_size
+
+
+@pytest.mark.parametrize(
+    'file_size,rtt,expected_chunk_size',
+    [
+        (1000, None, 1000),
+        (100 * 1024 * 1024, None, MIN_CHUNK_SIZE),
+        (100 * 1024 * 1024, 0.1, 16 * 1024 * 1024),
+    ],
+)
+def test_choose_chunk_size_depends_on_file_size_and_rtt(file_size, rtt, expected_chunk_size):
+    assert choose_chunk_size(file_size, rtt) == expected_chunk_size
+
+
+def test_choose_chunk_size_keeps_number_of_chunks_within_limit():
+    file_size = MAX_CHUNKS * MIN_CHUNK_SIZE * 2
+
+    chunk_size = choose_chunk_size(file_size, None)
+
+    assert file_size / chunk_size <= MAX_CHUNKS
+
+
+class TestAdaptiveLimiter:
+    def test_record_success_increases_limit_after_window_of_chunks(self):
+        limiter = AdaptiveLimiter(2, maximum=4)
+
+        limiter.record_success(10)
+        assert limiter.limit == 2
+
+        limiter.record_success(10)
+        assert limiter.limit == 3
+
+    def test_record_failure_decreases_limit_multiplicatively(self):
+        limiter = AdaptiveLimiter(8, minimum=1, maximum=16)
+
+        limiter.record_failure(time.monotonic())
+        limiter.record_failure(time.monotonic())
+
+        assert limiter.limit == 2
+        assert limiter.to_dict()['failures'] == 2
+
+    def test_record_failure_decreases_limit_once_for_attempts_started_before_last_decrease(self):
+        limiter = AdaptiveLimiter(8, minimum=1, maximum=16)
+        started_at = time.monotonic()
+
+        for _ in range(3):
+            limiter.record_failure(started_at)
+
+        assert limiter.limit == 4
+        assert limiter.to_dict()['failures'] == 3
+
+    async def test_limiter_does_not_allow_more_concurrent_holders_than_limit(self):
+        limiter = AdaptiveLimiter(2, maximum=2)
+        holders = 0
+        max_holders = 0
+
+        async def hold():
+            nonlocal holders, max_holders
+            async with limiter:
+                holders += 1
+                max_holders = max(max_holders, holders)
+                await asyncio.sleep(0.01)
+                holders -= 1
+
+        await asyncio.gather(*[hold() for _ in range(6)])
+
+        assert max_holders == 2
@@ -4,12 +4,19 @@
 # Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
 # You may not use this file except in compliance with the License.
 
+import asyncio
+import gzip
+import json
+import re
 from pathlib import Path
 from uuid import UUID
 
 import httpx
 import pytest
+from operations.chunk_sources import LocalFileSource
+from operations.services.central_node.adaptive import AdaptiveLimiter
 from operations.services.central_node.client import CentralNodeClient
+from operations.services.central_node.upload_state import UploadStateStore
 from pytest_httpserver import HTTPServer
 from tests.fixtures.fake import Faker
 from werkzeug import Request
@@ -75,6 +82,28 @@ class TestCentralNodeClient:
         with pytest.raises(httpx.HTTPStatusError):
             await central_node_client.file_pre_upload(project_code, fake.file_name(), fake.uuid4())
 
+    async def test_files_pre_upload_sends_all_files_in_one_request(
+        self, central_node_client: CentralNodeClient, httpserver: HTTPServer, fake: Faker
+    ):
+        project_code = fake.project_code()
+        expected = [{'job_id': fake.uuid4()}, {'job_id': fake.uuid4()}]
+        httpserver.expect_request(f'/pilot/portal/v1/project/{project_code}/files', method='POST').respond_with_json(
+            {'result': expected}
+        )
+
+        result = await central_node_client.files_pre_upload(
+            project_code, [('user/folder', 'a.txt'), ('user/folder/sub', 'b.txt')], fake.uuid4(), 'AS_FOLDER', 'folder'
+        )
+
+        request, _ = httpserver.log[0]
+        assert result == expected
+        assert request.json['job_type'] == 'AS_FOLDER'
+        assert request.json['current_folder_node'] == 'folder'
+        assert request.json['data'] == [
+            {'resumable_filename': 'a.txt', 'resumable_relative_path': 'user/folder'},
+            {'resumable_filename': 'b.txt', 'resumable_relative_path': 'user/folder/sub'},
+        ]
+
     async def test_file_post_upload_returns_result(
         self, central_node_client: CentralNodeClient, httpserver: HTTPServer, fake: Faker
     ):
@@ -160,6 +189,43 @@ class TestCentralNodeClient:
                     client, chunk_number=1, data=fake.binary(5), upload_url=upload_url, retries=3, backoff_factor=0
                 )
 
+    @pytest.mark.parametrize('status', [429, 503])
+    async def test_upload_chunk_with_retries_retries_congested_responses(
+        self, central_node_client: CentralNodeClient, httpserver: HTTPServer, fake: Faker, mocker, status
+    ):
+        httpserver.expect_ordered_request('/upload', method='PUT').respond_with_data(status=status)
+        httpserver.expect_ordered_request('/upload', method='PUT').respond_with_data()
+        upload_url = httpserver.url_for('/upload')
+        on_failure = mocker.Mock()
+
+        async with httpx.AsyncClient() as client:
+            response = await central_node_client.upload_chunk_with_retries(
+                client,
+                chunk_number=1,
+                data=fake.binary(5),
+                upload_url=upload_url,
+                retries=3,
+                backoff_factor=0,
+                on_failure=on_failure,
+            )
+
+        assert response.status_code == 200
+        on_failure.assert_called_once()
+
+    async def test_upload_chunk_with_retries_raises_client_error_without_retrying(
+        self, central_node_client: CentralNodeClient, httpserver: HTTPServer, fake: Faker
+    ):
+        httpserver.expect_request('/upload', method='PUT').respond_with_data(status=403)
+        upload_url = httpserver.url_for('/upload')
+
+        async with httpx.AsyncClient() as client:
+            with pytest.raises(httpx.HTTPStatusError):
+                await central_node_client.upload_chunk_with_retries(
+                    client, chunk_number=1, data=fake.binary(5), upload_url=upload_url, retries=3, backoff_factor=0
+                )
+
+        assert len(httpserver.log) == 1
+
     async def test_upload_file_to_project_returns_post_upload_result(
         self, central_node_client: CentralNodeClient, httpserver: HTTPServer, fake: Faker, tmp_path: Path
     ):
@@ -193,7 +259,7 @@ class TestCentralNodeClient:
         )
 
         result = await central_node_client.upload_file_to_project(
-            file_path=file_path,
+            source=LocalFileSource(file_path),
             destination_file_name=filename,
             project_code=project_code,
             chunk_size=4,
@@ -201,3 +267,133 @@ class TestCentralNodeClient:
         )
 
         assert result == expected_result
+
+    async def test_upload_file_uploads_only_chunks_missing_from_upload_state(
+        self, central_node_client: CentralNodeClient, httpserver: HTTPServer, fake: Faker, tmp_path: Path
+    ):
+        file_path = tmp_path / fake.file_name()
+        file_path.write_bytes(b'0123456789')
+        file_pre_upload_data = {
+            'job_id': fake.uuid4(),
+            'payload': {'resumable_identifier': fake.uuid4(), 'item_id': fake.uuid4()},
+        }
+        upload_state = UploadStateStore(tmp_path / 'state', 'job-id').create_file('key', file_pre_upload_data)
+        upload_state.start(chunk_size=4, total_chunks=3)
+        upload_state.mark_chunk_completed(1)
+
+        httpserver.expect_request('/pilot/upload/gr/v1/files/chunks/presigned').respond_with_json(
+            {'result': httpserver.url_for('/upload')}
+        )
+        httpserver.expect_request('/upload', method='PUT').respond_with_data()
+        httpserver.expect_request('/pilot/upload/gr/v1/files', method='POST').respond_with_json({'result': {}})
+
+        await central_node_client.upload_file(
+            LocalFileSource(file_path),
+            file_pre_upload_data,
+            central_node_client.username,
+            file_path.name,
+            fake.project_code(),
+            chunk_size=None,
+            limiter=AdaptiveLimiter(2),
+            url_prefetch_window=2,
+            upload_state=upload_state,
+        )
+
+        uploaded_chunks = sorted(request.data for request, _ in httpserver.log if request.path == '/upload')
+        assert uploaded_chunks == [b'4567', b'89']
+        assert upload_state.is_uploaded
+        assert upload_state.completed_chunks == {1, 2, 3}
+
+    async def test_upload_file_compresses_source_while_uploading_it(
+        self, central_node_client: CentralNodeClient, httpserver: HTTPServer, fake: Faker, tmp_path: Path
+    ):
+        content = fake.binary(2000)
+        file_path = tmp_path / fake.file_name()
+        file_path.write_bytes(content)
+        file_pre_upload_data = {
+            'job_id': fake.uuid4(),
+            'payload': {'resumable_identifier': fake.uuid4(), 'item_id': fake.uuid4()},
+        }
+
+        httpserver.expect_request('/pilot/upload/gr/v1/files/chunks/presigned').respond_with_handler(
+            lambda request: Response(
+                json.dumps({'result': httpserver.url_for(f'/upload/{request.args["chunk_number"]}')}),
+                content_type='application/json',
+            )
+        )
+        httpserver.expect_request(re.compile('/upload/.*'), method='PUT').respond_with_data()
+        httpserver.expect_request('/pilot/upload/gr/v1/files', method='POST').respond_with_json({'result': {}})
+
+        await central_node_client.upload_file(
+            LocalFileSource(file_path),
+            file_pre_upload_data,
+            central_node_client.username,
+            f'{file_path.name}.gz',
+            fake.project_code(),
+            chunk_size=500,
+            limiter=AdaptiveLimiter(2),
+            url_prefetch_window=2,
+            compression='gzip',
+        )
+
+        chunks = {
+            int(request.path.rsplit('/', 1)[1]): request.data
+            for request, _ in httpserver.log
+            if request.path.startswith('/upload/')
+        }
+        compressed = b''.join(chunks[chunk_number] for chunk_number in sorted(chunks))
+        post_upload_request = httpserver.log[-1][0]
+        assert gzip.decompress(compressed) == content
+        assert all(len(chunks[chunk_number]) == 500 for chunk_number in sorted(chunks)[:-1])
+        assert post_upload_request.json['resumable_total_chunks'] == len(chunks)
+        assert post_upload_request.json['resumable_total_size'] == len(compressed)
+
+    async def test_upload_compressed_chunks_does_not_read_ahead_of_concurrency_limit(
+        self, central_node_client: CentralNodeClient, fake: Faker, tmp_path: Path, mocker
+    ):
+        file_path = tmp_path / fake.file_name()
+        file_path.write_bytes(fake.binary(200000))
+        source = LocalFileSource(file_path)
+        read = mocker.spy(source, 'read')
+        upload_allowed = asyncio.Event()
+
+        async def send_chunk(chunk_number, data, url_prefetcher, limiter):
+            await upload_allowed.wait()
+
+        mocker.patch.object(central_node_client, 'send_chunk', side_effect=send_chunk)
+
+        upload = asyncio.create_task(
+            central_node_client.upload_compressed_chunks(
+                source, 10000, 'gzip', AdaptiveLimiter(1, maximum=16), mocker.Mock()
+            )
+        )
+        await asyncio.sleep(0.1)
+        reads_while_blocked = read.call_count
+        upload_allowed.set()
+        total_chunks, _ = await upload
+
+        assert total_chunks > 2
+        assert reads_while_blocked < read.call_count / 2
+
+    async def test_client_is_reused_between_requests_until_closed(self, central_node_client: CentralNodeClient):
+        client = central_node_client.client
+
+        assert central_node_client.client is client
+
+        async with central_node_client:
+            pass
+
+        assert client.is_closed
+        assert central_node_client.client is not client
+
+    def test_client_falls_back_to_http1_when_h2_is_not_installed(self, central_node_client, mocker):
+        mocker.patch('importlib.util.find_spec', return_value=None)
+
+        client = CentralNodeClient(
+            endpoint=central_node_client.endpoint,
+            access_token=central_node_client.access_token,
+            session_id=central_node_client.session_id,
+            http2=True,
+        )
+
+        assert client.http2 is False
@@ -0,0 +1,44 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import gzip
+
+import pytest
+from operations.services.central_node.compression import choose_compression
+from operations.services.central_node.compression import get_compressed_name
+from operations.services.central_node.compression import get_compressor
+
+
+@pytest.mark.parametrize(
+    'filename,compression,expected_compression',
+    [
+        ('table.tsv', 'gzip', 'gzip'),
+        ('table.tsv', '', None),
+        ('image.nii.gz', 'gzip', None),
+        ('photo.JPG', 'gzip', None),
+    ],
+)
+def test_choose_compression_skips_already_compressed_files(filename, compression, expected_compression):
+    assert choose_compression(filename, compression) == expected_compression
+
+
+def test_choose_compression_falls_back_to_gzip_when_zstandard_is_not_installed(mocker):
+    mocker.patch('importlib.util.find_spec', return_value=None)
+
+    assert choose_compression('table.tsv', 'zstd') == 'gzip'
+
+
+def test_get_compressed_name_adds_compression_suffix():
+    assert get_compressed_name('table.tsv', 'gzip') == 'table.tsv.gz'
+    assert get_compressed_name('table.tsv', None) == 'table.tsv'
+
+
+def test_get_compressor_produces_gzip_stream_from_several_chunks():
+    compressor = get_compressor('gzip')
+
+    compressed = compressor.compress(b'first ') + compressor.compress(b'second') + compressor.flush()
+
+    assert gzip.decompress(compressed) == b'first second'
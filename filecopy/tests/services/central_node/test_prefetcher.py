@@ -0,0 +1,47 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import asyncio
+
+from operations.services.central_node.prefetcher import ChunkUploadUrlPrefetcher
+
+
+class TestChunkUploadUrlPrefetcher:
+    async def test_get_prefetches_urls_for_window_of_following_chunks(self, mocker):
+        fetch_url = mocker.AsyncMock(side_effect=lambda chunk_number: f'url-{chunk_number}')
+
+        async with ChunkUploadUrlPrefetcher(fetch_url, total_chunks=10, window=3, url_ttl=60) as prefetcher:
+            url = await prefetcher.get(1)
+            await asyncio.sleep(0)
+
+            assert url == 'url-1'
+            assert sorted(call.args[0] for call in fetch_url.await_args_list) == [1, 2, 3, 4]
+
+    async def test_get_does_not_prefetch_beyond_total_chunks(self, mocker):
+        fetch_url = mocker.AsyncMock(side_effect=lambda chunk_number: f'url-{chunk_number}')
+
+        async with ChunkUploadUrlPrefetcher(fetch_url, total_chunks=2, window=5, url_ttl=60) as prefetcher:
+            urls = [await prefetcher.get(1), await prefetcher.get(2)]
+
+        assert urls == ['url-1', 'url-2']
+        assert fetch_url.await_count == 2
+
+    async def test_get_does_not_prefetch_skipped_chunks(self, mocker):
+        fetch_url = mocker.AsyncMock(side_effect=lambda chunk_number: f'url-{chunk_number}')
+
+        async with ChunkUploadUrlPrefetcher(fetch_url, total_chunks=4, window=3, url_ttl=60, skip={2, 3}) as prefetcher:
+            urls = [await prefetcher.get(1), await prefetcher.get(4)]
+
+        assert urls == ['url-1', 'url-4']
+        assert sorted(call.args[0] for call in fetch_url.await_args_list) == [1, 4]
+
+    async def test_get_fetches_url_again_when_prefetched_url_expired(self, mocker):
+        fetch_url = mocker.AsyncMock(side_effect=['expired-url', 'new-url'])
+
+        async with ChunkUploadUrlPrefetcher(fetch_url, total_chunks=1, window=1, url_ttl=-1) as prefetcher:
+            url = await prefetcher.get(1)
+
+        assert url == 'new-url'
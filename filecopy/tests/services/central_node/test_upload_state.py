@@ -0,0 +1,65 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import os
+import time
+
+from operations.services.central_node.upload_state import UploadStateStore
+
+
+class TestUploadStateStore:
+    def test_file_state_is_restored_by_new_store_of_the_same_job(self, tmp_path):
+        file_state = UploadStateStore(tmp_path, 'job-id').create_file('key', {'job_id': 'upload-job-id'})
+        file_state.start(chunk_size=10, total_chunks=3)
+        file_state.mark_chunk_completed(2)
+
+        restored_state = UploadStateStore(tmp_path, 'job-id').get_file('key')
+
+        assert restored_state.file_pre_upload_data == {'job_id': 'upload-job-id'}
+        assert restored_state.chunk_size == 10
+        assert restored_state.completed_chunks == {2}
+        assert UploadStateStore(tmp_path, 'other-job-id').get_file('key') is None
+
+    def test_start_forgets_completed_chunks_when_chunk_layout_changes(self, tmp_path):
+        file_state = UploadStateStore(tmp_path, 'job-id').create_file('key', {})
+        file_state.start(chunk_size=10, total_chunks=3)
+        file_state.mark_chunk_completed(1)
+
+        file_state.start(chunk_size=20, total_chunks=2)
+
+        assert file_state.completed_chunks == set()
+
+    def test_get_file_ignores_corrupted_state(self, tmp_path):
+        store = UploadStateStore(tmp_path, 'job-id')
+        store.create_file('key', {}).file_path.write_text('{')
+
+        assert store.get_file('key') is None
+
+    def test_setdefault_keeps_first_value_until_store_is_removed(self, tmp_path):
+        store = UploadStateStore(tmp_path, 'job-id')
+
+        assert store.setdefault('copy_unique_id', 'first') == 'first'
+        assert UploadStateStore(tmp_path, 'job-id').setdefault('copy_unique_id', 'second') == 'first'
+
+        store.remove()
+
+        assert UploadStateStore(tmp_path, 'job-id').setdefault('copy_unique_id', 'third') == 'third'
+
+    def test_remove_expired_removes_only_state_of_other_jobs_not_updated_for_max_age(self, tmp_path):
+        expired_store = UploadStateStore(tmp_path, 'expired-job-id')
+        expired_file_state = expired_store.create_file('key', {})
+        recent_store = UploadStateStore(tmp_path, 'recent-job-id')
+        recent_store.create_file('key', {})
+        for path in [expired_store.job_dir, expired_file_state.file_path]:
+            os.utime(path, (time.time() - 120, time.time() - 120))
+        store = UploadStateStore(tmp_path, 'job-id')
+        os.utime(store.job_dir, (time.time() - 120, time.time() - 120))
+
+        store.remove_expired(max_age=60)
+
+        assert not expired_store.job_dir.exists()
+        assert recent_store.job_dir.exists()
+        assert store.job_dir.exists()
@@ -6,8 +6,11 @@
 
 from pathlib import Path
 
+import pytest
+from operations.services.dataops.client import DataopsServiceClient
 from operations.services.dataops.client import JobStatus
 from operations.services.dataops.client import ResourceLockOperation
+from operations.services.dataops.client import compress_resource_keys
 
 
 class TestDataopsServiceClient:
@@ -17,7 +20,48 @@ class TestDataopsServiceClient:
 
         received_body = dataops_client.lock_resources([Path('key')], ResourceLockOperation.READ)
 
-        assert received_body == expected_body
+        assert received_body == [expected_body]
+
+    def test_lock_resources_sends_resource_keys_in_chunks(self, httpserver):
+        dataops_client = DataopsServiceClient(httpserver.url_for('/'), lock_chunk_size=2)
+        for chunk in (['a', 'b'], ['c']):
+            httpserver.expect_ordered_request(
+                '/v2/resource/lock/bulk', method='POST', json={'resource_keys': chunk, 'operation': 'read'}
+            ).respond_with_json({})
+
+        dataops_client.lock_resources([Path('a'), Path('b'), Path('c')], ResourceLockOperation.READ)
+
+        httpserver.check_assertions()
+
+    def test_lock_resources_unlocks_acquired_chunks_when_chunk_fails(self, httpserver):
+        dataops_client = DataopsServiceClient(httpserver.url_for('/'), lock_chunk_size=1)
+        httpserver.expect_ordered_request(
+            '/v2/resource/lock/bulk', method='POST', json={'resource_keys': ['a'], 'operation': 'read'}
+        ).respond_with_json({})
+        httpserver.expect_ordered_request(
+            '/v2/resource/lock/bulk', method='POST', json={'resource_keys': ['b'], 'operation': 'read'}
+        ).respond_with_json({}, status=409)
+        httpserver.expect_ordered_request(
+            '/v2/resource/lock/bulk', method='DELETE', json={'resource_keys': ['a'], 'operation': 'read'}
+        ).respond_with_json({})
+
+        with pytest.raises(Exception, match='Unable to lock 1 resource key'):
+            dataops_client.lock_resources([Path('a'), Path('b')], ResourceLockOperation.READ)
+
+        httpserver.check_assertions()
+
+    def test_lock_resources_sends_only_top_level_keys_for_hierarchical_locks(self, httpserver):
+        dataops_client = DataopsServiceClient(httpserver.url_for('/'), hierarchical_locks=True)
+        httpserver.expect_oneshot_request(
+            '/v2/resource/lock/bulk', method='POST', json={'resource_keys': ['gr-code/admin'], 'operation': 'read'}
+        ).respond_with_json({})
+
+        dataops_client.lock_resources(
+            [Path('gr-code/admin'), Path('gr-code/admin/file.txt'), Path('gr-code/admin/folder/file.txt')],
+            ResourceLockOperation.READ,
+        )
+
+        httpserver.check_assertions()
 
     def test_unlock_resources_returns_response_body(self, dataops_client, httpserver, fake):
         expected_body = fake.pydict(value_types=['str', 'int'])
@@ -25,7 +69,73 @@ class TestDataopsServiceClient:
 
         received_body = dataops_client.unlock_resources([Path('key')], ResourceLockOperation.READ)
 
-        assert received_body == expected_body
+        assert received_body == [expected_body]
+
+    def test_unlock_resources_raises_readable_message_when_chunks_fail(self, httpserver):
+        dataops_client = DataopsServiceClient(httpserver.url_for('/'), lock_chunk_size=1)
+        httpserver.expect_request('/v2/resource/lock/bulk', method='DELETE').respond_with_json({}, status=500)
+
+        with pytest.raises(Exception, match=r'Unable to unlock 2 chunk\(s\) .*: Unable to unlock 1 resource key'):
+            dataops_client.unlock_resources([Path('a'), Path('b')], ResourceLockOperation.READ)
+
+    def test_lock_metrics_collect_lock_and_unlock_counts(self, httpserver):
+        dataops_client = DataopsServiceClient(httpserver.url_for('/'), lock_chunk_size=2)
+        httpserver.expect_request('/v2/resource/lock/bulk').respond_with_json({})
+        resource_keys = [Path('a'), Path('b'), Path('c')]
+
+        dataops_client.lock_resources(resource_keys, ResourceLockOperation.READ)
+        dataops_client.unlock_resources(resource_keys, ResourceLockOperation.READ)
+
+        metrics = dataops_client.lock_metrics.to_dict()
+        assert metrics['lock_requests'] == 2
+        assert metrics['locked_keys'] == 3
+        assert metrics['unlock_requests'] == 2
+        assert metrics['unlocked_keys'] == 3
+        assert metrics['conflicts'] == 0
+        assert metrics['hold_seconds'] >= 0
+
+    def test_lock_metrics_collect_conflicted_keys(self, httpserver):
+        dataops_client = DataopsServiceClient(httpserver.url_for('/'))
+        httpserver.expect_request('/v2/resource/lock/bulk', method='POST').respond_with_json({}, status=409)
+
+        with pytest.raises(Exception, match='Unable to lock'):
+            dataops_client.lock_resources([Path('a'), Path('b')], ResourceLockOperation.READ)
+
+        metrics = dataops_client.lock_metrics.to_dict()
+        assert metrics['conflicts'] == 1
+        assert metrics['conflicted_keys'] == 2
+        assert metrics['conflicted_keys_sample'] == ['a', 'b']
+        assert metrics['failures'] == 0
+        assert metrics['locked_keys'] == 0
+
+    def test_lock_metrics_collect_failures_separately_from_conflicts(self, httpserver):
+        dataops_client = DataopsServiceClient(httpserver.url_for('/'))
+        httpserver.expect_request('/v2/resource/lock/bulk', method='POST').respond_with_json({}, status=503)
+
+        with pytest.raises(Exception, match='Unable to lock'):
+            dataops_client.lock_resources([Path('a')], ResourceLockOperation.READ)
+
+        metrics = dataops_client.lock_metrics.to_dict()
+        assert metrics['failures'] == 1
+        assert metrics['conflicts'] == 0
+        assert metrics['conflicted_keys_sample'] == []
+
+    def test_lock_resources_sends_ttl_when_locks_expire(self, httpserver):
+        dataops_client = DataopsServiceClient(httpserver.url_for('/'), lock_ttl=60)
+        httpserver.expect_oneshot_request(
+            '/v2/resource/lock/bulk', method='POST', json={'resource_keys': ['key'], 'operation': 'read', 'ttl': 60}
+        ).respond_with_json({})
+
+        dataops_client.lock_resources([Path('key')], ResourceLockOperation.READ)
+
+        httpserver.check_assertions()
+
+    def test_renew_resource_locks_raises_when_renewal_fails(self, httpserver):
+        dataops_client = DataopsServiceClient(httpserver.url_for('/'), lock_ttl=60)
+        httpserver.expect_request('/v2/resource/lock/bulk', method='PUT').respond_with_json({}, status=404)
+
+        with pytest.raises(Exception, match='Unable to renew'):
+            dataops_client.renew_resource_locks([Path('key')], ResourceLockOperation.READ)
 
     def test_update_job_returns_response_body(self, dataops_client, httpserver, fake):
         expected_body = fake.pydict(value_types=['str', 'int'])
@@ -65,3 +175,17 @@ class TestDataopsServiceClient:
         received_body = dataops_client.create_zip_preview(fake.geid(), fake.pydict(value_types=['str']))
 
         assert received_body == expected_body
+
+
+def test_compress_resource_keys_removes_keys_covered_by_ancestors():
+    resource_keys = [
+        Path('bucket/admin/folder/file.txt'),
+        Path('bucket/admin/folder'),
+        Path('bucket/admin/folder-2/file.txt'),
+        Path('bucket/admin/folder/sub/file.txt'),
+        Path('bucket/admin/folder-2/file.txt'),
+    ]
+
+    received_keys = compress_resource_keys(resource_keys)
+
+    assert received_keys == [Path('bucket/admin/folder'), Path('bucket/admin/folder-2/file.txt')]
@@ -0,0 +1,73 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import time
+from pathlib import Path
+
+import pytest
+from operations.services.dataops.client import DataopsServiceClient
+from operations.services.dataops.client import ResourceLockOperation
+from operations.services.dataops.heartbeat import ResourceLockHeartbeat
+
+
+class TestResourceLockHeartbeat:
+    def test_heartbeat_renews_locks_until_stopped(self, httpserver):
+        dataops_client = DataopsServiceClient(httpserver.url_for('/'), lock_ttl=30)
+        httpserver.expect_request(
+            '/v2/resource/lock/bulk', method='PUT', json={'resource_keys': ['key'], 'operation': 'read', 'ttl': 30}
+        ).respond_with_json({})
+
+        with ResourceLockHeartbeat(dataops_client, [Path('key')], ResourceLockOperation.READ, 0.01) as heartbeat:
+            time.sleep(0.1)
+            assert heartbeat.is_running is True
+
+        renewals = len(httpserver.log)
+        time.sleep(0.05)
+
+        assert renewals > 0
+        assert len(httpserver.log) == renewals
+        assert heartbeat.is_running is False
+
+    def test_heartbeat_does_not_start_for_locks_without_ttl(self, dataops_client):
+        heartbeat = ResourceLockHeartbeat(dataops_client, [Path('key')], ResourceLockOperation.READ, 0.01)
+
+        heartbeat.start()
+
+        assert heartbeat.is_running is False
+
+    def test_heartbeat_keeps_running_when_renewal_fails(self, httpserver):
+        dataops_client = DataopsServiceClient(httpserver.url_for('/'), lock_ttl=30)
+        httpserver.expect_request('/v2/resource/lock/bulk', method='PUT').respond_with_json({}, status=500)
+
+        with ResourceLockHeartbeat(dataops_client, [Path('key')], ResourceLockOperation.READ, 0.01) as heartbeat:
+            time.sleep(0.1)
+
+            assert heartbeat.is_running is True
+        assert len(httpserver.log) > 1
+        assert heartbeat.consecutive_failures > 1
+
+    def test_heartbeat_check_raises_when_ttl_passes_without_successful_renewal(self, httpserver):
+        dataops_client = DataopsServiceClient(httpserver.url_for('/'), lock_ttl=30)
+        httpserver.expect_request('/v2/resource/lock/bulk', method='PUT').respond_with_json({}, status=500)
+
+        with ResourceLockHeartbeat(dataops_client, [Path('key')], ResourceLockOperation.READ, 0.01) as heartbeat:
+            time.sleep(0.05)
+            heartbeat.check()
+            heartbeat.renewed_at -= 30
+
+            with pytest.raises(Exception, match='lock ttl has passed'):
+                heartbeat.check()
+
+    def test_heartbeat_renews_locks_with_own_session(self, httpserver):
+        dataops_client = DataopsServiceClient(httpserver.url_for('/'), lock_ttl=30)
+        httpserver.expect_request('/v2/resource/lock/bulk', method='PUT').respond_with_json({})
+
+        with ResourceLockHeartbeat(dataops_client, [Path('key')], ResourceLockOperation.READ, 0.01) as heartbeat:
+            time.sleep(0.05)
+
+        assert heartbeat.session is not dataops_client.client
+        assert heartbeat.consecutive_failures == 0
+        assert len(httpserver.log) > 0
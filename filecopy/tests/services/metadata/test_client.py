@@ -4,11 +4,17 @@
 # Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
 # You may not use this file except in compliance with the License.
 
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from operations.managers import NodeManager
 from operations.minio_boto3_client import MinioBoto3Client
 from operations.models import ItemStatus
 from operations.models import NodeToRegister
 from operations.models import ResourceType
+from operations.models import ZoneType
 from operations.models import get_timestamp
+from werkzeug import Response
 
 
 class TestMetadataServiceClient:
@@ -39,6 +45,21 @@ class TestMetadataServiceClient:
         received_response = metadata_service_client.get_nodes_tree(start_node.id)
         assert received_response[0] == node
 
+    def test_get_nodes_tree_returns_nodes_from_every_page(self, metadata_service_client, httpserver, create_node):
+        start_node = create_node(name='test')
+        nodes = [create_node(parent_path='test') for _ in range(3)]
+        pages = [nodes[:2], nodes[2:]]
+        httpserver.expect_request(f'/v1/item/{start_node.id}/').respond_with_json({'result': start_node})
+        httpserver.expect_request('/v1/items/search/').respond_with_handler(
+            lambda request: Response(
+                json.dumps({'result': pages[int(request.args['page'])]}), content_type='application/json'
+            )
+        )
+
+        received_nodes = metadata_service_client.get_nodes_tree(start_node.id, page_size=2)
+
+        assert [node.id for node in received_nodes] == [node.id for node in nodes]
+
     def test_update_node_returns_correct_nodes(self, metadata_service_client, httpserver, create_node, fake):
         _id = fake.pyint()
         node = create_node(id_=_id)
@@ -130,3 +151,54 @@ class TestMetadataServiceClient:
         timestamp = get_timestamp()
         received_response = metadata_service_client.register_nodes(register_file_nodes, 'testproject', timestamp)
         assert received_response == {source_node.id: node}
+
+    async def test_stream_object_presigns_source_url_for_configured_expiration(
+        self, metadata_service_client, serve_bytes, mocker, fake
+    ):
+        content = fake.binary(100)
+        metadata_service_client.source_url_expiration = 6 * 60 * 60
+        minio_client = mocker.Mock()
+        minio_client.client.get_download_presigned_url = mocker.AsyncMock(return_value=serve_bytes(content))
+        minio_client.upload_fileobj = mocker.AsyncMock(side_effect=lambda *args: {'content': args[2].read()})
+
+        result = await metadata_service_client._stream_object('source', 'file', 'target', 'file', 100, minio_client)
+
+        minio_client.client.get_download_presigned_url.assert_awaited_once_with('source', 'file', 6 * 60 * 60)
+        assert result == {'content': content}
+
+    def test_client_returns_session_of_current_thread(self, metadata_service_client):
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            worker_session = executor.submit(lambda: metadata_service_client.client).result()
+
+        assert metadata_service_client.client is metadata_service_client.client
+        assert worker_session is not metadata_service_client.client
+
+    def test_register_folders_creates_only_missing_folders_level_by_level(
+        self, metadata_service_client, httpserver, create_node
+    ):
+        root_folder = create_node(name='root', parent_path='admin', type_=ResourceType.FOLDER)
+        existing_folder = create_node(id_='existing-a', name='a', parent_path='admin/root', type_=ResourceType.FOLDER)
+        httpserver.expect_request('/v1/items/search/').respond_with_json({'result': [existing_folder]})
+
+        def create_folder(request):
+            payload = request.json
+            return Response(
+                json.dumps({'result': {**payload, 'id': f'{payload["name"]}-id'}}), mimetype='application/json'
+            )
+
+        httpserver.expect_request('/v1/item/', method='POST').respond_with_handler(create_folder)
+        node_manager = NodeManager(metadata_service_client)
+        folder_a = node_manager.queue_folder(create_node(name='a', type_=ResourceType.FOLDER), root_folder)
+        folder_b = node_manager.queue_folder(create_node(name='b', type_=ResourceType.FOLDER), folder_a)
+        folder_c = node_manager.queue_folder(create_node(name='c', type_=ResourceType.FOLDER), root_folder)
+
+        node_manager.register_folders('testproject', ZoneType.CORE, 2)
+
+        created_payloads = [request.json for request, _ in httpserver.log if request.method == 'POST']
+        assert folder_a.id == 'existing-a'
+        assert (folder_b.id, folder_c.id) == ('b-id', 'c-id')
+        assert {(payload['name'], payload['parent'], payload['parent_path']) for payload in created_payloads} == {
+            ('b', 'existing-a', 'admin/root/a'),
+            ('c', root_folder.id, 'admin/root'),
+        }
+        assert node_manager.pending_folders == []
@@ -0,0 +1,69 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import pytest
+from operations.services.redis.client import RedisClient
+
+
+class FakePipeline:
+    def __init__(self, existing_keys: set[str]) -> None:
+        self.existing_keys = existing_keys
+        self.command_stack = []
+        self.executions = 0
+
+    async def __aenter__(self) -> 'FakePipeline':
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        self.command_stack = []
+
+    def __len__(self) -> int:
+        return len(self.command_stack)
+
+    def unlink(self, *keys: str) -> None:
+        self.command_stack.append(keys)
+
+    async def execute(self) -> list[int]:
+        self.executions += 1
+        results = [len(self.existing_keys.intersection(keys)) for keys in self.command_stack]
+        self.command_stack = []
+        return results
+
+
+@pytest.fixture
+def redis_client(mocker) -> RedisClient:
+    client = RedisClient()
+    client.client = mocker.Mock()
+    yield client
+
+
+class TestRedisClient:
+    async def test_unlink_by_keys_returns_number_of_removed_keys(self, redis_client, fake):
+        keys = [fake.file_path() for _ in range(10)]
+        pipeline = FakePipeline(set(keys[:4]))
+        redis_client.client.pipeline.return_value = pipeline
+
+        removed = await redis_client.unlink_by_keys(keys, batch_size=3)
+
+        assert removed == 4
+
+    async def test_unlink_by_keys_sends_batches_in_pipelined_round_trips(self, redis_client, fake):
+        keys = [fake.file_path() for _ in range(25)]
+        pipeline = FakePipeline(set())
+        redis_client.client.pipeline.return_value = pipeline
+
+        await redis_client.unlink_by_keys(keys, batch_size=2, pipeline_size=5)
+
+        assert pipeline.executions == 3
+
+    async def test_unlink_by_keys_does_not_execute_pipeline_without_keys(self, redis_client):
+        pipeline = FakePipeline(set())
+        redis_client.client.pipeline.return_value = pipeline
+
+        removed = await redis_client.unlink_by_keys([])
+
+        assert removed == 0
+        assert pipeline.executions == 0
@@ -0,0 +1,53 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+from operations.bandwidth import BandwidthLimiter
+from operations.chunk_sources import iter_blocks
+
+
+class TestBandwidthLimiter:
+    async def test_consume_sleeps_off_bytes_above_burst(self, mocker):
+        sleep = mocker.patch('operations.bandwidth.asyncio.sleep')
+        mocker.patch('operations.bandwidth.time.monotonic', return_value=100.0)
+        bandwidth = BandwidthLimiter(100)
+
+        await bandwidth.consume(100)
+        sleep.assert_not_called()
+
+        await bandwidth.consume(50)
+        await bandwidth.consume(50)
+
+        assert [call.args[0] for call in sleep.await_args_list] == [0.5, 1.0]
+        assert bandwidth.to_dict()['throttled_seconds'] == 1.5
+
+    async def test_consume_refills_tokens_over_time(self, mocker):
+        sleep = mocker.patch('operations.bandwidth.asyncio.sleep')
+        monotonic = mocker.patch('operations.bandwidth.time.monotonic', return_value=100.0)
+        bandwidth = BandwidthLimiter(100)
+
+        await bandwidth.consume(100)
+        monotonic.return_value = 101.0
+        await bandwidth.consume(100)
+
+        sleep.assert_not_called()
+
+    async def test_consume_only_measures_throughput_without_limit(self, mocker):
+        sleep = mocker.patch('operations.bandwidth.asyncio.sleep')
+        bandwidth = BandwidthLimiter(0)
+
+        await bandwidth.consume(10**12)
+
+        sleep.assert_not_called()
+        assert bandwidth.to_dict()['total_bytes'] == 10**12
+        assert bandwidth.to_dict()['limit_bytes_per_second'] is None
+
+    async def test_iter_blocks_consumes_bandwidth_for_every_block(self):
+        bandwidth = BandwidthLimiter(0)
+
+        blocks = [block async for block in iter_blocks(bytes(10), block_size=4, bandwidth=bandwidth)]
+
+        assert len(blocks) == 3
+        assert bandwidth.total_bytes == 10
@@ -0,0 +1,81 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import asyncio
+
+from operations.chunk_sources import LocalFileSource
+from operations.chunk_sources import PresignedUrlSource
+from operations.chunk_sources import iter_blocks
+
+
+async def test_iter_blocks_yields_views_of_data_in_blocks():
+    data = bytearray(b'0123456789')
+
+    blocks = [block async for block in iter_blocks(data, block_size=4)]
+
+    assert [bytes(block) for block in blocks] == [b'0123', b'4567', b'89']
+    assert all(block.obj is data for block in blocks)
+
+
+class TestLocalFileSource:
+    async def test_read_returns_chunk_from_offset(self, tmp_path, fake):
+        content = fake.binary(20)
+        file_path = tmp_path / 'file'
+        file_path.write_bytes(content)
+
+        source = LocalFileSource(file_path)
+
+        assert source.size == 20
+        assert await source.read(15, 10) == content[15:]
+
+    async def test_read_returns_views_of_file_mapped_into_memory(self, tmp_path, fake):
+        content = fake.binary(20)
+        file_path = tmp_path / 'file'
+        file_path.write_bytes(content)
+
+        async with LocalFileSource(file_path) as source:
+            chunk = await source.read(4, 8)
+
+            assert isinstance(chunk, memoryview)
+            assert chunk == content[4:12]
+            chunk.release()
+
+        assert source.mapped is None
+
+
+class TestPresignedUrlSource:
+    async def test_read_returns_chunks_with_range_requests(self, serve_bytes, fake):
+        content = fake.binary(50)
+
+        async with PresignedUrlSource(serve_bytes(content), len(content)) as source:
+            chunks = await asyncio.gather(*[source.read(offset, 20) for offset in range(0, 50, 20)])
+            after_end = await source.read(50, 20)
+
+        assert b''.join(chunks) == content
+        assert after_end == b''
+
+    async def test_read_reuses_released_buffers(self, serve_bytes, fake):
+        content = fake.binary(50)
+
+        async with PresignedUrlSource(serve_bytes(content), len(content)) as source:
+            first = await source.read(0, 20)
+            first_buffer = first.obj
+            assert first == content[:20]
+            source.release(first)
+
+            second = await source.read(40, 20)
+
+            assert second.obj is first_buffer
+            assert second == content[40:]
+
+    async def test_read_cuts_whole_object_returned_without_range_support(self, httpserver, fake):
+        content = fake.binary(50)
+        httpserver.expect_request('/object').respond_with_data(content)
+
+        async with PresignedUrlSource(httpserver.url_for('/object'), len(content)) as source:
+            chunk = await source.read(0, 20)
+
+        assert chunk == content[:20]
@@ -0,0 +1,106 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import json
+import re
+
+from operations.commands.copy_to_central_node import get_upload_key
+from operations.commands.copy_to_central_node import upload_files
+from operations.config import get_settings
+from operations.models import ResourceType
+from operations.services.central_node.upload_state import UploadStateStore
+from werkzeug import Response
+
+
+async def test_upload_files_skips_compressed_files_uploaded_by_previous_attempt(
+    central_node_client, httpserver, serve_bytes, create_node, mocker, fake, tmp_path
+):
+    mocker.patch.object(get_settings(), 'CENTRAL_NODE_COMPRESSION', 'gzip')
+    content = fake.binary(2000)
+    source_file = create_node(
+        type_=ResourceType.FILE, name='file.txt', size=len(content), location_uri='minio://http://minio/bucket/file.txt'
+    )
+    minio_client = mocker.Mock(get_download_presigned_url=mocker.AsyncMock(return_value=serve_bytes(content)))
+    project_code = fake.project_code()
+    files = [(source_file, central_node_client.username)]
+    upload_state = UploadStateStore(tmp_path, 'job-id')
+
+    httpserver.expect_request('/pilot/portal/v1/files/meta').respond_with_json(
+        {'result': [{'id': fake.uuid4(), 'type': 'name_folder', 'name': central_node_client.username}]}
+    )
+    httpserver.expect_request(f'/pilot/portal/v1/project/{project_code}/files', method='POST').respond_with_json(
+        {
+            'result': [
+                {'job_id': fake.uuid4(), 'payload': {'resumable_identifier': fake.uuid4(), 'item_id': fake.uuid4()}}
+            ]
+        }
+    )
+    httpserver.expect_request('/pilot/upload/gr/v1/files/chunks/presigned').respond_with_handler(
+        lambda request: Response(
+            json.dumps({'result': httpserver.url_for(f'/upload/{request.args["chunk_number"]}')}),
+            content_type='application/json',
+        )
+    )
+    httpserver.expect_request(re.compile('/upload/.*'), method='PUT').respond_with_data()
+    httpserver.expect_request('/pilot/upload/gr/v1/files', method='POST').respond_with_json({'result': {}})
+
+    async with central_node_client:
+        await upload_files(central_node_client, minio_client, files, project_code, upload_state)
+        first_attempt_requests = len(httpserver.log)
+        await upload_files(central_node_client, minio_client, files, project_code, upload_state)
+
+    retried_paths = [request.path for request, _ in httpserver.log[first_attempt_requests:]]
+    assert upload_state.get_file(get_upload_key(*files[0])).is_uploaded is True
+    assert retried_paths == ['/pilot/portal/v1/files/meta']
+
+
+async def test_upload_files_pre_uploads_resumed_file_again_when_central_node_rejects_its_upload(
+    central_node_client, httpserver, serve_bytes, create_node, mocker, fake, tmp_path
+):
+    content = fake.binary(2000)
+    source_file = create_node(
+        type_=ResourceType.FILE, name='file.txt', size=len(content), location_uri='minio://http://minio/bucket/file.txt'
+    )
+    minio_client = mocker.Mock(get_download_presigned_url=mocker.AsyncMock(return_value=serve_bytes(content)))
+    project_code = fake.project_code()
+    files = [(source_file, central_node_client.username)]
+    upload_state = UploadStateStore(tmp_path, 'job-id')
+    stale_file_state = upload_state.create_file(
+        get_upload_key(*files[0]),
+        {'job_id': 'stale-job-id', 'payload': {'resumable_identifier': 'stale-id', 'item_id': fake.uuid4()}},
+    )
+    stale_file_state.start(chunk_size=1000, total_chunks=2)
+    stale_file_state.mark_chunk_completed(1)
+    new_pre_upload_data = {
+        'job_id': 'new-job-id',
+        'payload': {'resumable_identifier': 'new-id', 'item_id': fake.uuid4()},
+    }
+
+    httpserver.expect_request('/pilot/portal/v1/files/meta').respond_with_json(
+        {'result': [{'id': fake.uuid4(), 'type': 'name_folder', 'name': central_node_client.username}]}
+    )
+    httpserver.expect_request(f'/pilot/portal/v1/project/{project_code}/files', method='POST').respond_with_json(
+        {'result': [new_pre_upload_data]}
+    )
+    httpserver.expect_request('/pilot/upload/gr/v1/files/chunks/presigned').respond_with_handler(
+        lambda request: (
+            Response(status=404)
+            if request.args['upload_id'] == 'stale-id'
+            else Response(
+                json.dumps({'result': httpserver.url_for(f'/upload/{request.args["chunk_number"]}')}),
+                content_type='application/json',
+            )
+        )
+    )
+    httpserver.expect_request(re.compile('/upload/.*'), method='PUT').respond_with_data()
+    httpserver.expect_request('/pilot/upload/gr/v1/files', method='POST').respond_with_json({'result': {}})
+
+    async with central_node_client:
+        await upload_files(central_node_client, minio_client, files, project_code, upload_state)
+
+    file_state = upload_state.get_file(get_upload_key(*files[0]))
+    assert file_state.file_pre_upload_data == new_pre_upload_data
+    assert file_state.is_uploaded is True
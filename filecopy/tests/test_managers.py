@@ -4,11 +4,21 @@
 # Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
 # You may not use this file except in compliance with the License.
 
+import asyncio
+import io
+import zipfile
+from datetime import datetime
+
 import pytest
+from operations.managers import CentralNodeCopyManager
+from operations.managers import DeleteManager
 from operations.managers import NodeManager
+from operations.managers import ShareDatasetManager
 from operations.models import Node
 from operations.models import NodeList
 from operations.models import ResourceType
+from operations.models import ZoneType
+from operations.traverser import Traverser
 
 
 @pytest.fixture
@@ -34,3 +44,256 @@ class TestNodeManager:
         received_set = node_manager.exclude_nodes(NodeList([]))
 
         assert received_set == expected_set
+
+
+@pytest.fixture
+def delete_manager(metadata_service_client, mocker) -> DeleteManager:
+    mocker.patch('operations.managers.RedisClient')
+    yield DeleteManager(
+        metadata_service_client,
+        mocker.Mock(),
+        Node({'code': 'testproject'}),
+        'admin',
+        mocker.Mock(),
+        'Core',
+        'Greenroom',
+        'pipeline',
+        'pipeline description',
+        'delete',
+        {'node-id'},
+    )
+
+
+class TestDeleteManager:
+    @pytest.mark.parametrize(
+        'node,expected_key',
+        [
+            ({'zone': 0, 'parent_path': 'admin/folder'}, 'greenroom/testproject/admin/folder/file.txt'),
+            ({'zone': 1, 'parent_path': 'admin/folder'}, 'core/testproject/admin/folder/file.txt'),
+            (
+                {'zone': 0, 'parent_path': 'admin/folder', 'restore_path': 'admin/original'},
+                'greenroom/testproject/admin/original/file.txt',
+            ),
+        ],
+    )
+    def test_get_upload_cache_key_prefers_restore_path_of_trashed_node(self, delete_manager, node, expected_key):
+        node = Node({'name': 'file.txt', 'container_code': 'testproject', **node})
+
+        assert delete_manager._get_upload_cache_key(node) == expected_key
+
+    def test_archive_nodes_removes_upload_cache_keys_of_trashed_nodes(
+        self, delete_manager, metadata_service_client, create_node, mocker
+    ):
+        trashed_node = {**create_node(name='file.txt', parent_path='admin'), 'restore_path': 'admin/folder'}
+        mocker.patch.object(metadata_service_client, 'get_item_by_id')
+        mocker.patch.object(metadata_service_client, 'archived_node', return_value=[trashed_node])
+        delete_manager.redis_client.unlink_by_keys = mocker.AsyncMock(return_value=1)
+
+        delete_manager.archive_nodes()
+
+        delete_manager.redis_client.unlink_by_keys.assert_awaited_once_with(
+            ['greenroom/testproject/admin/folder/file.txt']
+        )
+
+    def test_archive_nodes_does_not_fail_when_upload_cache_is_unavailable(
+        self, delete_manager, metadata_service_client, create_node, mocker
+    ):
+        mocker.patch.object(metadata_service_client, 'get_item_by_id')
+        archived_node = mocker.patch.object(metadata_service_client, 'archived_node', return_value=[create_node()])
+        delete_manager.redis_client.unlink_by_keys = mocker.AsyncMock(side_effect=ConnectionError)
+
+        delete_manager.archive_nodes()
+
+        archived_node.assert_called_once()
+
+
+@pytest.fixture
+def version_archive(fake) -> zipfile.ZipFile:
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as zip_file:
+        zip_file.writestr('dataset_description.json', fake.binary(10))
+        zip_file.writestr('data/', b'')
+        zip_file.writestr('data/sub-01/anat/T1w.nii', fake.binary(30))
+        zip_file.writestr('data/sub-01/anat/T1w.json', fake.binary(20))
+        zip_file.writestr('data/participants.tsv', fake.binary(5))
+
+    with zipfile.ZipFile(archive) as zip_file:
+        yield zip_file
+
+
+@pytest.fixture
+def share_dataset_manager(metadata_service_client, version_archive, fake, mocker) -> ShareDatasetManager:
+    minio_client = mocker.Mock(
+        minio_endpoint='minio:9000', upload_fileobj=mocker.AsyncMock(), copy_object=mocker.AsyncMock()
+    )
+    yield ShareDatasetManager(
+        metadata_service_client, minio_client, fake.project_code(), ZoneType.GREENROOM, 'admin', version_archive
+    )
+
+
+class TestShareDatasetManager:
+    def test_get_tree_returns_top_level_archive_members_for_root_folder(self, share_dataset_manager):
+        received_nodes = share_dataset_manager.get_tree(share_dataset_manager.root_folder)
+
+        assert {(node.name, node['type'], node.size) for node in received_nodes} == {
+            ('dataset_description.json', ResourceType.FILE, 10),
+            ('data', ResourceType.FOLDER, 0),
+        }
+
+    def test_get_tree_returns_nested_archive_members_for_folder(self, share_dataset_manager):
+        data_folder = Node({'id': 'data/sub-01/anat', 'name': 'anat', 'type': ResourceType.FOLDER})
+
+        received_nodes = share_dataset_manager.get_tree(data_folder)
+
+        assert {(node.id, node.size) for node in received_nodes} == {
+            ('data/sub-01/anat/T1w.nii', 30),
+            ('data/sub-01/anat/T1w.json', 20),
+        }
+
+    def test_get_tree_reads_archive_index_only_once(self, share_dataset_manager, mocker):
+        infolist = mocker.spy(share_dataset_manager.version_archive, 'infolist')
+
+        share_dataset_manager.get_tree(share_dataset_manager.root_folder)
+        share_dataset_manager.get_tree(Node({'id': 'data'}))
+        received_nodes = share_dataset_manager.get_tree(Node({'id': 'data/sub-01'}))
+
+        assert infolist.call_count == 1
+        assert [(node.id, node.parent_path, node['type']) for node in received_nodes] == [
+            ('data/sub-01/anat', 'data/sub-01', ResourceType.FOLDER)
+        ]
+
+    def test_share_files_uploads_all_collected_files(self, share_dataset_manager, create_node, mocker):
+        mocker.patch.object(share_dataset_manager.metadata_service_client, 'register_file')
+        update_node = mocker.patch.object(share_dataset_manager.metadata_service_client, 'update_node')
+        destination_folder = create_node(type_=ResourceType.FOLDER)
+        for node in share_dataset_manager.get_tree(Node({'id': 'data/sub-01/anat'})):
+            share_dataset_manager.process_file(node, destination_folder)
+
+        share_dataset_manager.share_files()
+
+        uploaded_paths = {call.args[1] for call in share_dataset_manager.minio_client.upload_fileobj.await_args_list}
+        assert uploaded_paths == {
+            f'{destination_folder.parent_path}/{destination_folder.name}/T1w.nii',
+            f'{destination_folder.parent_path}/{destination_folder.name}/T1w.json',
+        }
+        assert update_node.call_count == 2
+        assert share_dataset_manager.pending_files == []
+
+    def test_share_files_reads_members_through_version_file_of_each_worker(
+        self, metadata_service_client, version_archive, create_node, mocker, fake
+    ):
+        version_files = []
+
+        def open_version_file():
+            version_files.append(io.BytesIO(version_archive.fp.getvalue()))
+            return version_files[-1]
+
+        async def upload_fileobj(bucket, object_path, fileobj, size, executor):
+            uploaded[object_path.rsplit('/', 1)[-1]] = fileobj.read()
+
+        uploaded = {}
+        minio_client = mocker.Mock(minio_endpoint='minio:9000', upload_fileobj=upload_fileobj)
+        manager = ShareDatasetManager(
+            metadata_service_client,
+            minio_client,
+            fake.project_code(),
+            ZoneType.GREENROOM,
+            'admin',
+            version_archive,
+            decompression_workers=2,
+            open_version_file=open_version_file,
+        )
+        mocker.patch.object(metadata_service_client, 'register_file')
+        mocker.patch.object(metadata_service_client, 'update_node')
+        mocker.patch.object(version_archive, 'open', side_effect=AssertionError)
+        destination_folder = create_node(type_=ResourceType.FOLDER)
+        for node in manager.get_tree(Node({'id': 'data/sub-01/anat'})):
+            manager.process_file(node, destination_folder)
+
+        manager.share_files()
+
+        assert uploaded.keys() == {'T1w.nii', 'T1w.json'}
+        assert 1 <= len(version_files) <= 2
+        assert all(version_file.closed for version_file in version_files)
+
+    def test_share_files_raises_all_errors_after_processing_every_file(
+        self, share_dataset_manager, create_node, mocker
+    ):
+        mocker.patch.object(share_dataset_manager.metadata_service_client, 'register_file')
+        update_node = mocker.patch.object(share_dataset_manager.metadata_service_client, 'update_node')
+        share_dataset_manager.minio_client.upload_fileobj.side_effect = [ValueError('failed'), None, None]
+        destination_folder = create_node(type_=ResourceType.FOLDER)
+        for node in share_dataset_manager.get_tree(Node({'id': 'data/sub-01/anat'})):
+            share_dataset_manager.process_file(node, destination_folder)
+        share_dataset_manager.process_file(
+            share_dataset_manager.get_tree(share_dataset_manager.root_folder)[0], destination_folder
+        )
+
+        with pytest.raises(Exception, match='failed'):
+            share_dataset_manager.share_files()
+
+        assert update_node.call_count == 2
+
+    def test_share_files_propagates_cancellation(self, share_dataset_manager, create_node, mocker):
+        mocker.patch.object(share_dataset_manager.metadata_service_client, 'register_file')
+        mocker.patch.object(share_dataset_manager.metadata_service_client, 'update_node')
+        share_dataset_manager.minio_client.upload_fileobj.side_effect = [asyncio.CancelledError(), None]
+        destination_folder = create_node(type_=ResourceType.FOLDER)
+        for node in share_dataset_manager.get_tree(Node({'id': 'data/sub-01/anat'})):
+            share_dataset_manager.process_file(node, destination_folder)
+
+        with pytest.raises(asyncio.CancelledError):
+            share_dataset_manager.share_files()
+
+    def test_share_files_copies_matching_dataset_objects_and_extracts_the_rest(
+        self, share_dataset_manager, create_node, mocker
+    ):
+        mocker.patch.object(share_dataset_manager.metadata_service_client, 'register_file')
+        mocker.patch.object(share_dataset_manager.metadata_service_client, 'update_node')
+        share_dataset_manager.version_created_at = datetime(2022, 1, 1)
+        share_dataset_manager.dataset_files = {
+            'data/sub-01/anat/T1w.nii': create_node(
+                type_=ResourceType.FILE,
+                size=30,
+                location_uri='minio://minio:9000/core-dataset/data/sub-01/anat/T1w.nii',
+            ),
+            'data/sub-01/anat/T1w.json': create_node(
+                type_=ResourceType.FILE, size=20, last_updated_time='2022-02-01T00:00:00+00:00'
+            ),
+        }
+        destination_folder = create_node(type_=ResourceType.FOLDER)
+        for node in share_dataset_manager.get_tree(Node({'id': 'data/sub-01/anat'})):
+            share_dataset_manager.process_file(node, destination_folder)
+
+        share_dataset_manager.share_files()
+
+        share_dataset_manager.minio_client.copy_object.assert_awaited_once_with(
+            f'gr-{share_dataset_manager.destination_project_code}',
+            f'{destination_folder.parent_path}/{destination_folder.name}/T1w.nii',
+            'core-dataset',
+            'data/sub-01/anat/T1w.nii',
+        )
+        uploaded_paths = [call.args[1] for call in share_dataset_manager.minio_client.upload_fileobj.await_args_list]
+        assert uploaded_paths == [f'{destination_folder.parent_path}/{destination_folder.name}/T1w.json']
+        assert (share_dataset_manager.copied_files, share_dataset_manager.extracted_files) == (1, 1)
+
+
+class TestCentralNodeCopyManager:
+    def test_traverse_tree_collects_files_with_destination_folder_paths(
+        self, metadata_service_client, create_node, mocker
+    ):
+        source_folder = create_node(type_=ResourceType.FOLDER, name='folder')
+        subfolder = create_node(type_=ResourceType.FOLDER, name='subfolder')
+        file_in_folder = create_node(type_=ResourceType.FILE)
+        file_in_subfolder = create_node(type_=ResourceType.FILE)
+        trees = {source_folder.id: [subfolder, file_in_folder], subfolder.id: [file_in_subfolder]}
+        manager = CentralNodeCopyManager(metadata_service_client)
+        mocker.patch.object(manager, 'get_tree', side_effect=lambda folder: NodeList(trees[folder.id]))
+
+        destination_folder = manager.process_folder(source_folder, 'username')
+        Traverser(manager).traverse_tree(source_folder, destination_folder)
+
+        assert manager.files == [
+            (file_in_subfolder, 'username/folder/subfolder'),
+            (file_in_folder, 'username/folder'),
+        ]
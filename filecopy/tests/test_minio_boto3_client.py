@@ -0,0 +1,78 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import io
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from operations.minio_boto3_client import MIN_PART_SIZE
+from operations.minio_boto3_client import MinioBoto3Client
+
+
+@pytest.fixture
+def minio_client(mocker) -> MinioBoto3Client:
+    mocker.patch.object(MinioBoto3Client, 'connect_to_minio', return_value=mocker.AsyncMock())
+    yield MinioBoto3Client('access-key', 'secret-key', 'minio:9000', False)
+
+
+class TestMinioBoto3Client:
+    async def test_upload_fileobj_uploads_small_stream_as_single_object(self, minio_client, fake):
+        content = fake.binary(100)
+
+        await minio_client.upload_fileobj('bucket', 'object', io.BytesIO(content), len(content))
+
+        minio_client.client.upload_object.assert_awaited_once_with('bucket', 'object', content)
+        minio_client.client.prepare_multipart_upload.assert_not_called()
+
+    async def test_upload_fileobj_uploads_large_stream_in_parts(self, minio_client, httpserver):
+        size = MIN_PART_SIZE * 2 + 10
+        minio_client.client.prepare_multipart_upload.return_value = ['upload-id']
+        minio_client.client.generate_presigned_url.side_effect = lambda *args: httpserver.url_for(f'/part/{args[3]}')
+        httpserver.expect_request(re.compile('/part/.*'), method='PUT').respond_with_data(headers={'ETag': '"etag"'})
+
+        await minio_client.upload_fileobj('bucket', 'object', io.BytesIO(bytes(size)), size)
+
+        part_sizes = [len(request.data) for request, _ in httpserver.log]
+        assert part_sizes == [MIN_PART_SIZE, MIN_PART_SIZE, 10]
+        minio_client.client.combine_chunks.assert_awaited_once_with(
+            'bucket',
+            'object',
+            'upload-id',
+            [{'ETag': 'etag', 'PartNumber': 1}, {'ETag': 'etag', 'PartNumber': 2}, {'ETag': 'etag', 'PartNumber': 3}],
+        )
+
+    async def test_upload_fileobj_reads_stream_in_given_executor(self, minio_client, httpserver):
+        size = MIN_PART_SIZE * 2
+        minio_client.client.prepare_multipart_upload.return_value = ['upload-id']
+        minio_client.client.generate_presigned_url.return_value = httpserver.url_for('/part')
+        httpserver.expect_request('/part', method='PUT').respond_with_data(headers={'ETag': 'etag'})
+        reading_threads = set()
+
+        class Stream(io.BytesIO):
+            def readinto(self, buffer):
+                reading_threads.add(threading.current_thread().name)
+                return super().readinto(buffer)
+
+        with ThreadPoolExecutor(2, thread_name_prefix='decompression') as executor:
+            await minio_client.upload_fileobj('bucket', 'object', Stream(bytes(size)), size, executor)
+
+        assert len(httpserver.log) == 2
+        assert reading_threads
+        assert all(name.startswith('decompression') for name in reading_threads)
+
+    async def test_upload_object_uploads_file_in_parts_reusing_one_buffer(self, minio_client, httpserver, tmp_path):
+        content = bytes(range(256)) * (MIN_PART_SIZE // 256) + b'tail'
+        file_path = tmp_path / 'file'
+        file_path.write_bytes(content)
+        minio_client.client.prepare_multipart_upload.return_value = ['upload-id']
+        minio_client.client.generate_presigned_url.side_effect = lambda *args: httpserver.url_for(f'/part/{args[3]}')
+        httpserver.expect_request(re.compile('/part/.*'), method='PUT').respond_with_data(headers={'ETag': 'etag'})
+
+        await minio_client.upload_object('bucket', 'object', str(file_path))
+
+        assert b''.join(request.data for request, _ in httpserver.log) == content
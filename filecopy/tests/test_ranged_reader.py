@@ -0,0 +1,58 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import io
+import zipfile
+
+from operations.ranged_reader import RangedHttpReader
+
+
+class TestRangedHttpReader:
+    def test_reader_returns_requested_ranges(self, serve_bytes, fake):
+        content = fake.binary(100)
+
+        with RangedHttpReader(serve_bytes(content)) as reader:
+            reader.seek(10)
+            first = reader.read(20)
+            reader.seek(-5, io.SEEK_END)
+            last = reader.read(20)
+
+        assert reader.size == 100
+        assert first == content[10:30]
+        assert last == content[-5:]
+
+    def test_reader_allows_to_read_remote_zip_archive(self, serve_bytes, fake):
+        archive = io.BytesIO()
+        content = fake.binary(4096)
+        with zipfile.ZipFile(archive, 'w', compression=zipfile.ZIP_DEFLATED) as zip_file:
+            zip_file.writestr('data/sub-01/file.bin', content)
+            zip_file.writestr('dataset_description.json', '{}')
+
+        with (
+            io.BufferedReader(RangedHttpReader(serve_bytes(archive.getvalue())), 128) as file_obj,
+            zipfile.ZipFile(file_obj) as zip_file,
+        ):
+            names = zip_file.namelist()
+            received_content = zip_file.read('data/sub-01/file.bin')
+
+        assert names == ['data/sub-01/file.bin', 'dataset_description.json']
+        assert received_content == content
+
+    def test_reader_returns_zero_size_for_empty_object(self, serve_bytes):
+        with RangedHttpReader(serve_bytes(b'')) as reader:
+            assert reader.size == 0
+            assert reader.read() == b''
+
+    def test_reader_requests_new_url_when_access_is_denied(self, httpserver, serve_bytes, fake):
+        content = fake.binary(100)
+        url = serve_bytes(content)
+        httpserver.expect_request('/expired').respond_with_data('', status=403)
+
+        with RangedHttpReader(httpserver.url_for('/expired'), url_factory=lambda: url) as reader:
+            received_content = reader.read()
+
+        assert reader.url == url
+        assert received_content == content
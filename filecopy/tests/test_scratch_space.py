@@ -0,0 +1,88 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import json
+import socket
+import time
+
+import pytest
+from operations.scratch_space import ScratchSpace
+
+
+@pytest.fixture
+def scratch_space(tmp_path) -> ScratchSpace:
+    yield ScratchSpace(tmp_path / 'scratch', budget=100)
+
+
+class TestScratchSpace:
+    def test_allocate_returns_unique_directories_and_removes_them_on_exit(self, scratch_space):
+        with scratch_space.allocate(10) as first_directory, scratch_space.allocate(10) as second_directory:
+            (first_directory / 'file').write_bytes(bytes(10))
+
+            assert first_directory != second_directory
+            assert first_directory.is_dir()
+            assert second_directory.is_dir()
+
+        assert not first_directory.exists()
+        assert not second_directory.exists()
+
+    def test_allocate_returns_none_when_budget_is_exhausted(self, scratch_space):
+        with scratch_space.allocate(60) as first_directory, scratch_space.allocate(60) as second_directory:
+            assert first_directory is not None
+            assert second_directory is None
+
+        with scratch_space.allocate(60) as directory:
+            assert directory is not None
+
+    def test_allocate_ignores_reservations_of_removed_directories(self, scratch_space):
+        with scratch_space.allocate(60) as directory:
+            directory.rmdir()
+
+            with scratch_space.allocate(60) as second_directory:
+                assert second_directory is not None
+
+    def test_allocate_waits_for_space_to_be_released(self, scratch_space, mocker):
+        scratch_space.wait_timeout = 10
+        reserve = mocker.patch.object(scratch_space, '_reserve', side_effect=[False, True])
+        sleep = mocker.patch('operations.scratch_space.time.sleep')
+
+        with scratch_space.allocate(10) as directory:
+            assert directory is not None
+
+        assert reserve.call_count == 2
+        sleep.assert_called_once_with(scratch_space.poll_interval)
+
+    def test_allocate_drops_reservations_of_terminated_processes(self, scratch_space, mocker):
+        with scratch_space.allocate(60) as directory:
+            mocker.patch('operations.scratch_space.os.kill', side_effect=ProcessLookupError)
+
+            with scratch_space.allocate(60) as second_directory:
+                assert second_directory is not None
+                assert not directory.exists()
+
+    def test_allocate_drops_expired_reservations_of_other_hosts(self, scratch_space):
+        directory = scratch_space.root_dir / 'job-other-host'
+        directory.mkdir(parents=True)
+        reservation = {'size': 60, 'pid': 1, 'host': f'not-{socket.gethostname()}', 'reserved_at': time.time()}
+        scratch_space.ledger_path.write_text(json.dumps({directory.name: reservation}))
+
+        with scratch_space.allocate(60) as second_directory:
+            assert second_directory is None
+
+        reservation['reserved_at'] -= scratch_space.reservation_ttl
+        scratch_space.ledger_path.write_text(json.dumps({directory.name: reservation}))
+
+        with scratch_space.allocate(60) as second_directory:
+            assert second_directory is not None
+
+    def test_allocate_does_not_count_written_bytes_twice_against_free_space(self, scratch_space, mocker):
+        scratch_space.budget = 0
+        with scratch_space.allocate(60) as directory:
+            (directory / 'file').write_bytes(bytes(50))
+            mocker.patch('operations.scratch_space.shutil.disk_usage', return_value=mocker.Mock(free=70))
+
+            with scratch_space.allocate(60) as second_directory:
+                assert second_directory is not None
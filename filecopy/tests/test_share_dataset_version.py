@@ -0,0 +1,107 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import asyncio
+import io
+import zipfile
+
+from operations.commands.share_dataset_version import open_version_file
+from operations.managers import ShareDatasetManager
+from operations.models import FileBucketLocation
+from operations.models import Node
+from operations.models import ResourceType
+from operations.models import ZoneType
+from werkzeug import Response
+
+
+def test_share_files_requests_new_version_file_url_when_it_expires_while_sharing(
+    metadata_service_client, httpserver, serve_bytes, create_node, mocker, fake
+):
+    mocker.patch('operations.commands.share_dataset_version.VERSION_ARCHIVE_BUFFER_SIZE', 64)
+    contents = {'data/first.bin': fake.binary(1000), 'data/second.bin': fake.binary(1000)}
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as zip_file:
+        for name, content in contents.items():
+            zip_file.writestr(name, content)
+
+    url_expired = False
+    httpserver.expect_request('/expiring').respond_with_handler(
+        lambda request: Response(status=403) if url_expired else Response(archive.getvalue())
+    )
+    minio_client = mocker.Mock(minio_endpoint='minio:9000')
+    minio_client.client.get_download_presigned_url = mocker.AsyncMock(
+        side_effect=[httpserver.url_for('/expiring'), serve_bytes(archive.getvalue())]
+    )
+    uploaded = {}
+
+    async def upload_fileobj(bucket, object_path, fileobj, size, executor):
+        uploaded[object_path.rsplit('/', 1)[-1]] = await asyncio.get_running_loop().run_in_executor(
+            executor, fileobj.read
+        )
+
+    minio_client.upload_fileobj = upload_fileobj
+    mocker.patch.object(metadata_service_client, 'register_file')
+    mocker.patch.object(metadata_service_client, 'update_node')
+
+    version_file = FileBucketLocation('minio://http://minio/bucket/version.zip')
+    with open_version_file(minio_client, 'version-id', version_file) as file_obj, zipfile.ZipFile(file_obj) as zip_file:
+        manager = ShareDatasetManager(
+            metadata_service_client, minio_client, fake.project_code(), ZoneType.GREENROOM, 'admin', zip_file
+        )
+        destination_folder = create_node(type_=ResourceType.FOLDER)
+        for node in manager.get_tree(Node({'id': 'data'})):
+            manager.process_file(node, destination_folder)
+        url_expired = True
+
+        manager.share_files()
+
+    assert minio_client.client.get_download_presigned_url.await_count == 2
+    assert uploaded == {'first.bin': contents['data/first.bin'], 'second.bin': contents['data/second.bin']}
+
+
+def test_share_files_streams_version_file_opened_by_each_worker(
+    metadata_service_client, serve_bytes, create_node, mocker, fake
+):
+    contents = {'data/first.bin': fake.binary(1000), 'data/second.bin': fake.binary(1000)}
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as zip_file:
+        for name, content in contents.items():
+            zip_file.writestr(name, content)
+
+    minio_client = mocker.Mock(minio_endpoint='minio:9000')
+    minio_client.client.get_download_presigned_url = mocker.AsyncMock(return_value=serve_bytes(archive.getvalue()))
+    uploaded = {}
+
+    async def upload_fileobj(bucket, object_path, fileobj, size, executor):
+        uploaded[object_path.rsplit('/', 1)[-1]] = await asyncio.get_running_loop().run_in_executor(
+            executor, fileobj.read
+        )
+
+    minio_client.upload_fileobj = upload_fileobj
+    mocker.patch.object(metadata_service_client, 'register_file')
+    mocker.patch.object(metadata_service_client, 'update_node')
+
+    version_file = FileBucketLocation('minio://http://minio/bucket/version.zip')
+    loop = asyncio.get_event_loop()
+    with open_version_file(minio_client, 'version-id', version_file) as file_obj, zipfile.ZipFile(file_obj) as zip_file:
+        manager = ShareDatasetManager(
+            metadata_service_client,
+            minio_client,
+            fake.project_code(),
+            ZoneType.GREENROOM,
+            'admin',
+            zip_file,
+            decompression_workers=2,
+            open_version_file=lambda: open_version_file(minio_client, 'version-id', version_file, loop),
+        )
+        destination_folder = create_node(type_=ResourceType.FOLDER)
+        for node in manager.get_tree(Node({'id': 'data'})):
+            manager.process_file(node, destination_folder)
+
+        manager.share_files()
+
+    assert minio_client.client.get_download_presigned_url.await_count > 1
+    assert uploaded == {'first.bin': contents['data/first.bin'], 'second.bin': contents['data/second.bin']}
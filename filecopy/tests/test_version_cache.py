@@ -0,0 +1,83 @@
+# Copyright (C) 2022-Present Indoc Systems
+#
+# Licensed under the GNU AFFERO GENERAL PUBLIC LICENSE,
+# Version 3.0 (the "License") available at https://www.gnu.org/licenses/agpl-3.0.en.html.
+# You may not use this file except in compliance with the License.
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from operations.version_cache import DatasetVersionCache
+
+
+@pytest.fixture
+def version_cache(tmp_path) -> DatasetVersionCache:
+    yield DatasetVersionCache(tmp_path / 'cache', 100)
+
+
+def write_bytes(size: int):
+    def download(path):
+        path.write_bytes(bytes(size))
+
+    return download
+
+
+class TestDatasetVersionCache:
+    def test_open_or_fill_downloads_archive_only_once(self, version_cache, mocker):
+        download = mocker.Mock(side_effect=write_bytes(10))
+
+        with version_cache.open_or_fill('version-id', 'minio://bucket/version.zip', download) as first_file:
+            first_content = first_file.read()
+        with version_cache.open_or_fill('version-id', 'minio://bucket/version.zip', download) as second_file:
+            second_content = second_file.read()
+
+        assert first_file.name == second_file.name
+        assert first_content == second_content == bytes(10)
+        download.assert_called_once()
+
+    def test_open_or_fill_evicts_least_recently_used_archives(self, version_cache):
+        first_path = version_cache.get_entry_path('first', 'location')
+        second_path = version_cache.get_entry_path('second', 'location')
+        version_cache.open_or_fill('first', 'location', write_bytes(40)).close()
+        version_cache.open_or_fill('second', 'location', write_bytes(40)).close()
+        os.utime(first_path, (0, 0))
+        os.utime(second_path, (1, 1))
+        version_cache.open_or_fill('second', 'location', write_bytes(40)).close()
+
+        version_cache.open_or_fill('third', 'location', write_bytes(40)).close()
+
+        assert not first_path.exists()
+        assert second_path.exists()
+        assert version_cache.get_entry_path('third', 'location').exists()
+
+    def test_open_or_fill_keeps_opened_archive_readable_after_eviction(self, version_cache):
+        with version_cache.open_or_fill('first', 'location', write_bytes(60)) as first_file:
+            version_cache.open_or_fill('second', 'location', write_bytes(60)).close()
+
+            assert not version_cache.get_entry_path('first', 'location').exists()
+            assert first_file.read() == bytes(60)
+
+    def test_open_or_fill_does_not_fill_same_entry_concurrently(self, version_cache, mocker):
+        download = mocker.Mock(side_effect=write_bytes(10))
+
+        def open_and_close(_):
+            with version_cache.open_or_fill('version-id', 'location', download) as entry_file:
+                return entry_file.name
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            names = set(executor.map(open_and_close, range(4)))
+
+        assert len(names) == 1
+        download.assert_called_once()
+
+    def test_open_or_fill_removes_partial_archive_when_download_fails(self, version_cache):
+        def download(path):
+            path.write_bytes(bytes(10))
+            raise ValueError('failed')
+
+        with pytest.raises(ValueError):
+            version_cache.open_or_fill('version-id', 'location', download)
+
+        assert list(version_cache.cache_dir.glob('*.zip')) == []
+        assert list(version_cache.cache_dir.glob('*.part')) == []